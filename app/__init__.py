@@ -28,7 +28,14 @@ from app.models.modbus_condition_model import ModbusCondition
 from app.models.modbus_action_model import ModbusAction
 from app.models.modbus_rule_log_model import ModbusRuleLog
 from app.models.modbus_master_config_model import ModbusMasterConfig
+from app.models.config_version_model import ConfigVersion
+from app.models.telemetry_rollup_model import ModbusDataRollup, NivelRollup
+from app.models.register_latest_model import RegisterLatest
 from .views import login_view, acionamentos_view, reservatorio_view, motobomba_view, usuarios_view, nivel_view, index_view, monitoramento_view, modbus_view, grupo_bombeamento_view, database_view, regra_view
+from .services import http_cache
+
+# ETag/304 nas APIs de monitoramento, estáticos com impressão digital e compressão gzip/brotli
+http_cache.init_app(app)
 
 # Configuração de logging
 if not app.debug:
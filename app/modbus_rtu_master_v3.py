@@ -6,7 +6,11 @@ import argparse
 import datetime # Nova importação
 import threading
 from pymodbus.client import ModbusSerialClient
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+from app.services.db_engine import get_engine, dispose_engines
+from app.services.db_batch_writer import BatchWriter, SqliteSpill, spill_path
+from app.services.telemetry_compression import CompressionSettings, TelemetryCompressor
+from app.services.telemetry_rollup import RollupAccumulator
 
 # --- Configuração do Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -155,68 +159,65 @@ def get_unfinished_acionamento(session, motobomba_id, situacao_iniciado_id):
     }).first()
     return result # Retorna um Row ou None
 
-def save_nivel_readings(session, acum_id, nivel_acum_percent, acum_capacidade, dist_id, nivel_dist_percent, dist_capacidade):
-    """Calcula o volume a partir da porcentagem e salva no banco de dados."""
-    try:
-        # Calcula o volume atual em litros
-        volume_acum = (nivel_acum_percent / 100) * acum_capacidade
-        volume_dist = (nivel_dist_percent / 100) * dist_capacidade
-
-        log.info(f"Salvando volumes no BD: AC={volume_acum:.0f}L ({nivel_acum_percent:.2f}%), DI={volume_dist:.0f}L ({nivel_dist_percent:.2f}%)")
-        
-        query = text("""
-            INSERT INTO nivel (reservatorio_id, valor, data, hora)
-            VALUES (:res_id, :valor, :data, :hora)
-        """)
-        now = datetime.datetime.now()
-        today = now.date()
-        current_time = now.time()
-
-        # A coluna 'valor' armazena o volume em litros (inteiro)
-        session.execute(query, {'res_id': acum_id, 'valor': int(volume_acum), 'data': today, 'hora': current_time})
-        session.execute(query, {'res_id': dist_id, 'valor': int(volume_dist), 'data': today, 'hora': current_time})
-        
-        session.commit()
-        log.info("Volumes salvos com sucesso.")
-    except Exception as e:
-        log.error(f"Erro ao salvar níveis no banco de dados: {e}")
-        session.rollback()
-
-def update_slave_statuses(client, stop_event, lock):
+NIVEL_INSERT_SQL = "INSERT INTO nivel (reservatorio_id, valor, data, hora, ts) VALUES (:res_id, :valor, :data, :hora, :ts)"
+# Compressão dos níveis (em %): porta giratória de 0,5 ponto percentual e ao menos um ponto a cada 15 minutos
+NIVEL_COMPRESSION = CompressionSettings(deadband=0.5, swinging_door=True, heartbeat=900)
+
+def enqueue_nivel_points(writer, res_id, capacidade, points):
+    # A coluna 'valor' armazena o volume em litros (inteiro)
+    for nivel_percent, timestamp in points:
+        volume = (nivel_percent / 100) * capacidade
+        writer.submit(NIVEL_INSERT_SQL, {'res_id': res_id, 'valor': int(volume), 'data': timestamp.date(), 'hora': timestamp.time(), 'ts': timestamp})
+
+def save_nivel_readings(writer, compressor, rollups, acum_id, nivel_acum_percent, acum_capacidade, dist_id, nivel_dist_percent, dist_capacidade):
+    """
+    Calcula o volume a partir da porcentagem e enfileira no gravador em lote (não
+    bloqueia o ciclo) apenas os pontos que a compressão considera necessários,
+    junto com os agregados por minuto, hora e dia de todas as leituras.
+    """
+    # Calcula o volume atual em litros
+    volume_acum = (nivel_acum_percent / 100) * acum_capacidade
+    volume_dist = (nivel_dist_percent / 100) * dist_capacidade
+    log.info(f"Volumes lidos: AC={volume_acum:.0f}L ({nivel_acum_percent:.2f}%), DI={volume_dist:.0f}L ({nivel_dist_percent:.2f}%)")
+
+    now = datetime.datetime.now()
+    enqueue_nivel_points(writer, acum_id, acum_capacidade, compressor.offer(acum_id, nivel_acum_percent, now))
+    enqueue_nivel_points(writer, dist_id, dist_capacidade, compressor.offer(dist_id, nivel_dist_percent, now))
+    rollups.add(acum_id, float(int(volume_acum)), now)
+    rollups.add(dist_id, float(int(volume_dist)), now)
+    for sql, params in rollups.rows():
+        writer.submit(sql, params)
+
+SLAVES_QUERY = text("SELECT id, slave_id, nome FROM modbus_slave")
+SLAVE_STATUS_UPDATE = text("UPDATE modbus_slave SET status = :status, last_seen = :last_seen WHERE id = :id")
+
+def update_slave_statuses(engine, client, stop_event, lock):
     """Thread que periodicamente verifica o status de todos os slaves."""
     log.info("Thread de verificação de status iniciada.")
-    engine = create_engine(DB_URI)
     
     while not stop_event.is_set():
         try:
+            # Conexão do pool apenas para a leitura; ela não fica presa durante as sondagens Modbus
             with engine.connect() as connection:
-                # Buscar todos os slaves do banco de dados
-                slaves_query = text("SELECT id, slave_id, nome FROM modbus_slave")
-                slaves = connection.execute(slaves_query).fetchall()
-                
-                for slave in slaves:
-                    log.info(f"Verificando status do slave: {slave.nome} (ID: {slave.slave_id})")
-                    
-                    response = None
-                    with lock: # Adquirir o lock antes de usar o cliente modbus
-                        # Tenta ler um registrador simples (ex: holding register 0)
-                        response = client.read_holding_registers(address=0, count=1, device_id=slave.slave_id)
-                    
-                    now = datetime.datetime.now()
-                    if not response.isError():
-                        status = "Online"
-                    else:
-                        status = "Offline"
-                    
-                    # Atualizar o status no banco de dados
-                    update_query = text("""
-                        UPDATE modbus_slave
-                        SET status = :status, last_seen = :last_seen
-                        WHERE id = :id
-                    """)
-                    connection.execute(update_query, {'status': status, 'last_seen': now, 'id': slave.id})
-                    connection.commit()
-                    log.info(f"Status do slave {slave.nome} atualizado para: {status}")
+                slaves = connection.execute(SLAVES_QUERY).fetchall()
+
+            statuses = []
+            for slave in slaves:
+                log.info(f"Verificando status do slave: {slave.nome} (ID: {slave.slave_id})")
+
+                response = None
+                with lock: # Adquirir o lock antes de usar o cliente modbus
+                    # Tenta ler um registrador simples (ex: holding register 0)
+                    response = client.read_holding_registers(address=0, count=1, device_id=slave.slave_id)
+
+                status = "Online" if not response.isError() else "Offline"
+                statuses.append({'status': status, 'last_seen': datetime.datetime.now(), 'id': slave.id})
+                log.info(f"Status do slave {slave.nome}: {status}")
+
+            # Todos os status em uma única transação (executemany)
+            if statuses:
+                with engine.begin() as connection:
+                    connection.execute(SLAVE_STATUS_UPDATE, statuses)
 
         except Exception as e:
             log.error(f"Erro na thread de verificação de status: {e}", exc_info=True)
@@ -231,24 +232,30 @@ def run_controller():
     log.info("--- Iniciando Master V3 (Controlador) ---") # Atualizado para V3
 
     current_acionamento_id = None # Variável para rastrear o ID do acionamento atual
-    connection = None # Inicializa a conexão como None
     client = None # Inicializa o cliente Modbus como None
     status_thread = None # Para a thread de verificação de status
     stop_event = threading.Event() # Evento para parar a thread
+    db_writer = None # Gravador em lote das leituras de nível
+    nivel_compressor = TelemetryCompressor() # Filtra os níveis antes de gravar
+    nivel_rollups = RollupAccumulator('reservatorio') # Agregados de 1 min / 1 h / 1 dia dos volumes
+    config = None
 
     try:
-        engine = create_engine(DB_URI)
-        connection = engine.connect() # Abre a conexão explicitamente
-
-        # Obter IDs das situações
-        situacao_iniciado_id, situacao_finalizado_id = get_situacao_ids(connection)
-
-        config = get_control_config(connection)
+        # Engine compartilhado pelo laço, pela thread de status e pelo gravador; cada uso pega
+        # uma conexão do pool e a devolve, sem conexão presa durante toda a execução
+        engine = get_engine(DB_URI)
+        db_writer = BatchWriter(engine, name="v3", spill=SqliteSpill(spill_path("v3"))).start()
+
+        with engine.connect() as connection:
+            # Obter IDs das situações
+            situacao_iniciado_id, situacao_finalizado_id = get_situacao_ids(connection)
+            config = get_control_config(connection)
         if not config:
             log.error("Não foi possível carregar a configuração de controle do banco de dados. Verifique se uma bomba principal e seus reservatórios estão configurados.")
             return
         log.info("Configuração de controle carregada do banco de dados com sucesso.")
         log.info(f"Motobomba: Slave ID {config['bomba_slave_id']}")
+        nivel_compressor.configure({config['acum_id']: NIVEL_COMPRESSION, config['dist_id']: NIVEL_COMPRESSION})
 
         # Inicializar cliente Modbus após carregar a configuração do DB
         client = ModbusSerialClient(port='/tmp/ttyS1', baudrate=115200, timeout=2) # Porta corrigida para ttyS1
@@ -260,7 +267,7 @@ def run_controller():
         modbus_lock = threading.Lock()
 
         # --- Iniciar a thread de verificação de status ---
-        status_thread = threading.Thread(target=update_slave_statuses, args=(client, stop_event, modbus_lock))
+        status_thread = threading.Thread(target=update_slave_statuses, args=(engine, client, stop_event, modbus_lock))
         status_thread.daemon = True
         status_thread.start()
 
@@ -311,7 +318,8 @@ def run_controller():
         is_pump_on_modbus = modbus_pump_status_resp.bits[0]
         log.info(f"Estado da bomba no Modbus: {'ON' if is_pump_on_modbus else 'OFF'}.")
 
-        unfinished_acionamento = get_unfinished_acionamento(connection, config['motobomba_id'], situacao_iniciado_id)
+        with engine.connect() as connection:
+            unfinished_acionamento = get_unfinished_acionamento(connection, config['motobomba_id'], situacao_iniciado_id)
 
         # ... (lógica de recuperação de estado) ...
 
@@ -331,7 +339,7 @@ def run_controller():
             nivel_acum = registers_to_float(resp_acum.registers)
             nivel_dist = registers_to_float(resp_dist.registers)
 
-            save_nivel_readings(connection, config['acum_id'], nivel_acum, config['acum_capacidade'], config['dist_id'], nivel_dist, config['dist_capacidade'])
+            save_nivel_readings(db_writer, nivel_compressor, nivel_rollups, config['acum_id'], nivel_acum, config['acum_capacidade'], config['dist_id'], nivel_dist, config['dist_capacidade'])
 
             # 2. Ler estado atual da bomba
             with modbus_lock:
@@ -376,13 +384,15 @@ def run_controller():
                     client.write_coil(address=config['bomba_coil_addr'] - 1, value=desired_pump_status, device_id=config['bomba_slave_id'])
                 
                 if desired_pump_status:
-                    current_acionamento_id = start_acionamento_cycle(connection, config['motobomba_id'], situacao_iniciado_id)
+                    with engine.connect() as connection:
+                        current_acionamento_id = start_acionamento_cycle(connection, config['motobomba_id'], situacao_iniciado_id)
                 else: # Bomba desligou
                     acionamento_id_to_close = current_acionamento_id
                     # Se por algum motivo o ID foi perdido, tenta recuperar o último ciclo aberto
                     if acionamento_id_to_close is None:
                         log.warning("current_acionamento_id é None ao tentar desligar a bomba. Tentando recuperar o ciclo aberto mais recente no banco de dados...")
-                        unfinished = get_unfinished_acionamento(connection, config['motobomba_id'], situacao_iniciado_id)
+                        with engine.connect() as connection:
+                            unfinished = get_unfinished_acionamento(connection, config['motobomba_id'], situacao_iniciado_id)
                         if unfinished:
                             acionamento_id_to_close = unfinished.id
                             log.info(f"Ciclo aberto {acionamento_id_to_close} recuperado para finalização.")
@@ -395,7 +405,8 @@ def run_controller():
                     consumo_kwh = registers_to_float(consumo_kwh_resp.registers) if not consumo_kwh_resp.isError() else 0.0
                     
                     if acionamento_id_to_close is not None:
-                        end_acionamento_cycle(connection, acionamento_id_to_close, consumo_kwh, situacao_finalizado_id)
+                        with engine.connect() as connection:
+                            end_acionamento_cycle(connection, acionamento_id_to_close, consumo_kwh, situacao_finalizado_id)
                     
                     current_acionamento_id = None
             else:
@@ -410,8 +421,13 @@ def run_controller():
         stop_event.set() # Sinaliza para a thread de status parar
         if status_thread:
             status_thread.join() # Espera a thread de status finalizar
-        if connection:
-            connection.close()
+        if db_writer:
+            # Grava os últimos níveis retidos pela compressão e os ainda na fila
+            capacidades = {config['acum_id']: config['acum_capacidade'], config['dist_id']: config['dist_capacidade']} if config else {}
+            for res_id, points in nivel_compressor.flush().items():
+                enqueue_nivel_points(db_writer, res_id, capacidades[res_id], points)
+            db_writer.stop()
+        dispose_engines()
         if client:
             client.close()
         log.info("Conexão Modbus fechada.")
@@ -424,7 +440,7 @@ def run_test_mode():
     connection = None # Inicializa a conexão como None
 
     try:
-        engine = create_engine(DB_URI)
+        engine = get_engine(DB_URI)
         connection = engine.connect() # Abre a conexão explicitamente
 
         query = text("""
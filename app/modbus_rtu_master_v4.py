@@ -1,30 +1,42 @@
 import logging
-import time
+import asyncio
+import signal
 import struct
 import os
 import argparse
 import datetime # Nova importação
-import threading
 from pymodbus.client import ModbusSerialClient
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from pymodbus.exceptions import ModbusException
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload, selectinload
 from app.models.modbus_rule_model import ModbusRule
-from app.models.modbus_condition_model import ModbusCondition
-from app.models.modbus_action_model import ModbusAction
 from app.models.modbus_device_register_model import ModbusRegister
-from app import create_app, db
 from app.models.modbus_master_config_model import ModbusMasterConfig
+from app.services.db_engine import get_engine, get_sessionmaker, session_scope, dispose_engines
+from app.services.modbus_read_planner import LinkTiming, raise_if_cancelling
+from app.services.modbus_snapshot import snapshot_from_latest
+from app.services.modbus_bus import BusPoller, SerialSettings, parse_transport, group_devices_by_bus
+from app.services.modbus_write_planner import plan_write_blocks, write_block_async, verify_writes_async
+from app.services.modbus_rule_set import compile_rule_set, RuleEvaluator
+from app.services.db_batch_writer import BatchWriter, SqliteSpill, spill_path
+from app.services.telemetry_compression import TelemetryCompressor
+from app.services.telemetry_rollup import RollupAccumulator
+from app.services.register_latest import latest_upsert_rows, MARK_QUALITY_SQL, UNAVAILABLE
+from app.services.rule_log import RuleLogRecorder
 
-app = create_app()
-app.app_context().push()
+# --- Configuração do Banco de Dados ---
+# Adiciona o diretório raiz ao sys.path para permitir a importação do config
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import SQLALCHEMY_DATABASE_URI as DB_URI
 
 # Configurações da comunicação Modbus RTU
-master_config = ModbusMasterConfig.query.first()
-if not master_config:
-    # Se não houver configuração no banco, cria uma com valores padrão
-    master_config = ModbusMasterConfig()
-    db.session.add(master_config)
-    db.session.commit()
+with session_scope(DB_URI) as session:
+    master_config = session.query(ModbusMasterConfig).first()
+    if not master_config:
+        # Se não houver configuração no banco, cria uma com valores padrão
+        master_config = ModbusMasterConfig()
+        session.add(master_config)
 
 PORT = master_config.port
 BAUDRATE = master_config.baudrate
@@ -33,16 +45,15 @@ STOPBITS = master_config.stopbits
 BYTESIZE = master_config.bytesize
 TIMEOUT = master_config.timeout
 
+# Modelo de custo usado pelo planejador de leituras em bloco
+LINK_TIMING = LinkTiming(BAUDRATE, PARITY, STOPBITS, BYTESIZE)
+# Parâmetros de linha dos barramentos seriais; dispositivos sem ip_address usam PORT
+SERIAL_SETTINGS = SerialSettings(BAUDRATE, PARITY, STOPBITS, BYTESIZE, TIMEOUT)
+
 # --- Configuração do Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 log = logging.getLogger()
 
-# --- Configuração do Banco de Dados ---
-# Adiciona o diretório raiz ao sys.path para permitir a importação do config
-import sys
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config import SQLALCHEMY_DATABASE_URI as DB_URI
-
 # --- Funções Auxiliares de Conversão ---
 def registers_to_float(registers):
     if not registers or len(registers) < 2:
@@ -50,23 +61,6 @@ def registers_to_float(registers):
     packed = int.to_bytes(registers[0], 2, 'big') + int.to_bytes(registers[1], 2, 'big')
     return struct.unpack('>f', packed)[0]
 
-def float_to_registers(value):
-    """Converte float32 para dois registradores de 16 bits"""
-    try:
-        packed = struct.pack('>f', value)
-        return [struct.unpack('>H', packed[i:i+2])[0] for i in range(0, 4, 2)]
-    except Exception as e:
-        log.error(f"Erro ao converter float para registradores: {e}, valor: {value}")
-        return [0, 0]
-
-def int_to_registers(value):
-    """Converte um valor int para uma lista de 2 registradores de 16 bits (big-endian)."""
-    try:
-        return [(value >> 16) & 0xFFFF, value & 0xFFFF]
-    except Exception as e:
-        log.error(f"Erro ao converter int para registradores: {e}, valor: {value}")
-        return [0, 0]
-
 def registers_to_int(registers):
     """Converte uma lista de 2 registradores de 16 bits para um int (big-endian)."""
     if not registers or len(registers) < 2:
@@ -77,237 +71,465 @@ def registers_to_int(registers):
         log.error(f"Erro ao converter registradores para int: {e}, registradores: {registers}")
         return 0
 
+# --- Intervalos das tarefas do controlador (segundos) ---
+RULE_CYCLE_INTERVAL = 15
+STATUS_CHECK_INTERVAL = 60
+# Slaves sem nenhuma requisição há mais que isso recebem uma sondagem explícita
+IDLE_PROBE_AFTER = 300
+# Registradores mais atrasados citados no relato periódico de prazos perdidos
+MISSED_REPORT_TOP = 5
+CONFIG_CHECK_INTERVAL = 5
+# Gravação em lote no banco: linhas por executemany, espera máxima (ms) e capacidade da fila
+DB_BATCH_SIZE = 500
+DB_MAX_DELAY_MS = 2000
+DB_QUEUE_CAPACITY = 20000
+# Intervalo (s) entre os envios dos agregados de 1 min / 1 h / 1 dia ao gravador
+ROLLUP_FLUSH_INTERVAL = 10
+# Intervalo (s) entre as linhas de resumo de cada regra em modbus_rule_log
+RULE_LOG_SUMMARY_INTERVAL = 3600
+# Valores publicados pelos pollers mais antigos que esse múltiplo do intervalo de
+# leitura do registrador não são usados pelas regras
+STALE_AFTER_INTERVALS = 3
+# Tempo máximo de espera pela primeira leitura dos barramentos ao iniciar
+FIRST_POLL_TIMEOUT = 30
+# Sem leitura mais recente do alvo, uma escrita já feita é reafirmada após esse tempo
+WRITE_REFRESH_AFTER = 300
+# Variação mínima de um registrador para reavaliar as regras que dependem dele
+RULE_CHANGE_EPSILON = 0.0
+
 # --- Funções de Interação com o Banco de Dados (Configuração e Acionamento) ---
 
+# Consultas periódicas, montadas uma única vez
+CONFIG_VERSION_QUERY = text("SELECT version FROM config_version WHERE id = 1")
+ACTIVE_DEVICES_QUERY = text("SELECT id, slave_id, device_name as nome, ip_address FROM modbus_device WHERE ativo = TRUE")
 
+def load_config_version(engine):
+    """
+    Lê o contador de versão da configuração, incrementado pelas telas de regras
+    e dispositivos. Devolve None se a tabela ainda não existir no banco.
+    """
+    try:
+        with engine.connect() as connection:
+            row = connection.execute(CONFIG_VERSION_QUERY).first()
+    except Exception as e:
+        log.warning(f"Não foi possível ler a versão da configuração ({e}). As regras serão recarregadas a cada verificação.")
+        return None
+    return row[0] if row else 0
+
+def load_rule_set(Session, version):
+    """
+    Carrega as regras habilitadas e os registradores envolvidos e os compila
+    (executada fora do event loop). A sessão dura só a carga: o RuleSet não guarda objetos do ORM.
+    """
+    session = Session()
+    try:
+        rules = session.query(ModbusRule).options(
+            selectinload(ModbusRule.conditions), selectinload(ModbusRule.actions)
+        ).filter_by(enabled=True).order_by(ModbusRule.priority.desc()).all()
+
+        register_ids = {condition.left_register_id for rule in rules for condition in rule.conditions}
+        register_ids.update(action.target_register_id for rule in rules for action in rule.actions)
+        registers = {}
+        if register_ids:
+            registers = {
+                register.id: register
+                for register in session.query(ModbusRegister).options(joinedload(ModbusRegister.device)).filter(ModbusRegister.id.in_(register_ids))
+            }
+        return compile_rule_set(version, rules, registers)
+    finally:
+        session.close()
+
+def load_active_devices(engine):
+    """Busca os dispositivos ativos para a verificação de status."""
+    with engine.connect() as connection:
+        return connection.execute(ACTIVE_DEVICES_QUERY).fetchall()
+
+DEVICE_STATUS_SQL = (
+    "UPDATE modbus_device SET status = :status, last_seen = :last_seen, rtt_ms = :rtt_ms, error_count = :error_count "
+    "WHERE id = :id"
+)
+
+MODBUS_DATA_SQL = "INSERT INTO modbus_data (register_id, value, timestamp) VALUES (:register_id, :value, :timestamp)"
+
+
+async def write_bus(state, poller, writes):
+    """
+    Escreve, pelo poller do barramento, as escritas pendentes agrupadas em blocos.
+    Devolve as escritas realizadas (sem as que a releitura não confirmou).
+    """
+    written = []
+    for block in plan_write_blocks(writes):
+        names = ', '.join(f"'{write.source}'" for write in block.members)
+        log.info(f"  Escrevendo {block} (ações: {names}).")
+        try:
+            response = await poller.submit(write_block_async, block, slave_id=block.slave_id,
+                                           expected=LINK_TIMING.transaction_time(block.function_code, block.count))
+        except ModbusException as e:
+            raise_if_cancelling(e)
+            log.error(f"  --> FALHA DE COMUNICAÇÃO NA ESCRITA MODBUS: {e}")
+            continue
+
+        if response.isError():
+            log.error(f"  --> ERRO DE ESCRITA MODBUS: {response}")
+            continue
+        log.info(f"  --> Escrita Modbus bem-sucedida.")
+        state.store_values({write.register.id: write.value for write in block.members}, datetime.datetime.now())
+        written.append(block)
+
+    done = [write for block in written for write in block.members]
+    if not state.verify_writes or not written:
+        return done
+    rejected = set()
+    per_slave = {}
+    for block in written:
+        per_slave.setdefault(block.slave_id, []).append(block)
+    for slave_id, blocks in per_slave.items():
+        try:
+            values, mismatches = await poller.submit(
+                verify_writes_async, blocks, LINK_TIMING, slave_id=slave_id,
+                expected=sum(LINK_TIMING.transaction_time(block.function_code, block.count) for block in blocks))
+        except ModbusException as e:
+            raise_if_cancelling(e)
+            log.error(f"  --> Falha na releitura das escritas do escravo {slave_id}: {e}")
+            continue
+        state.store_values(values, datetime.datetime.now())
+        for write, read_value in mismatches:
+            # Sem valor conhecido confiável, a escrita é repetida no próximo ciclo
+            state.latest.pop(write.register.id, None)
+            rejected.add(write)
+            log.error(f"  --> Releitura de '{write.register.name}' não confere: escrito {write.value}, lido {read_value}.")
+        if not mismatches:
+            log.info(f"  --> Escritas no escravo {slave_id} conferidas por releitura.")
+    return [write for write in done if write not in rejected]
+
+async def execute_rule_actions(state, rules, rule_set):
+    """
+    Executa as ações das regras ativadas no ciclo. Se mais de uma ação escreve
+    no mesmo alvo, prevalece a da última regra; escritas cujo valor já está no
+    registrador são suprimidas e as demais seguem agrupadas por barramento.
+    Devolve o conjunto das escritas (PlannedWrite) efetivamente realizadas.
+    """
+    intended = {}
+    for rule in rules:
+        if not rule.actions:
+            log.info(f"  Regra '{rule.name}' não possui ações configuradas. Nenhuma ação será executada.")
+        for write in rule.actions:
+            intended[write.register.id] = write
+
+    per_bus = {}
+    now = datetime.datetime.now()
+    for register_id, write in intended.items():
+        known = state.known_value(register_id, now)
+        if write.satisfied_by(known):
+            log.info(f"  Ação '{write.source}': '{write.register.name}' já está em {known}. Escrita suprimida.")
+            continue
+        poller = state.poller_for(rule_set.addresses[register_id])
+        per_bus.setdefault(poller.key, (poller, []))[1].append(write)
+
+    results = await asyncio.gather(*(write_bus(state, poller, writes) for poller, writes in per_bus.values()))
+    return {write for done in results for write in done}
+
+# --- Tarefas do controlador (asyncio) ---
+
+class ControllerState:
+    """Estado compartilhado entre as tarefas do controlador; acessado apenas de dentro do event loop."""
+
+    def __init__(self, stop_event, verify_writes=False, rule_epsilon=RULE_CHANGE_EPSILON):
+        self.stop_event = stop_event
+        # Relê os registradores após cada escrita para confirmar o valor
+        self.verify_writes = verify_writes
+        self.rule_epsilon = rule_epsilon
+        # Último valor lido de cada registrador: register_id -> (valor, timestamp)
+        self.latest = {}
+        # Um poller independente por barramento físico (porta serial ou gateway TCP)
+        self.pollers = {}
+        self.poller_tasks = []
+        # Gravador em segundo plano das leituras e do status; as tarefas só enfileiram
+        self.db_writer = None
+        # Filtra as leituras para gravar só o necessário para reconstruir o sinal
+        self.compressor = TelemetryCompressor()
+        # Agregados das leituras (todas, antes da compressão), enviados periodicamente como upserts
+        self.rollups = RollupAccumulator('register')
+        self.rollups_sent_at = None
+        # Regras compiladas em uso, seu avaliador incremental e a idade máxima aceita para o valor de cada registrador
+        self.rule_set = None
+        self.evaluator = None
+        self.max_ages = {}
+        # Histórico das regras em modbus_rule_log: só transições e resumos periódicos
+        self.rule_log = RuleLogRecorder(RULE_LOG_SUMMARY_INTERVAL)
+        # Sinaliza à tarefa de regras que há valores novos
+        self.updated = asyncio.Event()
+
+    def store_values(self, values, timestamp):
+        for register_id, value in values.items():
+            self.latest[register_id] = (value, timestamp)
+        if values:
+            self.updated.set()
+
+    def record_poll(self, values, timestamp):
+        """Recebe as leituras de um poller: atualiza os valores e enfileira a telemetria comprimida."""
+        self.store_values(values, timestamp)
+        # Último valor de cada registrador lido no ciclo (o gravador os envia juntos em um executemany)
+        if values:
+            self.submit_rows(latest_upsert_rows(values, timestamp))
+        for register_id, value in values.items():
+            self.rollups.add(register_id, float(value), timestamp)
+            self.persist_points(register_id, self.compressor.offer(register_id, float(value), timestamp))
+        if self.rollups_sent_at is None or (timestamp - self.rollups_sent_at).total_seconds() >= ROLLUP_FLUSH_INTERVAL:
+            self.flush_rollups()
+            self.rollups_sent_at = timestamp
+
+    def flush_rollups(self):
+        if self.db_writer is None:
+            return
+        self.submit_rows(self.rollups.rows())
 
+    def persist_points(self, register_id, points):
+        if self.db_writer is None:
+            return
+        for value, timestamp in points:
+            self.db_writer.submit(MODBUS_DATA_SQL, {'register_id': register_id, 'value': value, 'timestamp': timestamp})
 
-def update_slave_statuses(client, stop_event, lock):
-    """Thread que periodicamente verifica o status de todos os slaves."""
-    log.info("Thread de verificação de status iniciada.")
-    engine = create_engine(DB_URI)
-    
-    while not stop_event.is_set():
-        try:
-            with engine.connect() as connection:
-                # Buscar todos os slaves do banco de dados
-                slaves_query = text("SELECT id, slave_id, device_name as nome FROM modbus_device WHERE ativo = TRUE")
-                slaves = connection.execute(slaves_query).fetchall()
-                
-                for slave in slaves:
-                    log.info(f"Verificando status do slave: {slave.nome} (ID: {slave.slave_id})")
-                    
-                    response = None
-                    with lock: # Adquirir o lock antes de usar o cliente modbus
-                        # Tenta ler um registrador simples (ex: holding register 0)
-                        response = client.read_holding_registers(address=0, count=1, device_id=slave.slave_id)
-                    
-                    now = datetime.datetime.now()
-                    if not response.isError():
-                        status = "Online"
-                    else:
-                        status = "Offline"
-                    
-                    # Atualizar o status no banco de dados
-                    # Esta tabela não existe mais, a informação de status foi movida para modbus_device
-                    # A coluna 'status' e 'last_seen' precisam ser adicionadas ao modelo ModbusDevice
-                    # Por agora, vamos comentar a atualização para evitar erros, mas isso precisa ser resolvido.
-                    # update_query = text("""
-                    #     UPDATE modbus_device
-                    #     SET status = :status, last_seen = :last_seen
-                    #     WHERE id = :id
-                    # """)
-                    # connection.execute(update_query, {'status': status, 'last_seen': now, 'id': slave.id})
-                    # connection.commit()
-                    log.info(f"Status do slave {slave.nome} verificado como: {status}")
+    def flush_compressor(self, pending):
+        for register_id, points in pending.items():
+            self.persist_points(register_id, points)
 
+    def submit_rows(self, rows):
+        if self.db_writer is None:
+            return
+        for sql, params in rows:
+            self.db_writer.submit(sql, params)
+
+    def known_value(self, register_id, now):
+        """Último valor lido ou escrito do registrador, se recente o bastante para suprimir uma escrita."""
+        entry = self.latest.get(register_id)
+        if entry is None or (now - entry[1]).total_seconds() > WRITE_REFRESH_AFTER:
+            return None
+        return entry[0]
+
+    def poller_for(self, ip_address):
+        """Devolve o poller do barramento do dispositivo, iniciando-o se ainda não existir."""
+        key = parse_transport(ip_address, PORT)
+        poller = self.pollers.get(key)
+        if poller is None:
+            poller = BusPoller(key, SERIAL_SETTINGS, LINK_TIMING, RULE_CYCLE_INTERVAL, self.record_poll)
+            self.pollers[key] = poller
+            self.poller_tasks.append(asyncio.create_task(poller.run(self.stop_event), name=f"bus {key}"))
+        return poller
+
+    def unavailable_registers(self, rule_set):
+        """IDs dos registradores das condições cujo escravo está com o circuito aberto."""
+        unavailable = set()
+        for register in rule_set.condition_registers:
+            poller = self.pollers.get(parse_transport(rule_set.addresses[register.id], PORT))
+            if poller is not None and not poller.is_available(register.slave_id):
+                unavailable.add(register.id)
+        return unavailable
+
+async def wait_for_stop(stop_event, timeout):
+    """Aguarda `timeout` segundos ou o pedido de parada. Retorna True se a parada foi pedida."""
+    try:
+        await asyncio.wait_for(stop_event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+def assign_poll_registers(state, rule_set):
+    """
+    Distribui os registradores das condições entre os pollers de cada barramento.
+    Devolve a idade máxima aceita para o valor de cada registrador.
+    """
+    per_bus = {}
+    max_ages = {}
+    for register in rule_set.condition_registers:
+        max_ages[register.id] = STALE_AFTER_INTERVALS * (register.poll_interval or RULE_CYCLE_INTERVAL)
+        if register.id not in rule_set.inactive:
+            poller = state.poller_for(rule_set.addresses[register.id])
+            per_bus.setdefault(poller.key, []).append(register)
+    for key, poller in state.pollers.items():
+        poller.set_registers(per_bus.get(key, []))
+    return max_ages
+
+async def reload_rule_set(Session, state, version):
+    """Recompila as regras da versão informada e redistribui os registradores entre os pollers."""
+    rule_set = await asyncio.to_thread(load_rule_set, Session, version)
+    state.max_ages = assign_poll_registers(state, rule_set)
+    state.flush_compressor(state.compressor.configure(rule_set.compression))
+    state.rule_log.forget(rule.id for rule in rule_set.rules)
+    state.rule_set = rule_set
+    state.evaluator = RuleEvaluator(rule_set, state.rule_epsilon)
+    log.info(f"Configuração versão {version} carregada: {len(rule_set.rules)} regras, {len(rule_set.registers)} registradores.")
+
+async def config_task(engine, Session, state, stop_event):
+    """Recompila as regras somente quando o contador de versão da configuração muda."""
+    while not await wait_for_stop(stop_event, CONFIG_CHECK_INTERVAL):
+        try:
+            version = await asyncio.to_thread(load_config_version, engine)
+            if version is None or version != state.rule_set.version:
+                await reload_rule_set(Session, state, version)
         except Exception as e:
-            log.error(f"Erro na thread de verificação de status: {e}", exc_info=True)
-        
-        # Aguardar 60 segundos ou até o evento de parada ser acionado
-        stop_event.wait(60)
-    
-    log.info("Thread de verificação de status finalizada.")
-
-
-
-def get_register_type_from_code(code):
-    if code == 1: return 'coil'
-    if code == 2: return 'discrete_input'
-    if code == 3: return 'holding_register'
-    if code == 4: return 'input_register'
-    return None
-
-def read_register_value(client, lock, register):
-    """Lê e decodifica o valor de um registrador Modbus."""
-    with lock:
-        addr = register.address
-        count = 2 if register.data_type in ['float32', 'int32'] else 1
-        register_type = get_register_type_from_code(register.function_code)
-        
-        if register_type == 'holding_register':
-            response = client.read_holding_registers(address=addr - 40001, count=count, device_id=register.device.slave_id)
-        elif register_type == 'input_register':
-            response = client.read_input_registers(address=addr - 30001, count=count, device_id=register.device.slave_id)
-        elif register_type == 'coil':
-            response = client.read_coils(address=addr - 1, count=count, device_id=register.device.slave_id)
-        elif register_type == 'discrete_input':
-            response = client.read_discrete_inputs(address=addr - 10001, count=count, device_id=register.device.slave_id)
-        else:
-            log.error(f"Tipo de registrador desconhecido: {register_type}")
-            return None, False
-
-    if not response or response.isError():
-        log.warning(f"Erro ao ler registrador {register.name} (Endereço: {addr}, Slave: {register.device.slave_id})")
-        return None, False
-
-    if register.data_type == 'float32':
-        return registers_to_float(response.registers), True
-    elif register.data_type == 'int32':
-        return registers_to_int(response.registers), True
-    elif register.data_type == 'boolean':
-        return response.bits[0], True
-    else: # int16, uint16
-        return response.registers[0], True
-
-def evaluate_rules(client, session, lock):
-    """Busca, avalia e executa as regras Modbus."""
-    log.info("Iniciando avaliação de regras...")
+            log.error(f"Erro ao verificar a versão da configuração: {e}", exc_info=True)
+
+async def wait_for_update(state, stop_event, timeout):
+    """Aguarda valores novos dos pollers por até `timeout` segundos. Retorna True se a parada foi pedida."""
     try:
-        rules = session.query(ModbusRule).filter_by(enabled=True).order_by(ModbusRule.priority.desc()).all()
-        log.info(f"{len(rules)} regras habilitadas encontradas.")
-
-        for rule in rules:
-            log.info(f"Avaliando regra: '{rule.name}'")
-            try:
-                conditions_met = True
-                for condition in rule.conditions:
-                    left_register = session.get(ModbusRegister, condition.left_register_id)
-                    if not left_register:
-                        log.error(f"Registrador esquerdo (ID: {condition.left_register_id}) não encontrado para a condição '{condition.name}'. Pulando regra.")
-                        conditions_met = False
-                        break
-
-                    # Lê o valor atual do registrador
-                    current_value, success = read_register_value(client, lock, left_register)
-                    if not success:
-                        log.warning(f"Não foi possível ler o valor para a condição '{condition.name}'. Pulando regra.")
-                        conditions_met = False
-                        break
-                    
-                    log.info(f"  Condição '{condition.name}': Valor lido de '{left_register.name}' = {current_value}. Comparando com {condition.right_value} usando o operador '{condition.operator}'.")
-
-                    # Avalia a condição
-                    op = condition.operator.value # Use .value to get the string '=='
-                    value_to_compare = condition.right_value
-
-                    condition_is_true = False
-                    if op == '==': condition_is_true = (current_value == value_to_compare)
-                    elif op == '!=': condition_is_true = (current_value != value_to_compare)
-                    elif op == '>':  condition_is_true = (current_value > value_to_compare)
-                    elif op == '<':  condition_is_true = (current_value < value_to_compare)
-                    elif op == '>=': condition_is_true = (current_value >= value_to_compare)
-                    elif op == '<=': condition_is_true = (current_value <= value_to_compare)
-
-                    if not condition_is_true:
-                        conditions_met = False
-                        log.info(f"  Condição '{condition.name}' não atendida. Parando avaliação para esta regra.")
-                        break # Para de checar outras condições para esta regra
-
-                if conditions_met:
-                    log.warning(f"REGRA ATIVADA: '{rule.name}'. Todas as condições foram atendidas. Executando ações.")
-                    if not rule.actions:
-                        log.info(f"  Regra '{rule.name}' não possui ações configuradas. Nenhuma ação será executada.")
-                    for action in rule.actions:
-                        target_register = session.get(ModbusRegister, action.target_register_id)
-                        if not target_register:
-                            log.error(f"Registrador alvo (ID: {action.target_register_id}) não encontrado para a ação '{action.name}'. Pulando ação.")
-                            continue
-
-                        value_to_write = action.write_value
-                        log.info(f"  Ação '{action.name}': Escrevendo valor {value_to_write} em '{target_register.name}' (Slave: {target_register.device.slave_id}, Endereço: {target_register.address})")
-
-                        # Converte o valor para o formato do registrador
-                        if target_register.data_type == 'float32':
-                            values_to_write = float_to_registers(float(value_to_write))
-                        elif target_register.data_type == 'int32':
-                            values_to_write = int_to_registers(int(value_to_write))
-                        else: # boolean, int16, uint16
-                            values_to_write = int(value_to_write)
-
-                        # Escreve no registrador/bobina
-                        with lock:
-                            register_type = get_register_type_from_code(target_register.function_code)
-                            log.info(f"  Tentando escrever em um registrador do tipo: {register_type}")
-                            response = None
-                            if register_type == 'holding_register':
-                                log.info(f"    --> Escrevendo em Holding Register. Endereço: {target_register.address - 40001}, Valor: {values_to_write}")
-                                response = client.write_registers(target_register.address - 40001, values_to_write, device_id=target_register.device.slave_id)
-                            elif register_type == 'coil':
-                                log.info(f"    --> Escrevendo em Coil. Endereço: {target_register.address - 1}, Valor: {bool(value_to_write)}")
-                                response = client.write_coil(target_register.address - 1, bool(value_to_write), device_id=target_register.device.slave_id)
-                            else:
-                                log.error(f"Tipo de registrador '{register_type}' não suporta escrita para a ação '{action.name}'.")
-
-                            if response and response.isError():
-                                log.error(f"  --> ERRO DE ESCRITA MODBUS: {response}")
-                            elif response:
-                                log.info(f"  --> Escrita Modbus bem-sucedida.")
-                    
-                    if rule.stop_on_trigger:
-                        log.info(f"Regra '{rule.name}' tem 'stop_on_trigger' ativado. Parando a avaliação de outras regras neste ciclo.")
-                        break # Para de avaliar outras regras
-
-            except Exception as e:
-                log.error(f"Erro ao avaliar a regra '{rule.name}': {e}", exc_info=True)
+        await asyncio.wait_for(state.updated.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    state.updated.clear()
+    return stop_event.is_set()
+
+async def rule_task(state, stop_event):
+    """
+    A cada leitura nova dos pollers (ou no máximo a cada RULE_CYCLE_INTERVAL) congela
+    os valores, reavalia as regras afetadas e executa as ações das regras ativadas.
+    """
+    # Aguarda a primeira leitura de todos os barramentos antes de avaliar
+    pending = [asyncio.create_task(poller.polled.wait()) for poller in state.pollers.values()]
+    if pending:
+        done, not_done = await asyncio.wait(pending, timeout=FIRST_POLL_TIMEOUT)
+        for task in not_done:
+            task.cancel()
 
-    except Exception as e:
-        log.error(f"Erro ao buscar regras do banco de dados: {e}", exc_info=True)
+    while not stop_event.is_set():
+        try:
+            rule_set = state.rule_set
+            register_ids = list(rule_set.dependents)
+            unavailable = state.unavailable_registers(rule_set)
+            snapshot = snapshot_from_latest(state.latest, register_ids, state.max_ages, unavailable=unavailable)
+            log.debug(f"Snapshot: {len(snapshot)} de {len(register_ids)} registradores disponíveis em {snapshot.timestamp}"
+                      f" ({len(snapshot.unavailable)} de escravos indisponíveis).")
+
+            triggered, indeterminate = state.evaluator.evaluate(snapshot)
+            written = await execute_rule_actions(state, triggered, rule_set)
+            state.submit_rows(state.rule_log.observe(rule_set, state.evaluator.results, state.evaluator.evaluated,
+                                                     written, snapshot))
+        except Exception as e:
+            log.error(f"Erro no ciclo de avaliação de regras: {e}", exc_info=True)
+
+        if await wait_for_update(state, stop_event, RULE_CYCLE_INTERVAL):
+            break
+
+async def probe_device(client, slave_id):
+    """
+    Sonda um escravo ocioso lendo o holding register 0. Uma resposta de exceção
+    (endereço inexistente no escravo) também comprova que ele está vivo.
+    """
+    return await client.read_holding_registers(address=0, count=1, device_id=slave_id)
+
+async def probe_idle_devices(poller, slaves):
+    """Sonda somente os escravos do barramento sem nenhuma requisição há mais de IDLE_PROBE_AFTER segundos."""
+    now = asyncio.get_running_loop().time()
+    for slave in slaves:
+        health = poller.health_for(slave.slave_id)
+        if health.idle_for(now) < IDLE_PROBE_AFTER or health.blocked(now):
+            continue
+        log.info(f"Sondando slave ocioso: {slave.nome} (ID: {slave.slave_id})")
+        try:
+            await poller.submit(probe_device, slave.slave_id, slave_id=slave.slave_id)
+        except ModbusException as e:
+            raise_if_cancelling(e)
+
+async def status_task(engine, state, stop_event):
+    """
+    Publica periodicamente no banco a vivacidade de cada slave, derivada das
+    requisições normais dos pollers, em uma única instrução em lote. Apenas os
+    slaves ociosos são sondados. Também relata os prazos de leitura perdidos
+    em cada barramento desde o relato anterior.
+    """
+    log.info("Tarefa de verificação de status iniciada.")
+    while not await wait_for_stop(stop_event, STATUS_CHECK_INTERVAL):
+        try:
+            slaves = await asyncio.to_thread(load_active_devices, engine)
+            buses = group_devices_by_bus(slaves, PORT)
+            await asyncio.gather(*(
+                probe_idle_devices(state.poller_for(bus_slaves[0].ip_address), bus_slaves)
+                for bus_slaves in buses.values()
+            ))
+
+            offline = []
+            for slave in slaves:
+                poller = state.poller_for(slave.ip_address)
+                health = poller.health_for(slave.slave_id)
+                state.db_writer.submit(DEVICE_STATUS_SQL, {
+                    'id': slave.id,
+                    'status': health.status,
+                    'last_seen': health.last_seen,
+                    'rtt_ms': health.rtt_ms,
+                    'error_count': health.failures,
+                })
+                if health.status == 'Offline':
+                    offline.append(slave.nome)
+                    for register in poller.registers:
+                        if register.slave_id == slave.slave_id:
+                            state.db_writer.submit(MARK_QUALITY_SQL, {'register_id': register.id, 'quality': UNAVAILABLE})
+            log.info(f"Status de {len(slaves)} slaves enfileirado ({len(offline)} offline{': ' + ', '.join(offline) if offline else ''}).")
+            log.info(f"Gravador do banco: {state.db_writer.stats()}")
+            for poller in state.pollers.values():
+                poller.report_missed_deadlines(MISSED_REPORT_TOP)
+            if state.compressor.ratio:
+                log.info(f"Compressão da telemetria: {state.compressor.offered} leituras, {state.compressor.stored} gravadas ({state.compressor.ratio:.1f}x).")
+        except Exception as e:
+            log.error(f"Erro na tarefa de verificação de status: {e}", exc_info=True)
+    log.info("Tarefa de verificação de status finalizada.")
 
-def run_controller():
+async def run_async_controller(verify_writes=False, rule_epsilon=RULE_CHANGE_EPSILON):
     log.info("--- Iniciando Master V4 (Controlador com Regras) ---")
 
-    connection = None
-    client = None
-    status_thread = None
-    stop_event = threading.Event()
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
 
-    try:
-        engine = create_engine(DB_URI)
-        Session = sessionmaker(bind=engine)
-        db_session = Session()
+    engine = get_engine(DB_URI)
+    Session = get_sessionmaker(DB_URI)
+    state = ControllerState(stop_event, verify_writes, rule_epsilon)
+    # Com o banco fora do ar, as linhas ficam no armazenamento local e são reenviadas quando ele volta
+    state.db_writer = BatchWriter(engine, name="v4", capacity=DB_QUEUE_CAPACITY,
+                                  batch_size=DB_BATCH_SIZE, max_delay_ms=DB_MAX_DELAY_MS,
+                                  spill=SqliteSpill(spill_path("v4"))).start()
+    workers = []
 
-        client = ModbusSerialClient(port='/tmp/ttyS1', baudrate=115200, timeout=2)
-        if not client.connect():
-            log.error("Falha ao conectar ao cliente Modbus. Verifique a porta e se o slave está rodando.")
-            return
-
-        modbus_lock = threading.Lock()
-
-        status_thread = threading.Thread(target=update_slave_statuses, args=(client, stop_event, modbus_lock))
-        status_thread.daemon = True
-        status_thread.start()
-
-        # --- Loop principal de controle baseado em regras ---
-        while not stop_event.is_set():
-            evaluate_rules(client, db_session, modbus_lock)
-            
-            log.info("Ciclo de avaliação de regras finalizado. Aguardando 15 segundos.")
-            time.sleep(15)
+    try:
+        # Um poller (e um cliente Modbus) por barramento físico dos dispositivos ativos
+        devices = await asyncio.to_thread(load_active_devices, engine)
+        for bus_devices in group_devices_by_bus(devices, PORT).values():
+            state.poller_for(bus_devices[0].ip_address)
+        log.info(f"{len(state.pollers)} barramento(s) em uso: {', '.join(str(key) for key in state.pollers)}")
+
+        version = await asyncio.to_thread(load_config_version, engine)
+        await reload_rule_set(Session, state, version)
+
+        workers = [
+            asyncio.create_task(rule_task(state, stop_event), name="rules"),
+            asyncio.create_task(config_task(engine, Session, state, stop_event), name="config"),
+            asyncio.create_task(status_task(engine, state, stop_event), name="status"),
+        ]
+
+        await stop_event.wait()
+        log.info("Pedido de parada recebido. Encerrando tarefas do controlador.")
+    finally:
+        stop_event.set()
+        tasks = workers + state.poller_tasks
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Grava as últimas amostras retidas pela compressão antes de encerrar o gravador
+        state.flush_compressor(state.compressor.flush())
+        state.flush_rollups()
+        state.submit_rows(state.rule_log.summaries(datetime.datetime.now()))
+        # O gravador não é interrompido: ele grava o que restou na fila e termina
+        await asyncio.to_thread(state.db_writer.stop)
+        dispose_engines()
+        log.info("Conexões com Modbus e Banco de Dados fechadas.")
 
+def run_controller(verify_writes=False, rule_epsilon=RULE_CHANGE_EPSILON):
+    try:
+        asyncio.run(run_async_controller(verify_writes, rule_epsilon))
     except KeyboardInterrupt:
         log.info("Interrupção pelo usuário. Encerrando controlador.")
     except Exception as e:
         log.error(f"Erro inesperado no controlador: {e}", exc_info=True)
-    finally:
-        stop_event.set()
-        if status_thread:
-            status_thread.join()
-        if db_session:
-            db_session.close()
-        if client:
-            client.close()
-        log.info("Conexões com Modbus e Banco de Dados fechadas.")
 
 def run_test_mode():
     """Conecta no BD, busca todos os registradores e tenta ler cada um."""
@@ -317,7 +539,7 @@ def run_test_mode():
     connection = None # Inicializa a conexão como None
 
     try:
-        engine = create_engine(DB_URI)
+        engine = get_engine(DB_URI)
         connection = engine.connect() # Abre a conexão explicitamente
 
         query = text("""
@@ -387,16 +609,18 @@ def main():
     parser = argparse.ArgumentParser(description='Modbus Master Controller')
     parser.add_argument('--test', action='store_true', help='Executar em modo de teste')
     parser.add_argument('--controller', action='store_true', help='Executar em modo controlador')
+    parser.add_argument('--verify-writes', action='store_true', help='Reler os registradores após as escritas das ações')
+    parser.add_argument('--rule-epsilon', type=float, default=RULE_CHANGE_EPSILON, help='Variação mínima de um registrador para reavaliar as regras que dependem dele')
 
     args = parser.parse_args()
 
     if args.test:
         run_test_mode()
     elif args.controller:
-        run_controller()
+        run_controller(args.verify_writes, args.rule_epsilon)
     else:
         # Se nenhum argumento for passado, executar controlador por padrão
-        run_controller()
+        run_controller(args.verify_writes, args.rule_epsilon)
 
 if __name__ == "__main__":
     try:
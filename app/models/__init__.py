@@ -2,6 +2,7 @@ from .modbus_action_model import ModbusAction
 from .acionamento_model import Acionamento
 from .alerta_config_model import AlertaConfig
 from .modbus_condition_model import ModbusCondition
+from .config_version_model import ConfigVersion
 from .modbus_data_model import ModbusData
 from .modbus_device_register_model import ModbusDevice, ModbusRegister
 from .motobomba_alerta_config_model import MotobombaAlertaConfig
@@ -13,4 +14,6 @@ from .reservatorio_model import Reservatorio, Tiporeservatorio
 from .situacao_model import Situacao
 from .teste_model import Teste
 from .usuario_model import Usuario
-from .modbus_rule_log_model import ModbusRuleLog
\ No newline at end of file
+from .modbus_rule_log_model import ModbusRuleLog
+from .telemetry_rollup_model import ModbusDataRollup, NivelRollup
+from .register_latest_model import RegisterLatest
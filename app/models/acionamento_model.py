@@ -22,6 +22,10 @@ class Acionamento(db.Model):
     situacao_id = db.Column(db.SmallInteger, db.ForeignKey("situacao.id"))
     situacao = db.relationship("Situacao", backref="acionamentos")
 
+    # A lista de acionamentos é paginada em ordem de (data, hora_lig), com ou sem filtro por bomba
+    __table_args__ = (db.Index('ix_acionamento_mb_data_hora', 'mb_id', 'data', 'hora_lig'),
+                      db.Index('ix_acionamento_data_hora', 'data', 'hora_lig'))
+
     def __init__(self, motobomba, usuario, situacao, data=None, hora_lig=None, hora_des=None, tensao=None, corrente=None, potencia=None, consumo=None, consumo_kwh=None):
         self.motobomba = motobomba
         self.usuario = usuario
@@ -0,0 +1,21 @@
+from app import db
+import datetime
+
+class ConfigVersion(db.Model):
+    """Contador único incrementado a cada alteração de regras ou dispositivos; o master recarrega a configuração quando ele muda."""
+    __tablename__ = 'config_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.now, nullable=False)
+
+    def __repr__(self):
+        return f'<ConfigVersion {self.version} @ {self.updated_at}>'
+
+def bump_config_version():
+    """Incrementa o contador na sessão atual; deve ser chamado antes do commit que altera a configuração."""
+    row = db.session.get(ConfigVersion, 1)
+    if row is None:
+        db.session.add(ConfigVersion(id=1, version=1, updated_at=datetime.datetime.now()))
+    else:
+        row.version = ConfigVersion.version + 1
+        row.updated_at = datetime.datetime.now()
@@ -2,13 +2,19 @@ from app import db
 import datetime
 
 class ModbusData(db.Model):
+    # Particionada por mês em `timestamp` (ver app/services/telemetry_retention.py): a chave
+    # primária inclui a coluna de partição e tabelas particionadas não aceitam chave estrangeira
     __tablename__ = 'modbus_data'
-    id = db.Column(db.Integer, primary_key=True)
-    register_id = db.Column(db.Integer, db.ForeignKey('modbus_register.id', ondelete='CASCADE'), nullable=False)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    register_id = db.Column(db.Integer, nullable=False)
     value = db.Column(db.Float, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow, primary_key=True, nullable=False)
 
-    register = db.relationship('ModbusRegister', backref=db.backref('data', lazy='dynamic', cascade="all, delete-orphan"))
+    register = db.relationship('ModbusRegister', primaryjoin='ModbusData.register_id == ModbusRegister.id', foreign_keys=[register_id],
+                               backref=db.backref('data', lazy='dynamic', cascade="all, delete-orphan"))
+
+    # Séries de um registrador são lidas por faixa de tempo nesse índice
+    __table_args__ = (db.Index('ix_modbus_data_register_timestamp', 'register_id', 'timestamp'),)
 
     def __repr__(self):
         return f'<ModbusData {self.value} @ {self.timestamp}>'
@@ -27,17 +27,24 @@ class ModbusDevice(db.Model):
         info={"compare_type": False}
     )
     ativo = db.Column(db.Boolean, nullable=False, default=True)
+    poll_interval = db.Column(db.Float, nullable=True) # Intervalo padrão de leitura (s) dos registradores
+    # Vivacidade observada pelo master nas leituras normais (atualizada em lote)
+    status = db.Column(db.String(20), nullable=True) # 'Online', 'Offline' ou nulo se nunca contatado
+    last_seen = db.Column(db.DateTime, nullable=True) # Última resposta recebida
+    rtt_ms = db.Column(db.Float, nullable=True) # Tempo médio de resposta (ms)
+    error_count = db.Column(db.Integer, nullable=False, default=0) # Falhas de comunicação seguidas
     
     registers = db.relationship('ModbusRegister', back_populates='device', lazy=True, cascade="all, delete-orphan")
     motobombas = db.relationship('Motobomba', back_populates='modbus_slave')
     reservatorios = db.relationship('Reservatorio', back_populates='modbus_slave')
 
-    def __init__(self, device_name, ip_address, slave_id, type: DeviceType, ativo=True):
+    def __init__(self, device_name, ip_address, slave_id, type: DeviceType, ativo=True, poll_interval=None):
         self.device_name = device_name
         self.ip_address = ip_address
         self.slave_id = slave_id
         self.type = type
         self.ativo = ativo
+        self.poll_interval = poll_interval
 
 class ModbusRegister(db.Model):
     __tablename__ = "modbus_register"
@@ -53,12 +60,21 @@ class ModbusRegister(db.Model):
         nullable=False,
         info={"compare_type": False}
     )
-    last_value = db.Column(db.Float, nullable=True) # Last read value, updated automatically
+    last_value = db.Column(db.Float, nullable=True) # Obsoleto: o último valor lido fica em register_latest
     descricao = db.Column(db.String(120), nullable=True)
+    poll_interval = db.Column(db.Float, nullable=True) # Sobrepõe o intervalo de leitura do dispositivo (s)
+    poll_priority = db.Column(db.Integer, nullable=False, default=0) # Maior prioridade é lida primeiro
+    # Compressão das leituras gravadas pelo master; sem banda morta todas as leituras são gravadas
+    deadband = db.Column(db.Float, nullable=True) # Tolerância: absoluta ou em % do último valor gravado
+    deadband_percent = db.Column(db.Boolean, nullable=False, default=False)
+    swinging_door = db.Column(db.Boolean, nullable=False, default=False) # Tolerância em torno da tendência (porta giratória)
+    heartbeat_interval = db.Column(db.Float, nullable=True) # Intervalo máximo (s) entre pontos gravados
 
     device = db.relationship('ModbusDevice', back_populates='registers')
 
-    def __init__(self, device_id, name, function_code, address, data_type, scale, rw: RegisterRWType, descricao=None):
+    def __init__(self, device_id, name, function_code, address, data_type, scale, rw: RegisterRWType, descricao=None,
+                 poll_interval=None, poll_priority=0, deadband=None, deadband_percent=False, swinging_door=False,
+                 heartbeat_interval=None):
         self.device_id = device_id
         self.name = name
         self.function_code = function_code
@@ -67,6 +83,12 @@ class ModbusRegister(db.Model):
         self.scale = scale
         self.rw = rw
         self.descricao = descricao
+        self.poll_interval = poll_interval
+        self.poll_priority = poll_priority
+        self.deadband = deadband
+        self.deadband_percent = deadband_percent
+        self.swinging_door = swinging_door
+        self.heartbeat_interval = heartbeat_interval
 
     def to_dict(self):
         return {
@@ -79,7 +101,13 @@ class ModbusRegister(db.Model):
             'scale': self.scale,
             'rw': self.rw.value, # Converte o Enum para string
             'last_value': self.last_value,
-            'descricao': self.descricao
+            'descricao': self.descricao,
+            'poll_interval': self.poll_interval,
+            'poll_priority': self.poll_priority,
+            'deadband': self.deadband,
+            'deadband_percent': self.deadband_percent,
+            'swinging_door': self.swinging_door,
+            'heartbeat_interval': self.heartbeat_interval
         }
 
 class ModbusDeviceForm(FlaskForm):
@@ -88,6 +116,7 @@ class ModbusDeviceForm(FlaskForm):
     slave_id = IntegerField('ID do Escravo', validators=[DataRequired(), NumberRange(min=1, max=247)])
     type = SelectField('Tipo de Dispositivo', choices=[(choice.value, choice.value.capitalize()) for choice in DeviceType], validators=[DataRequired()])
     ativo = BooleanField('Ativo', default=True)
+    poll_interval = FloatField('Intervalo de Leitura (s)', validators=[Optional(), NumberRange(min=0.1)])
     submit = SubmitField('Salvar Dispositivo')
 
     def __init__(self, original_slave_id=None, *args, **kwargs):
@@ -2,14 +2,29 @@ from app import db
 import datetime
 
 class ModbusRuleLog(db.Model):
+    # Particionada por mês em `timestamp` (ver app/services/telemetry_retention.py): a chave
+    # primária inclui a coluna de partição e tabelas particionadas não aceitam chave estrangeira
     __tablename__ = 'modbus_rule_log'
-    id = db.Column(db.Integer, primary_key=True)
-    rule_id = db.Column(db.Integer, db.ForeignKey('modbus_rule.id'), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    rule_id = db.Column(db.Integer, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow, primary_key=True, nullable=False)
+    # 'transicao': mudança de condition_result/action_executed (ver app/services/rule_log.py);
+    # 'resumo': contadores do período encerrado em `timestamp`
+    kind = db.Column(db.String(10), nullable=False, default='transicao', server_default='transicao')
     condition_result = db.Column(db.Boolean, nullable=False)
     action_executed = db.Column(db.Boolean, nullable=False)
+    # Valores das condições no momento da transição
+    detail = db.Column(db.String(255), nullable=True)
+    evaluations = db.Column(db.Integer, nullable=True)
+    true_count = db.Column(db.Integer, nullable=True)
+    action_count = db.Column(db.Integer, nullable=True)
 
-    rule = db.relationship('ModbusRule', backref=db.backref('modbus_logs', lazy=True))
+    # O histórico é mantido quando a regra é excluída (auditoria)
+    rule = db.relationship('ModbusRule', primaryjoin='ModbusRuleLog.rule_id == ModbusRule.id', foreign_keys=[rule_id],
+                           backref=db.backref('modbus_logs', lazy='dynamic', passive_deletes='all'))
+
+    # O histórico de uma regra é lido por faixa de tempo nesse índice
+    __table_args__ = (db.Index('ix_modbus_rule_log_rule_timestamp', 'rule_id', 'timestamp'),)
 
     def __repr__(self):
-        return f'<ModbusRuleLog Rule:{self.rule_id} @ {self.timestamp} Result:{self.condition_result} Action:{self.action_executed}>'
\ No newline at end of file
+        return f'<ModbusRuleLog Rule:{self.rule_id} @ {self.timestamp} {self.kind} Result:{self.condition_result} Action:{self.action_executed}>'
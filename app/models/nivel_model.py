@@ -1,17 +1,28 @@
 from app import db
+from sqlalchemy.dialects.mysql import DATETIME
+import datetime
 
 
 class Nivel(db.Model):
+    # Particionada por mês em `data` (ver app/services/telemetry_retention.py): a chave
+    # primária inclui a coluna de partição e tabelas particionadas não aceitam chave estrangeira
     __tablename__ = "nivel"
     id = db.Column(db.Integer, primary_key=True, autoincrement=True, nullable=False)
     valor = db.Column(db.Integer, nullable=False)
-    data = db.Column(db.Date, nullable=False)
+    data = db.Column(db.Date, primary_key=True, nullable=False)
     hora = db.Column(db.Time, nullable=False)
-    reservatorio_id = db.Column(db.Integer, db.ForeignKey("reservatorio.id"), nullable=False)
-    reservatorio = db.relationship("Reservatorio", backref="niveis")
+    # Data e hora combinadas (ms); consultas por reservatório usam o índice (reservatorio_id, ts)
+    ts = db.Column(db.DateTime().with_variant(DATETIME(fsp=3), 'mysql', 'mariadb'), nullable=False)
+    reservatorio_id = db.Column(db.Integer, nullable=False)
+    reservatorio = db.relationship("Reservatorio", primaryjoin="Nivel.reservatorio_id == Reservatorio.id", foreign_keys=[reservatorio_id], backref="niveis")
+
+    # A lista paginada de todos os reservatórios percorre o índice (ts)
+    __table_args__ = (db.Index('ix_nivel_reservatorio_ts', 'reservatorio_id', 'ts'),
+                      db.Index('ix_nivel_ts', 'ts'))
 
     def __init__(self, valor, data, hora, reservatorio):
         self.valor = valor
         self.data = data
         self.hora = hora
+        self.ts = datetime.datetime.combine(data, hora)
         self.reservatorio = reservatorio
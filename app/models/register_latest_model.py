@@ -0,0 +1,16 @@
+from app import db
+from sqlalchemy.dialects.mysql import DATETIME
+
+
+class RegisterLatest(db.Model):
+    """Último valor lido de cada registrador, mantido pelo master com upserts em lote (uma linha por registrador)."""
+    __tablename__ = 'register_latest'
+    register_id = db.Column(db.Integer, db.ForeignKey('modbus_register.id', ondelete='CASCADE'), primary_key=True)
+    value = db.Column(db.Float, nullable=False)
+    ts = db.Column(db.DateTime().with_variant(DATETIME(fsp=3), 'mysql', 'mariadb'), nullable=False)
+    quality = db.Column(db.String(20), nullable=False, default='good') # 'good' ou 'unavailable' (escravo sem resposta)
+
+    register = db.relationship('ModbusRegister', backref=db.backref('latest', uselist=False, cascade="all, delete-orphan"))
+
+    def __repr__(self):
+        return f'<RegisterLatest {self.register_id} {self.value} @ {self.ts} {self.quality}>'
@@ -0,0 +1,39 @@
+from app import db
+
+
+class RollupColumns:
+    """Agregados de um intervalo (bucket) da série; a média é soma / quantidade."""
+    resolution = db.Column(db.Integer, nullable=False) # Largura do bucket (s): 60, 3600 ou 86400
+    bucket = db.Column(db.DateTime, nullable=False) # Início do bucket
+    min_value = db.Column(db.Float, nullable=False)
+    max_value = db.Column(db.Float, nullable=False)
+    sum_value = db.Column(db.Float, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    first_value = db.Column(db.Float, nullable=False)
+    first_at = db.Column(db.DateTime, nullable=False)
+    last_value = db.Column(db.Float, nullable=False)
+    last_at = db.Column(db.DateTime, nullable=False)
+
+    @property
+    def avg_value(self):
+        return self.sum_value / self.count if self.count else None
+
+
+class ModbusDataRollup(RollupColumns, db.Model):
+    """Agregados por registrador de `modbus_data`, mantidos pelo master a cada leitura."""
+    __tablename__ = 'modbus_data_rollup'
+    __table_args__ = (db.PrimaryKeyConstraint('register_id', 'resolution', 'bucket'),)
+    register_id = db.Column(db.Integer, db.ForeignKey('modbus_register.id', ondelete='CASCADE'), nullable=False)
+
+    def __repr__(self):
+        return f'<ModbusDataRollup {self.register_id} {self.resolution}s @ {self.bucket}>'
+
+
+class NivelRollup(RollupColumns, db.Model):
+    """Agregados por reservatório de `nivel` (volume em litros)."""
+    __tablename__ = 'nivel_rollup'
+    __table_args__ = (db.PrimaryKeyConstraint('reservatorio_id', 'resolution', 'bucket'),)
+    reservatorio_id = db.Column(db.Integer, db.ForeignKey('reservatorio.id'), nullable=False)
+
+    def __repr__(self):
+        return f'<NivelRollup {self.reservatorio_id} {self.resolution}s @ {self.bucket}>'
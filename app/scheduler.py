@@ -1,8 +1,13 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from modbus_master import ModbusMaster
 from models import db, Leitura
+from app.services.db_batch_writer import BatchWriter, SqliteSpill, spill_path
 
 modbus = ModbusMaster()
+# As leituras são enfileiradas e gravadas em lote por uma thread, sem commit por leitura
+writer = None
+
+LEITURA_INSERT_SQL = f"INSERT INTO {Leitura.__tablename__} (nome_escravo, valor) VALUES (:nome_escravo, :valor)"
 
 def ler_escravos():
     escravos = {
@@ -13,14 +18,13 @@ def ler_escravos():
     for nome, id_escravo in escravos.items():
         try:
             valor = modbus.read_input_registers(id_escravo, address=0, count=1)[0]
-            leitura = Leitura(nome_escravo=nome, valor=valor)
-            db.session.add(leitura)
-            db.session.commit()
+            writer.submit(LEITURA_INSERT_SQL, {'nome_escravo': nome, 'valor': valor})
         except Exception as e:
             print(f"Erro ao ler {nome}: {e}")
 
 def iniciar_agendador():
+    global writer
+    writer = BatchWriter(db.engine, name="agendador", spill=SqliteSpill(spill_path("agendador"))).start()
     scheduler = BackgroundScheduler()
     scheduler.add_job(ler_escravos, 'interval', seconds=10)
     scheduler.start()
-
@@ -0,0 +1,517 @@
+import datetime
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from sqlalchemy.exc import DBAPIError, DisconnectionError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+from app.services.db_engine import statement
+
+log = logging.getLogger(__name__)
+
+# Políticas quando a fila está cheia (banco lento ou fora do ar)
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+SPILL = 'spill'
+
+DEFAULT_CAPACITY = 10000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_DELAY_MS = 1000
+# Espera entre tentativas após falha de gravação: dobra até o máximo
+RETRY_DELAY_INITIAL = 0.5
+RETRY_DELAY_MAX = 30.0
+# Tentativas de um lote quando o banco está indisponível e não há armazenamento local
+RETRY_ATTEMPTS = 6
+# Ocupação da fila a partir da qual a contrapressão é registrada no log
+BACKPRESSURE_WARN_RATIO = 0.8
+WARN_INTERVAL = 60
+# Armazenamento local (store-and-forward) usado enquanto o banco está fora do ar
+DEFAULT_SPILL_DIR = os.environ.get('SPILL_DIR', os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'spill'))
+DEFAULT_SPILL_MAX_BYTES = int(os.environ.get('SPILL_MAX_MB', 256)) * 1024 * 1024
+# Linhas reenviadas por transação ao esvaziar o armazenamento local
+REPLAY_CHUNK = 5000
+# Fração das linhas mais antigas descartada quando o armazenamento local passa do limite
+SPILL_TRIM_RATIO = 0.1
+
+_STOP = object()
+
+
+def _encode_param(value):
+    if isinstance(value, datetime.datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'__date__': value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {'__time__': value.isoformat()}
+    return value
+
+
+def _decode_param(value):
+    if isinstance(value, dict):
+        if '__datetime__' in value:
+            return datetime.datetime.fromisoformat(value['__datetime__'])
+        if '__date__' in value:
+            return datetime.date.fromisoformat(value['__date__'])
+        if '__time__' in value:
+            return datetime.time.fromisoformat(value['__time__'])
+    return value
+
+
+def is_transient(error):
+    """
+    True para falhas de disponibilidade do banco (conexão perdida, servidor fora,
+    pool esgotado), que valem nova tentativa; as demais são erros dos próprios
+    dados (chave estrangeira, CHECK, tipo) e se repetiriam em qualquer tentativa.
+    """
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or isinstance(error, (OperationalError, InterfaceError))
+    return isinstance(error, (DisconnectionError, PoolTimeoutError))
+
+
+def spill_path(name, directory=DEFAULT_SPILL_DIR):
+    return os.path.join(directory, f"{name}.sqlite")
+
+
+class SqliteSpill:
+    """
+    Armazenamento local das linhas que não chegaram ao banco: SQLite em modo
+    WAL, lido em ordem de chegada. As linhas só saem do arquivo depois de
+    gravadas no banco (`ack`), sobrevivendo a uma queda do processo. Acima de
+    `max_bytes` as mais antigas são descartadas.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_SPILL_MAX_BYTES):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS spill (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "queued_at REAL NOT NULL, sql TEXT NOT NULL, params TEXT NOT NULL)"
+        )
+        self.pending = self._connection.execute("SELECT COUNT(*) FROM spill").fetchone()[0]
+        self.discarded = 0
+        self.closed = False
+
+    def put(self, rows):
+        now = time.time()
+        with self._lock:
+            with self._connection:
+                self._connection.execute("BEGIN")
+                self._connection.executemany(
+                    "INSERT INTO spill (queued_at, sql, params) VALUES (?, ?, ?)",
+                    [(now, sql, json.dumps({key: _encode_param(value) for key, value in params.items()})) for sql, params in rows],
+                )
+            self.pending += len(rows)
+            self._trim()
+
+    def peek(self, limit):
+        """Linhas mais antigas, sem removê-las: (último seq, [(sql, params)])."""
+        with self._lock:
+            rows = self._connection.execute("SELECT seq, sql, params FROM spill ORDER BY seq LIMIT ?", (limit,)).fetchall()
+        if not rows:
+            return None, []
+        return rows[-1][0], [
+            (sql, {key: _decode_param(value) for key, value in json.loads(params).items()}) for _, sql, params in rows
+        ]
+
+    def ack(self, last_seq):
+        """Remove as linhas já gravadas no banco, até `last_seq`."""
+        with self._lock:
+            removed = self._connection.execute("DELETE FROM spill WHERE seq <= ?", (last_seq,)).rowcount
+            self.pending -= removed
+
+    def lag(self):
+        """Idade (s) da linha pendente mais antiga."""
+        with self._lock:
+            if self.closed:
+                return 0.0
+            oldest = self._connection.execute("SELECT MIN(queued_at) FROM spill").fetchone()[0]
+        return time.time() - oldest if oldest is not None else 0.0
+
+    def size_bytes(self):
+        """Espaço ocupado pelas linhas (as páginas livres são reaproveitadas pelo SQLite)."""
+        with self._lock:
+            if self.closed:
+                return 0
+            page_size = self._connection.execute("PRAGMA page_size").fetchone()[0]
+            pages = self._connection.execute("PRAGMA page_count").fetchone()[0]
+            free = self._connection.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - free) * page_size
+
+    def _trim(self):
+        if self.size_bytes() <= self.max_bytes:
+            return
+        count = max(int(self.pending * SPILL_TRIM_RATIO), 1)
+        removed = self._connection.execute(
+            "DELETE FROM spill WHERE seq IN (SELECT seq FROM spill ORDER BY seq LIMIT ?)", (count,)
+        ).rowcount
+        self.pending -= removed
+        self.discarded += removed
+        log.warning(f"Armazenamento local {self.path} acima de {self.max_bytes // (1024 * 1024)} MB: {removed} linhas mais antigas descartadas.")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+            self.closed = True
+
+
+class BatchWriter:
+    """
+    Gravador em segundo plano (write-behind) para inserções de telemetria.
+    `submit` apenas enfileira e nunca bloqueia; uma thread esvazia a fila e
+    grava com executemany, agrupando por SQL, quando acumula `batch_size`
+    linhas ou quando a mais antiga pendente completa `max_delay_ms`. Com a fila
+    cheia, a política descarta a linha nova, a mais antiga, ou transborda em disco.
+
+    No transbordo, `submit` só acrescenta a linha a uma lista em memória (até
+    `capacity` linhas; além disso ela é descartada) e a thread do gravador a
+    leva ao armazenamento local: primeiro o lote corrente e a fila, depois a
+    lista. Enquanto a lista não estiver vazia, as novas linhas também vão para
+    ela, então a ordem de chegada se mantém até o reenvio.
+
+    Com um `spill` (SqliteSpill), um lote que falha por indisponibilidade do
+    banco vai para o armazenamento local em vez de prender a thread em novas
+    tentativas; enquanto houver linhas lá, os lotes seguintes também vão, e o
+    conteúdo é reenviado em ordem e em blocos assim que o banco volta. Linhas
+    recusadas pelo banco (erro de dados) nunca vão para lá: são isoladas e descartadas.
+    """
+
+    def __init__(self, engine, name='db', capacity=DEFAULT_CAPACITY, batch_size=DEFAULT_BATCH_SIZE,
+                 max_delay_ms=DEFAULT_MAX_DELAY_MS, policy=DROP_OLDEST, spill=None):
+        if policy == SPILL and spill is None:
+            raise ValueError("A política 'spill' exige um destino de transbordo.")
+        self.engine = engine
+        self.name = name
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.max_delay = max_delay_ms / 1000.0
+        self.policy = policy
+        self.spill = spill
+        self._queue = queue.Queue(maxsize=capacity)
+        # Transbordo (política SPILL): linhas que não couberam na fila, gravadas em disco pela thread
+        self._overflow_rows = []
+        self._overflow_lock = threading.Lock()
+        self._thread = None
+        self._counters_lock = threading.Lock()
+        self._last_warning = 0.0
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.flushes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.replayed = 0
+        self.high_watermark = 0
+        self.last_flush_ms = None
+        self.last_error = None
+        self._retry_delay = RETRY_DELAY_INITIAL
+        self._next_replay = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"batch-writer-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=30):
+        """Grava o que estiver pendente e encerra a thread."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, sql, params):
+        """Enfileira uma linha; devolve False se ela foi descartada pela política de fila cheia."""
+        item = (sql, params)
+        if self.policy == SPILL:
+            return self._submit_spilling(item)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            return self._overflow(item)
+        self._count(enqueued=1)
+        self._check_backpressure()
+        return True
+
+    def _submit_spilling(self, item):
+        # A decisão entre fila e transbordo é atômica com a troca da lista em _spill_overflow
+        with self._overflow_lock:
+            if not self._overflow_rows:
+                try:
+                    self._queue.put_nowait(item)
+                except queue.Full:
+                    pass
+                else:
+                    self._count(enqueued=1)
+                    self._check_backpressure()
+                    return True
+            if len(self._overflow_rows) >= self.capacity:
+                self._count(dropped=1)
+                self._warn(f"Transbordo do gravador '{self.name}' cheio ({self.capacity} linhas): {self.dropped} linha(s) descartada(s).")
+                return False
+            self._overflow_rows.append(item)
+        self._warn(f"Fila do gravador '{self.name}' cheia: linhas transbordando para {self.spill.path}.")
+        return True
+
+    def _spill_overflow(self, batch):
+        """
+        Leva ao armazenamento local, em ordem de chegada, o lote corrente, o que
+        houver na fila e o transbordo. Devolve True se encontrou o pedido de parada.
+        """
+        rows = list(batch)
+        stopping = False
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stopping = True
+            else:
+                rows.append(item)
+        with self._overflow_lock:
+            rows.extend(self._overflow_rows)
+            self._overflow_rows = []
+        self.spill.put(rows)
+        self._count(spilled=len(rows))
+        return stopping
+
+    def _overflow(self, item):
+        if self.policy == DROP_OLDEST:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(item)
+                self._count(enqueued=1, dropped=1)
+            except queue.Full:
+                self._count(dropped=1)
+        else:
+            self._count(dropped=1)
+        self._warn(f"Fila do gravador '{self.name}' cheia ({self.capacity} linhas): {self.dropped} linha(s) descartada(s).")
+        return self.policy == DROP_OLDEST
+
+    def _count(self, **increments):
+        with self._counters_lock:
+            for counter, increment in increments.items():
+                setattr(self, counter, getattr(self, counter) + increment)
+
+    def _warn(self, message):
+        now = time.monotonic()
+        if now - self._last_warning >= WARN_INTERVAL:
+            self._last_warning = now
+            log.warning(message)
+
+    def _check_backpressure(self):
+        depth = self._queue.qsize()
+        if depth > self.high_watermark:
+            self.high_watermark = depth
+        if depth >= self.capacity * BACKPRESSURE_WARN_RATIO:
+            self._warn(f"Contrapressão no gravador '{self.name}': {depth} de {self.capacity} linhas na fila.")
+
+    def stats(self):
+        """Métricas de contrapressão para log e monitoramento."""
+        return {
+            'queue_depth': self._queue.qsize(),
+            'capacity': self.capacity,
+            'high_watermark': self.high_watermark,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'spilled': self.spilled,
+            'overflow': len(self._overflow_rows),
+            'spill_pending': self.spill.pending if self.spill is not None else 0,
+            'spill_lag_s': round(self.spill.lag(), 1) if self.spill is not None and self.spill.pending else 0.0,
+            'spill_bytes': self.spill.size_bytes() if self.spill is not None else 0,
+            'spill_discarded': self.spill.discarded if self.spill is not None else 0,
+            'replayed': self.replayed,
+            'flushes': self.flushes,
+            'failures': self.failures,
+            'rejected': self.rejected,
+            'last_flush_ms': self.last_flush_ms,
+            'last_error': self.last_error,
+        }
+
+    def _write(self, rows):
+        grouped = {}
+        for sql, params in rows:
+            grouped.setdefault(sql, []).append(params)
+        started = time.monotonic()
+        with self.engine.begin() as connection:
+            for sql, params_list in grouped.items():
+                connection.execute(statement(sql), params_list)
+        self.last_flush_ms = (time.monotonic() - started) * 1000
+
+    def _write_isolated(self, rows):
+        """
+        Grava as linhas uma a uma, cada uma em um savepoint da mesma transação,
+        e devolve as rejeitadas pelo banco [(sql, params, erro)]. Uma falha de
+        conexão desfaz tudo e é propagada, para que o lote inteiro seja repetido.
+        """
+        rejected = []
+        with self.engine.begin() as connection:
+            for sql, params in rows:
+                try:
+                    with connection.begin_nested():
+                        connection.execute(statement(sql), params)
+                except Exception as e:
+                    if is_transient(e):
+                        raise
+                    rejected.append((sql, params, e))
+        return rejected
+
+    def _deliver(self, rows):
+        """
+        Grava as linhas e devolve quantas chegaram ao banco. Se o lote for recusado
+        por erro de dados, as linhas são gravadas isoladamente e as rejeitadas
+        descartadas, para que uma linha ruim não bloqueie as demais. Só falhas de
+        disponibilidade do banco são propagadas.
+        """
+        try:
+            self._write(rows)
+            return len(rows)
+        except Exception as e:
+            if is_transient(e):
+                raise
+            self._count(failures=1)
+            log.warning(f"Gravador '{self.name}': lote de {len(rows)} linhas recusado ({e}); gravando linha a linha.")
+        rejected = self._write_isolated(rows)
+        if rejected:
+            sql, params, error = rejected[0]
+            self._count(rejected=len(rejected))
+            self.last_error = str(error)
+            log.error(f"Gravador '{self.name}': {len(rejected)} linha(s) rejeitada(s) pelo banco e descartada(s). "
+                      f"Primeira: {sql[:80]}... {params} ({error})")
+        return len(rows) - len(rejected)
+
+    def _flush(self, batch, stopping=False):
+        """
+        Grava o lote; sem armazenamento local, repete com espera crescente enquanto
+        o banco estiver indisponível, até RETRY_ATTEMPTS tentativas, e então descarta o lote.
+        """
+        if self.spill is not None:
+            self._store_and_forward(batch)
+            return
+        delay = RETRY_DELAY_INITIAL
+        for attempt in range(1, RETRY_ATTEMPTS + 1):
+            try:
+                written = self._deliver(batch)
+            except Exception as e:
+                self._count(failures=1)
+                self.last_error = str(e)
+                if stopping or attempt == RETRY_ATTEMPTS:
+                    log.error(f"Gravador '{self.name}': {len(batch)} linhas descartadas após {attempt} tentativa(s): {e}")
+                    self._count(dropped=len(batch))
+                    return
+                self._warn(f"Gravador '{self.name}': falha ao gravar {len(batch)} linhas ({e}). Nova tentativa em {delay:.1f}s.")
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_DELAY_MAX)
+                continue
+            self._count(written=written, flushes=1)
+            if written == len(batch):
+                self.last_error = None
+            return
+
+    def _store_and_forward(self, batch):
+        # Com linhas pendentes no armazenamento local, o lote entra no fim da fila local para manter a ordem.
+        # Só a indisponibilidade do banco leva ao armazenamento local; linhas rejeitadas são descartadas em _deliver
+        if not self.spill.pending:
+            try:
+                written = self._deliver(batch)
+                self._count(written=written, flushes=1)
+                if written == len(batch):
+                    self.last_error = None
+                return
+            except Exception as e:
+                self._count(failures=1)
+                self.last_error = str(e)
+                self._schedule_replay()
+                log.error(f"Gravador '{self.name}': banco indisponível ({e}). Guardando as linhas em {self.spill.path}.")
+        self.spill.put(batch)
+        self._count(spilled=len(batch))
+
+    def _schedule_replay(self):
+        self._next_replay = time.monotonic() + self._retry_delay
+        self._retry_delay = min(self._retry_delay * 2, RETRY_DELAY_MAX)
+
+    def _replay_spill(self):
+        """Reenvia o armazenamento local em ordem, em blocos, enquanto a fila em memória tiver folga."""
+        if self.spill is None or not self.spill.pending or time.monotonic() < self._next_replay:
+            return
+        lag = self.spill.lag()
+        replayed = 0
+        while self.spill.pending and self._queue.qsize() <= self.capacity // 2:
+            last_seq, rows = self.spill.peek(REPLAY_CHUNK)
+            if not rows:
+                break
+            try:
+                written = self._deliver(rows)
+            except Exception as e:
+                self._count(failures=1)
+                self.last_error = str(e)
+                self._schedule_replay()
+                self._warn(f"Gravador '{self.name}': banco ainda indisponível ({e}); {self.spill.pending} linhas guardadas localmente.")
+                break
+            # As linhas rejeitadas já foram descartadas por _deliver: o bloco sai inteiro do armazenamento local
+            self.spill.ack(last_seq)
+            self._count(written=written, replayed=written, flushes=1)
+            if written == len(rows):
+                self.last_error = None
+            self._retry_delay = RETRY_DELAY_INITIAL
+            replayed += len(rows)
+        if replayed:
+            log.info(f"Gravador '{self.name}': {replayed} linhas guardadas localmente reenviadas (atraso de {lag:.0f}s); {self.spill.pending} pendentes.")
+
+    def _run(self):
+        batch = []
+        deadline = None
+        stopping = False
+        while not stopping:
+            wake = deadline
+            if self.spill is not None and self.spill.pending:
+                wake = self._next_replay if wake is None else min(wake, self._next_replay)
+            timeout = None if wake is None else max(wake - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.max_delay
+                batch.append(item)
+                # Esvazia o que já estiver na fila sem esperar, até completar o lote
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+            if self._overflow_rows:
+                stopping = self._spill_overflow(batch) or stopping
+                batch = []
+                deadline = None
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch, stopping)
+                batch = []
+                deadline = None
+            if not stopping:
+                self._replay_spill()
+        log.info(f"Gravador '{self.name}' finalizado: {self.stats()}")
+        if self.spill is not None:
+            if self.spill.pending:
+                log.warning(f"Gravador '{self.name}': {self.spill.pending} linhas ficam em {self.spill.path} e serão reenviadas na próxima execução.")
+            self.spill.close()
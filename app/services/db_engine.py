@@ -0,0 +1,57 @@
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from config import SQLALCHEMY_ENGINE_OPTIONS as ENGINE_OPTIONS
+
+# Um engine (e um pool de conexões) por URI no processo, compartilhado por todas as threads e tarefas
+_engines = {}
+_sessionmakers = {}
+_lock = threading.Lock()
+
+
+def get_engine(uri):
+    with _lock:
+        engine = _engines.get(uri)
+        if engine is None:
+            engine = create_engine(uri, **ENGINE_OPTIONS)
+            _engines[uri] = engine
+            _sessionmakers[uri] = sessionmaker(bind=engine, expire_on_commit=False)
+        return engine
+
+
+def get_sessionmaker(uri):
+    get_engine(uri)
+    return _sessionmakers[uri]
+
+
+@contextmanager
+def session_scope(uri):
+    """
+    Sessão de curta duração (um ciclo ou uma consulta): confirma ao final, desfaz
+    em caso de erro e é sempre fechada, para o identity map não crescer no processo.
+    """
+    session = get_sessionmaker(uri)()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+@lru_cache(maxsize=256)
+def statement(sql):
+    """text() de um SQL montado uma única vez; as instruções frequentes reaproveitam o objeto e o cache de compilação."""
+    return text(sql)
+
+
+def dispose_engines():
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _sessionmakers.clear()
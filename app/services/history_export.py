@@ -0,0 +1,331 @@
+import argparse
+import csv
+import datetime
+import gzip
+import io
+import json
+import logging
+import os
+import zlib
+from sqlalchemy import text
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError: # Parquet é opcional; sem pyarrow só CSV compactado
+    pyarrow = None
+
+log = logging.getLogger(__name__)
+
+# Tabelas exportáveis: colunas, chave de ordenação (seguida por um índice) e filtros por série.
+# modbus_data e nivel são lidas série por série, cada uma em ordem de (tempo, id) pelo índice
+# (série, tempo); acionamento segue o índice (data, hora_lig). O InnoDB guarda o id em todo índice
+# secundário, então o desempate por id não exige ordenação no servidor.
+SOURCES = {
+    'modbus_data': {
+        'columns': ('id', 'register_id', 'timestamp', 'value'),
+        'series': 'register_id',
+        'key': ('timestamp', 'id'),
+        'filters': {'register': 'register_id'},
+    },
+    'nivel': {
+        'columns': ('id', 'reservatorio_id', 'ts', 'valor'),
+        'series': 'reservatorio_id',
+        'key': ('ts', 'id'),
+        'filters': {'reservatorio': 'reservatorio_id'},
+    },
+    'acionamento': {
+        'columns': ('id', 'mb_id', 'data', 'hora_lig', 'hora_des', 'tensao', 'corrente', 'potencia', 'consumo', 'consumo_kwh', 'situacao_id'),
+        'series': None,
+        'key': ('data', 'hora_lig', 'id'),
+        'filters': {'motobomba': 'mb_id'},
+    },
+}
+FORMATS = ('csv', 'parquet')
+
+# Tipos das colunas de chave, para reconstruir `after` salvo em JSON
+KEY_TYPES = {
+    'id': int,
+    'register_id': int,
+    'reservatorio_id': int,
+    'timestamp': datetime.datetime.fromisoformat,
+    'ts': datetime.datetime.fromisoformat,
+    'data': datetime.date.fromisoformat,
+    'hora_lig': datetime.time.fromisoformat,
+}
+
+# Linhas trazidas do cursor por vez; a memória usada não depende do tamanho do período
+FETCH_SIZE = 10000
+# Linhas por arquivo exportado
+ROWS_PER_FILE = 1000000
+
+
+def key_columns(source):
+    """Colunas da chave de retomada: a série (quando lida série por série) e a chave de ordenação."""
+    spec = SOURCES[source]
+    return ((spec['series'],) if spec['series'] else ()) + spec['key']
+
+
+def _seek(columns, prefix, operator='>'):
+    """
+    Condição "(colunas) > (valores)" expandida em OR/AND, que o otimizador
+    resolve como faixa do índice (a comparação de tuplas não usa índice no MariaDB).
+    """
+    terms = []
+    for position, column in enumerate(columns):
+        equal = [f"{previous} = :{prefix}{index}" for index, previous in enumerate(columns[:position])]
+        last = operator if position == len(columns) - 1 else operator[0]
+        terms.append("(" + " AND ".join(equal + [f"{column} {last} :{prefix}{position}"]) + ")")
+    return "(" + " OR ".join(terms) + ")" if len(terms) > 1 else terms[0][1:-1]
+
+
+def _time_bound(source, value, prefix, operator):
+    """Filtro de período sobre as colunas de tempo da chave; acionamento compara (data, hora_lig)."""
+    spec = SOURCES[source]
+    if spec['key'][0] == 'data':
+        return _seek(('data', 'hora_lig'), prefix, operator), {f'{prefix}0': value.date(), f'{prefix}1': value.time()}
+    return f"{spec['key'][0]} {operator} :{prefix}", {prefix: value}
+
+
+def build_query(source, start=None, end=None, series=None, after=None, series_id=None):
+    """
+    SELECT ordenado pela chave da tabela com os filtros informados. `series` é
+    {filtro: [ids]}; `series_id` restringe a uma série (leitura série por série)
+    e `after` é a chave (sem a série) da última linha já exportada, para retomar
+    de onde uma exportação parou.
+    """
+    spec = SOURCES[source]
+    conditions = []
+    params = {}
+    if series_id is not None:
+        conditions.append(f"{spec['series']} = :series_id")
+        params['series_id'] = series_id
+    for name, ids in (series or {}).items():
+        column = spec['filters'][name]
+        if column == spec['series']:
+            continue
+        placeholders = ', '.join(f":{name}{position}" for position in range(len(ids)))
+        conditions.append(f"{column} IN ({placeholders})")
+        params.update({f"{name}{position}": value for position, value in enumerate(ids)})
+    for value, prefix, operator in ((start, 'start', '>='), (end, 'end', '<')):
+        if value is not None:
+            condition, bound = _time_bound(source, value, prefix, operator)
+            conditions.append(condition)
+            params.update(bound)
+    if after is not None:
+        conditions.append(_seek(spec['key'], 'after'))
+        params.update({f'after{position}': value for position, value in enumerate(after)})
+
+    sql = f"SELECT {', '.join(spec['columns'])} FROM {source}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {', '.join(spec['key'])}"
+    return text(sql), params
+
+
+def series_ids(connection, source, series=None):
+    """Séries a percorrer: as filtradas ou todas as presentes na tabela (varredura solta do índice)."""
+    spec = SOURCES[source]
+    for name, ids in (series or {}).items():
+        if spec['filters'][name] == spec['series']:
+            return sorted(ids)
+    column = spec['series']
+    return connection.execute(text(f"SELECT DISTINCT {column} FROM {source} ORDER BY {column}")).scalars().all()
+
+
+def stream_rows(connection, source, start=None, end=None, series=None, after=None):
+    """
+    Lê as linhas com cursor no servidor, FETCH_SIZE por vez, uma série de cada
+    vez quando a tabela tem série: gera (chave, linha), com a chave de key_columns.
+    """
+    spec = SOURCES[source]
+    streaming = connection.execution_options(stream_results=True, yield_per=FETCH_SIZE)
+    positions = [spec['columns'].index(column) for column in key_columns(source)]
+    if spec['series'] is None:
+        scans = [(None, after)]
+    else:
+        scans = [(series_id, None) for series_id in series_ids(connection, source, series)]
+        if after is not None:
+            # Retomada: termina a série interrompida e segue pelas seguintes
+            scans = [(after[0], after[1:])] + [(series_id, None) for series_id, _ in scans if series_id > after[0]]
+    for series_id, resume in scans:
+        query, params = build_query(source, start, end, series, resume, series_id)
+        for row in streaming.execute(query, params):
+            row = tuple(row)
+            yield tuple(row[position] for position in positions), row
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def iter_csv_gzip(rows, columns):
+    """Gera o CSV compactado (gzip) em pedaços, para respostas HTTP em streaming."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, (_, row) in enumerate(rows, 1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % FETCH_SIZE == 0:
+            yield compressor.compress(buffer.getvalue().encode('utf-8'))
+            buffer.seek(0)
+            buffer.truncate()
+    yield compressor.compress(buffer.getvalue().encode('utf-8'))
+    yield compressor.flush()
+
+
+class _CsvPart:
+    extension = 'csv.gz'
+
+    def __init__(self, path, columns):
+        self.file = gzip.open(path, 'wt', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows([[_csv_value(value) for value in row] for row in rows])
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetPart:
+    extension = 'parquet'
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self.writer = None
+
+    def write(self, rows):
+        table = pyarrow.table({column: [row[position] for row in rows] for position, column in enumerate(self.columns)})
+        if self.writer is None:
+            self.writer = pyarrow.parquet.ParquetWriter(self.path, table.schema, compression='zstd')
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class Exporter:
+    """
+    Exporta uma tabela para arquivos numerados em `directory`, ROWS_PER_FILE
+    linhas cada. Ao fechar cada arquivo, grava em `<tabela>.progress.json` a
+    última linha exportada; uma nova execução com os mesmos filtros continua dali.
+    """
+
+    def __init__(self, source, directory, fmt='csv', rows_per_file=ROWS_PER_FILE):
+        if fmt == 'parquet' and pyarrow is None:
+            raise RuntimeError("Exportação em Parquet requer o pacote 'pyarrow' (pip install pyarrow).")
+        self.source = source
+        self.directory = directory
+        self.part_class = _ParquetPart if fmt == 'parquet' else _CsvPart
+        self.rows_per_file = rows_per_file
+        self.columns = SOURCES[source]['columns']
+        self.progress_path = os.path.join(directory, f"{source}.progress.json")
+
+    def load_progress(self, filters):
+        if not os.path.exists(self.progress_path):
+            return {'part': 0, 'rows': 0, 'after': None}
+        with open(self.progress_path, encoding='utf-8') as progress_file:
+            progress = json.load(progress_file)
+        if progress.get('filters') != filters:
+            raise RuntimeError(f"{self.progress_path} pertence a uma exportação com outros filtros; use outro diretório.")
+        if progress['after'] is not None:
+            progress['after'] = tuple(KEY_TYPES[column](value) for column, value in zip(key_columns(self.source), progress['after']))
+        return progress
+
+    def save_progress(self, filters, part, rows, after):
+        temporary = self.progress_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as progress_file:
+            json.dump({'filters': filters, 'part': part, 'rows': rows,
+                       'after': [_csv_value(value) for value in after] if after else None}, progress_file)
+        os.replace(temporary, self.progress_path)
+
+    def run(self, connection, start=None, end=None, series=None):
+        os.makedirs(self.directory, exist_ok=True)
+        filters = {'start': _csv_value(start), 'end': _csv_value(end), 'series': series or {}}
+        progress = self.load_progress(filters)
+        part_number, exported, after = progress['part'], progress['rows'], progress['after']
+        if after is not None:
+            log.info(f"Retomando a exportação de '{self.source}' após {dict(zip(key_columns(self.source), after))}, {exported} linhas já exportadas.")
+
+        part = path = None
+        in_part = 0
+        batch = []
+        last = None
+
+        def close_part():
+            part.write(batch)
+            part.close()
+            os.replace(path + '.partial', path)
+            self.save_progress(filters, part_number, exported, last)
+            log.info(f"Arquivo {os.path.basename(path)} concluído ({exported} linhas no total).")
+
+        for key, row in stream_rows(connection, self.source, start=start, end=end, series=series, after=after):
+            if part is None:
+                part_number += 1
+                path = os.path.join(self.directory, f"{self.source}.part{part_number:05d}.{self.part_class.extension}")
+                part = self.part_class(path + '.partial', self.columns)
+                in_part = 0
+            batch.append(row)
+            in_part += 1
+            exported += 1
+            last = key
+            if len(batch) >= FETCH_SIZE:
+                part.write(batch)
+                batch = []
+            if in_part >= self.rows_per_file:
+                close_part()
+                part = None
+                batch = []
+        if part is not None:
+            close_part()
+        log.info(f"Exportação de '{self.source}' concluída: {exported} linhas em {part_number} arquivo(s).")
+        return exported
+
+
+def _parse_ids(value):
+    return [int(series_id) for series_id in value.split(',') if series_id]
+
+
+def main():
+    from app.services.db_engine import dispose_engines, get_engine
+    from config import SQLALCHEMY_DATABASE_URI as DB_URI
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Exporta o histórico para arquivos CSV compactados ou Parquet, em streaming e com retomada.")
+    parser.add_argument('source', choices=list(SOURCES))
+    parser.add_argument('directory', help="Diretório de saída; o progresso fica nele e permite retomar.")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--since', type=datetime.datetime.fromisoformat, help="Início (AAAA-MM-DD[THH:MM:SS]), inclusive.")
+    parser.add_argument('--until', type=datetime.datetime.fromisoformat, help="Fim (AAAA-MM-DD[THH:MM:SS]), exclusivo.")
+    parser.add_argument('--register', type=_parse_ids, help="IDs de registradores (modbus_data), separados por vírgula.")
+    parser.add_argument('--reservatorio', type=_parse_ids, help="IDs de reservatórios (nivel), separados por vírgula.")
+    parser.add_argument('--motobomba', type=_parse_ids, help="IDs de motobombas (acionamento), separados por vírgula.")
+    parser.add_argument('--rows-per-file', type=int, default=ROWS_PER_FILE)
+    args = parser.parse_args()
+
+    series = {}
+    for name in SOURCES[args.source]['filters']:
+        if getattr(args, name):
+            series[name] = getattr(args, name)
+    for name in ('register', 'reservatorio', 'motobomba'):
+        if getattr(args, name) and name not in series:
+            parser.error(f"--{name} não se aplica a '{args.source}'.")
+
+    engine = get_engine(DB_URI)
+    try:
+        exporter = Exporter(args.source, args.directory, args.format, args.rows_per_file)
+        with engine.connect() as connection:
+            exporter.run(connection, args.since, args.until, series)
+    finally:
+        dispose_engines()
+
+
+if __name__ == "__main__":
+    main()
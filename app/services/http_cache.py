@@ -0,0 +1,224 @@
+import functools
+import gzip
+import hashlib
+import os
+import posixpath
+import re
+from flask import request, Response
+
+try:
+    import brotli
+except ImportError: # Brotli é opcional; sem ele só gzip
+    brotli = None
+
+# Arquivos estáticos com impressão digital (?v=) são imutáveis: cache de um ano no navegador
+STATIC_MAX_AGE = 31536000
+# Respostas menores que isso não compensam a compressão
+COMPRESS_MIN_SIZE = 500
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'text/javascript', 'text/css', 'text/html',
+    'text/plain', 'text/csv', 'image/svg+xml',
+}
+# url(...) das folhas de estilo, com ou sem aspas
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+# Referências que não apontam para um arquivo estático relativo à folha de estilo
+EXTERNAL_URL = re.compile(r'^(?:[a-z][a-z0-9+.-]*:|/|#)', re.IGNORECASE)
+# Respostas geradas a cada requisição: compressão rápida. Os estáticos são comprimidos uma vez, no máximo
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+
+
+def content_etag(body):
+    """ETag forte derivada do conteúdo; a mesma em todos os processos."""
+    return hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+def conditional_json(body, etag=None, last_modified=None):
+    """
+    Resposta JSON com ETag (do conteúdo, se não informada) e Last-Modified;
+    devolve 304 sem corpo quando o cliente já tem essa versão.
+    """
+    if isinstance(body, str):
+        body = body.encode()
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag or content_etag(body))
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # O navegador sempre revalida; o 304 economiza o corpo
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@functools.lru_cache(maxsize=256)
+def _file_fingerprint(path, mtime):
+    with open(path, 'rb') as file:
+        return hashlib.blake2b(file.read(), digest_size=6).hexdigest()
+
+
+@functools.lru_cache(maxsize=64)
+def _read_css(path, mtime):
+    with open(path, 'rb') as file:
+        return file.read().decode('utf-8')
+
+
+def _css_reference(filename, target):
+    """Caminho (relativo à pasta static) do arquivo referenciado por url(`target`), ou None."""
+    if EXTERNAL_URL.match(target):
+        return None
+    path = target.split('#', 1)[0].split('?', 1)[0]
+    if not path:
+        return None
+    resolved = posixpath.normpath(posixpath.join(posixpath.dirname(filename), path))
+    return None if resolved.startswith('..') else resolved
+
+
+@functools.lru_cache(maxsize=64)
+def _rewrite_css(css, filename, versions):
+    versions = dict(versions)
+
+    def versioned(match):
+        quote, target = match.groups()
+        fingerprint = versions.get(_css_reference(filename, target.strip()))
+        if not fingerprint:
+            return match.group(0)
+        target, _, fragment = target.strip().partition('#')
+        target += ('&' if '?' in target else '?') + 'v=' + fingerprint
+        if fragment:
+            target += '#' + fragment
+        return f'url({quote}{target}{quote})'
+
+    body = CSS_URL.sub(versioned, css).encode('utf-8')
+    return body, hashlib.blake2b(body, digest_size=6).hexdigest()
+
+
+def static_css(static_folder, filename):
+    """
+    Folha de estilo com as referências url() relativas a arquivos estáticos
+    acrescidas da impressão digital deles (?v=), para que fontes e imagens
+    também sejam servidas com cache imutável. Devolve (corpo, impressão digital);
+    a impressão digital cobre as dos arquivos referenciados.
+    """
+    path = os.path.join(static_folder, filename)
+    css = _read_css(path, os.path.getmtime(path))
+    references = {_css_reference(filename, match.group(2).strip()) for match in CSS_URL.finditer(css)}
+    versions = tuple(sorted(
+        (reference, static_fingerprint(static_folder, reference)) for reference in references if reference
+    ))
+    return _rewrite_css(css, filename, versions)
+
+
+def static_fingerprint(static_folder, filename):
+    """Impressão digital do conteúdo do arquivo estático; None se ele não existir."""
+    path = os.path.join(static_folder, filename)
+    try:
+        if filename.endswith('.css'):
+            return static_css(static_folder, filename)[1]
+        return _file_fingerprint(path, os.path.getmtime(path))
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def negotiate_encoding(accept_encoding):
+    """'br' ou 'gzip' conforme o Accept-Encoding do cliente (preferindo br), ou None."""
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def static_body(static_folder, filename):
+    """Conteúdo servido do estático; folhas de estilo saem reescritas por static_css."""
+    if filename.endswith('.css'):
+        return static_css(static_folder, filename)[0]
+    with open(os.path.join(static_folder, filename), 'rb') as file:
+        return file.read()
+
+
+@functools.lru_cache(maxsize=64)
+def _compressed_static(static_folder, filename, fingerprint, encoding):
+    return compress(static_body(static_folder, filename), encoding, STATIC_LEVELS[encoding])
+
+
+def _compressible(response):
+    return (response.status_code == 200 and response.mimetype in COMPRESSIBLE_MIMETYPES
+            and 'Content-Encoding' not in response.headers)
+
+
+def _replace_static_body(response, body):
+    """Troca o arquivo aberto da resposta estática pelo corpo em memória."""
+    response.close()
+    response.direct_passthrough = False
+    response.headers.pop('Accept-Ranges', None)
+    response.set_data(body)
+
+
+def init_app(app):
+    """
+    Registra na aplicação o cache HTTP e a compressão:
+    - url_for('static', ...) acrescenta ?v=<impressão digital>, servido com
+      Cache-Control público, imutável e de um ano; nas folhas de estilo, as
+      url() relativas recebem o mesmo tratamento (static_css);
+    - respostas de texto/JSON são comprimidas com br ou gzip conforme o
+      Accept-Encoding (os estáticos comprimidos ficam em memória por versão).
+    Respostas em streaming (SSE, exportações) não são tocadas.
+    """
+
+    @app.url_defaults
+    def add_static_fingerprint(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            fingerprint = static_fingerprint(app.static_folder, values['filename'])
+            if fingerprint:
+                values['v'] = fingerprint
+
+    @app.after_request
+    def cache_and_compress(response):
+        filename = fingerprint = None
+        if request.endpoint == 'static':
+            filename = request.view_args['filename']
+            fingerprint = static_fingerprint(app.static_folder, filename)
+            if request.args.get('v') and request.args['v'] == fingerprint:
+                response.cache_control.public = True
+                response.cache_control.max_age = STATIC_MAX_AGE
+                response.cache_control.immutable = True
+                response.cache_control.no_cache = None
+
+        if response.status_code in (200, 304) and response.mimetype in COMPRESSIBLE_MIMETYPES:
+            response.vary.add('Accept-Encoding')
+        # Estáticos chegam como arquivo aberto; o corpo comprimido vem do cache em memória.
+        # Demais respostas em streaming (SSE, exportações) seguem como estão
+        if filename is None and (response.direct_passthrough or response.is_streamed):
+            return response
+        # Folhas de estilo saem com as url() reescritas, comprimidas ou não
+        rewritten = filename is not None and fingerprint is not None and filename.endswith('.css') and response.status_code == 200
+        if rewritten:
+            _replace_static_body(response, static_body(app.static_folder, filename))
+            response.set_etag(fingerprint)
+            response.make_conditional(request)
+        if not _compressible(response):
+            return response
+        encoding = negotiate_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if filename is not None:
+            body = _compressed_static(app.static_folder, filename, fingerprint, encoding)
+            _replace_static_body(response, body)
+        else:
+            body = response.get_data()
+            if len(body) < COMPRESS_MIN_SIZE:
+                return response
+            response.set_data(compress(body, encoding, DYNAMIC_LEVELS[encoding]))
+        response.headers['Content-Encoding'] = encoding
+        # Como a representação comprimida não é idêntica byte a byte, a ETag passa a fraca;
+        # o If-None-Match é comparado de forma fraca e continua gerando 304
+        etag, _ = response.get_etag()
+        if etag:
+            response.set_etag(etag, weak=True)
+        return response
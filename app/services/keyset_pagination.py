@@ -0,0 +1,80 @@
+import datetime
+from sqlalchemy import and_, or_, select, func, text, inspect
+
+# Linhas por página das listas de histórico
+PAGE_SIZE = 50
+# Acima disso a contagem filtrada para de contar e mostra "mais de COUNT_CAP"
+COUNT_CAP = 10000
+
+# Conversão de cada parte do cursor de volta ao tipo da coluna
+_PARSERS = {
+    datetime.datetime: datetime.datetime.fromisoformat,
+    datetime.date: datetime.date.fromisoformat,
+    datetime.time: datetime.time.fromisoformat,
+    int: int,
+}
+
+
+def encode_cursor(values):
+    """Cursor legível na URL com os valores da chave de ordenação da última linha."""
+    return ','.join(value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in values)
+
+
+def decode_cursor(cursor, types):
+    """Valores da chave a partir do cursor; ValueError se ele não corresponder a `types`."""
+    parts = cursor.split(',')
+    if len(parts) != len(types):
+        raise ValueError(f"Cursor inválido: {cursor!r}")
+    return tuple(_PARSERS[kind](part) for kind, part in zip(types, parts))
+
+
+def seek_before(columns, values):
+    """
+    (c1, c2, ...) < (v1, v2, ...) expandido em OR/AND, forma que o otimizador
+    usa como faixa no índice da chave de ordenação.
+    """
+    clauses = []
+    for position, (column, value) in enumerate(zip(columns, values)):
+        equal = [previous == previous_value for previous, previous_value in zip(columns[:position], values[:position])]
+        clauses.append(and_(*equal, column < value))
+    return or_(*clauses)
+
+
+def fetch_page(query, columns, cursor=None, page_size=PAGE_SIZE):
+    """
+    Página de `query` em ordem decrescente de `columns` (chave única, coberta por
+    um índice), a partir do `cursor` da página anterior. O custo não depende da
+    profundidade da página. Devolve (linhas, cursor da próxima página ou None).
+    """
+    if cursor is not None:
+        query = query.filter(seek_before(columns, cursor))
+    rows = query.order_by(*[column.desc() for column in columns]).limit(page_size + 1).all()
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(getattr(rows[-1], column.key) for column in columns)
+
+
+def estimate_rows(connection, table):
+    """Número aproximado de linhas da tabela pelas estatísticas do InnoDB, sem percorrê-la."""
+    return connection.execute(text(
+        "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+    ), {'table': table}).scalar() or 0
+
+
+def capped_count(connection, query, cap=COUNT_CAP):
+    """Contagem das linhas de `query` interrompida em `cap` + 1."""
+    # Só a chave primária da entidade: mantém o FROM mesmo sem filtros (um SELECT 1 o perderia)
+    primary_key = inspect(query.column_descriptions[0]['entity']).primary_key
+    limited = query.with_entities(*primary_key).order_by(None).limit(cap + 1).subquery()
+    return connection.execute(select(func.count()).select_from(limited)).scalar()
+
+
+def describe_count(connection, table, query, filtered):
+    """Texto do total para a lista: estimativa da tabela sem filtros, contagem limitada com eles."""
+    if not filtered:
+        return f"cerca de {estimate_rows(connection, table)} registros"
+    count = capped_count(connection, query)
+    if count > COUNT_CAP:
+        return f"mais de {COUNT_CAP} registros"
+    return f"{count} registros"
@@ -0,0 +1,109 @@
+import datetime
+import hashlib
+import json
+import threading
+import time
+from sqlalchemy import text
+from app.services.register_latest import GOOD
+
+# Validade (s) do retrato dos níveis; os painéis consultam a cada 5 s por aba aberta
+SNAPSHOT_TTL = 3.0
+
+# Nível atual de todos os reservatórios em uma consulta: o valor do registrador de
+# nível (%) em register_latest ou, sem ele, a última linha de nivel pelo índice (reservatorio_id, ts)
+LEVELS_QUERY = text(
+    "SELECT r.id, r.nome, r.capacidade_maxima, rl.value AS percentual, "
+    "CASE WHEN rl.quality = :good THEN NULL ELSE "
+    "(SELECT n.valor FROM nivel n WHERE n.reservatorio_id = r.id ORDER BY n.ts DESC LIMIT 1) END AS ultimo_volume "
+    "FROM reservatorio r LEFT JOIN register_latest rl ON rl.register_id = r.level_register_id "
+    "ORDER BY r.id"
+)
+
+# Faixas fixas de porcentagem: (limite superior, status_alerta, status_nivel, cor_barra)
+# 'normal' é usado como 'médio' no sistema
+FAIXAS = (
+    (33, 'baixo', 'Baixo', 'bg-danger'),
+    (66, 'normal', 'Médio', 'bg-warning'),
+    (None, 'alto', 'Alto', 'bg-primary'),
+)
+
+
+def classify(porcentagem):
+    for limite, status_alerta, status_nivel, cor_barra in FAIXAS:
+        if limite is None or porcentagem <= limite:
+            return status_alerta, status_nivel, cor_barra
+
+
+def load_levels(connection):
+    """Nível atual, porcentagem e classificação de cada reservatório."""
+    levels = []
+    for id, nome, capacidade, percentual, ultimo_volume in connection.execute(LEVELS_QUERY, {'good': GOOD}):
+        if ultimo_volume is None and percentual is not None:
+            nivel_atual = round(percentual / 100 * capacidade)
+        else:
+            nivel_atual = ultimo_volume or 0
+        porcentagem = (nivel_atual / capacidade) * 100 if capacidade > 0 else 0
+        status_alerta, status_nivel, cor_barra = classify(porcentagem)
+        levels.append({
+            'id': id,
+            'nome': nome,
+            'nivel_atual': nivel_atual,
+            'porcentagem': round(porcentagem, 2),
+            'status_alerta': status_alerta,
+            'capacidade_maxima': capacidade,
+            'status_nivel': status_nivel,
+            'cor_barra': cor_barra,
+        })
+    return levels
+
+
+class LevelSnapshotCache:
+    """
+    Retrato dos níveis compartilhado entre as requisições do processo, refeito
+    no máximo a cada `ttl` segundos. Guarda também o JSON já serializado da API,
+    sua versão (hash do conteúdo, usada como ETag) e o instante da última mudança.
+    """
+
+    def __init__(self, ttl=SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._levels = None
+        self._json = None
+        self._version = None
+        self._modified = None
+        self._expires = 0.0
+
+    def _refresh(self, engine):
+        with self._lock:
+            if time.monotonic() < self._expires:
+                return
+            with engine.connect() as connection:
+                levels = load_levels(connection)
+            self._levels, self._json = levels, json.dumps(levels)
+            version = hashlib.blake2b(self._json.encode(), digest_size=12).hexdigest()
+            if version != self._version:
+                self._version = version
+                self._modified = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+            self._expires = time.monotonic() + self.ttl
+
+    def levels(self, engine):
+        if time.monotonic() >= self._expires:
+            self._refresh(engine)
+        return self._levels
+
+    def json(self, engine):
+        if time.monotonic() >= self._expires:
+            self._refresh(engine)
+        return self._json
+
+    def versioned(self, engine):
+        """(JSON, versão, instante da última mudança) para respostas condicionais."""
+        if time.monotonic() >= self._expires:
+            self._refresh(engine)
+        return self._json, self._version, self._modified
+
+    def invalidate(self):
+        self._expires = 0.0
+
+
+snapshot_cache = LevelSnapshotCache()
@@ -0,0 +1,231 @@
+import datetime
+import json
+import logging
+import queue
+import threading
+import time
+from sqlalchemy import text
+from app.services.level_snapshot import snapshot_cache
+
+log = logging.getLogger(__name__)
+
+# Intervalo (s) entre as leituras do observador; independe do número de clientes conectados
+WATCH_INTERVAL = 2.0
+# Sem eventos, um 'ping' a cada HEARTBEAT_INTERVAL s mantém a conexão e detecta clientes que saíram
+HEARTBEAT_INTERVAL = 15.0
+# Eventos pendentes por cliente; um cliente lento é desconectado e, ao reconectar, recebe o estado completo
+SUBSCRIBER_QUEUE_SIZE = 100
+# Cada canal aberto ocupa uma thread do servidor WSGI: acima desse número de assinantes
+# o processo recusa novos canais (503) e os painéis usam o polling das APIs. Deve ficar
+# abaixo do número de threads do processo, para sobrarem threads às demais requisições
+MAX_SUBSCRIBERS = 32
+# Tempo máximo (s) de um canal; depois dele o servidor o encerra e o EventSource
+# reconecta, liberando a thread e redistribuindo os clientes entre os processos
+STREAM_MAX_LIFETIME = 600
+# Espera (ms) indicada ao EventSource antes de reconectar
+RETRY_MS = 5000
+
+PUMP_STATUS_QUERY = text(
+    "SELECT m.potencia, a.data, a.hora_lig, a.hora_des FROM motobomba m "
+    "LEFT JOIN acionamento a ON a.id = ("
+    "SELECT id FROM acionamento WHERE mb_id = m.id ORDER BY data DESC, hora_lig DESC LIMIT 1) "
+    "WHERE m.funcao = 'PRINCIPAL' LIMIT 1"
+)
+ALERT_LIMITS_QUERY = text(
+    "SELECT reservatorio_id, MAX(limite_inferior), MIN(limite_superior) FROM alerta_config "
+    "WHERE ativo = TRUE GROUP BY reservatorio_id"
+)
+
+_CLOSED = object()
+
+
+def load_pump_status(connection, now=None):
+    """Status da motobomba principal no formato de /monitoramento/api/status_motobomba; None se não houver."""
+    row = connection.execute(PUMP_STATUS_QUERY).first()
+    if row is None:
+        return None
+    potencia, data, hora_lig, hora_des = row
+    if data is not None and hora_des is None:
+        inicio = datetime.datetime.combine(data, hora_lig)
+        hours, remainder = divmod(((now or datetime.datetime.now()) - inicio).total_seconds(), 3600)
+        minutes, seconds = divmod(remainder, 60)
+        return {
+            'status': 'LIGADA',
+            'texto_status': 'Sistema em operação',
+            'classe_css': 'status-on',
+            'potencia': potencia,
+            'runtime': f"{int(hours):02}:{int(minutes):02}:{int(seconds):02}",
+            'inicio': inicio.isoformat(),
+        }
+    return {
+        'status': 'DESLIGADA',
+        'texto_status': 'Sistema parado',
+        'classe_css': 'status-off',
+        'potencia': potencia,
+        'runtime': '00:00:00',
+        'inicio': None,
+    }
+
+
+def alert_state(porcentagem, limits):
+    """'inferior'/'superior' quando o nível está fora dos limites ativos do reservatório, senão None."""
+    if limits is None:
+        return None
+    inferior, superior = limits
+    if porcentagem < inferior:
+        return 'inferior'
+    if porcentagem > superior:
+        return 'superior'
+    return None
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class LiveFeed:
+    """
+    Publicador único dos dados ao vivo do monitoramento no processo web. Uma
+    thread observa o banco a cada WATCH_INTERVAL (enquanto houver assinantes)
+    e distribui a todos só o que mudou: eventos 'nivel' (reservatórios
+    alterados), 'motobomba' (mudança de estado) e 'alerta' (entrada ou saída
+    dos limites configurados). Cada assinante recebe antes o estado completo.
+    São aceitos até `max_subscribers` canais, cada um aberto por no máximo
+    `max_lifetime` segundos.
+    """
+
+    def __init__(self, interval=WATCH_INTERVAL, max_subscribers=MAX_SUBSCRIBERS, max_lifetime=STREAM_MAX_LIFETIME):
+        self.interval = interval
+        self.max_subscribers = max_subscribers
+        self.max_lifetime = max_lifetime
+        self._engine = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._levels = {}
+        self._pump = None
+        self._alerts = {}
+
+    @property
+    def accepting(self):
+        """Falso quando o limite de assinantes foi atingido."""
+        with self._lock:
+            return len(self._subscribers) < self.max_subscribers
+
+    def subscribe(self, engine):
+        """Fila de eventos do novo assinante, ou None se o limite de assinantes foi atingido."""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._engine = engine
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="live-feed", daemon=True)
+                self._thread.start()
+            if self._levels:
+                subscriber.put_nowait(('nivel', list(self._levels.values())))
+            if self._pump is not None:
+                subscriber.put_nowait(('motobomba', self._pump))
+            for alert in self._alerts.values():
+                if alert is not None:
+                    subscriber.put_nowait(('alerta', alert))
+            self._subscribers.add(subscriber)
+            self._wakeup.notify()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, engine):
+        """
+        Gera o corpo text/event-stream de um cliente até ele desconectar ou o
+        canal completar `max_lifetime` segundos (o EventSource então reconecta).
+        """
+        subscriber = self.subscribe(engine)
+        if subscriber is None:
+            # Outro cliente ocupou a última vaga depois da verificação da view
+            yield f"retry: {RETRY_MS}\n\n"
+            return
+        deadline = time.monotonic() + self.max_lifetime
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    event = subscriber.get(timeout=min(HEARTBEAT_INTERVAL, remaining))
+                except queue.Empty:
+                    if time.monotonic() >= deadline:
+                        return
+                    yield format_event('ping', {})
+                    continue
+                if event is _CLOSED:
+                    return
+                yield format_event(*event)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _publish(self, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                self.unsubscribe(subscriber)
+                # Garante espaço para o aviso de encerramento
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(_CLOSED)
+
+    def _poll(self):
+        levels = snapshot_cache.levels(self._engine)
+        with self._engine.connect() as connection:
+            pump = load_pump_status(connection)
+            limits = {reservatorio_id: (inferior, superior) for reservatorio_id, inferior, superior in connection.execute(ALERT_LIMITS_QUERY)}
+
+        changed = [level for level in levels if self._levels.get(level['id']) != level]
+        if changed:
+            self._levels = {level['id']: level for level in levels}
+            self._publish('nivel', changed)
+
+        # O tempo de funcionamento é calculado no navegador a partir de 'inicio'; só a mudança de estado é enviada
+        if pump is not None and (self._pump is None or (pump['status'], pump['inicio']) != (self._pump['status'], self._pump['inicio'])):
+            self._publish('motobomba', pump)
+        self._pump = pump
+
+        for level in levels:
+            state = alert_state(level['porcentagem'], limits.get(level['id']))
+            previous = self._alerts.get(level['id'])
+            if state == (previous['tipo'] if previous else None):
+                continue
+            alert = {
+                'reservatorio_id': level['id'],
+                'nome': level['nome'],
+                'porcentagem': level['porcentagem'],
+                'tipo': state or 'normalizado',
+                'limites': limits.get(level['id']),
+            }
+            # Alertas ativos são reenviados a quem se conectar depois; a normalização, não
+            self._alerts[level['id']] = alert if state else None
+            self._publish('alerta', alert)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                # Sem assinantes o observador fica parado, sem consultar o banco
+                while not self._subscribers:
+                    self._wakeup.wait()
+            try:
+                self._poll()
+            except Exception as e:
+                log.error(f"Erro ao atualizar os dados ao vivo do monitoramento: {e}", exc_info=True)
+            time.sleep(self.interval)
+
+
+live_feed = LiveFeed()
@@ -0,0 +1,285 @@
+import asyncio
+import datetime
+import logging
+from pymodbus.client import AsyncModbusSerialClient, AsyncModbusTcpClient
+from pymodbus.exceptions import ModbusException, ModbusIOException
+from app.services.modbus_read_planner import plan_read_blocks, absorb_covered, read_block_async, raise_if_cancelling
+from app.services.modbus_poll_scheduler import PollScheduler
+from app.services.modbus_health import MIN_SLACK, RTU_MIN_SLACK, DeviceHealth, DeviceUnavailable
+
+log = logging.getLogger(__name__)
+
+MODBUS_TCP_PORT = 502
+
+
+class BusKey:
+    """Identifica um barramento físico: uma porta serial ou um gateway Modbus TCP."""
+
+    def __init__(self, kind, address, port=None):
+        self.kind = kind
+        self.address = address
+        self.port = port
+
+    def __eq__(self, other):
+        return isinstance(other, BusKey) and (self.kind, self.address, self.port) == (other.kind, other.address, other.port)
+
+    def __hash__(self):
+        return hash((self.kind, self.address, self.port))
+
+    def __repr__(self):
+        if self.kind == 'tcp':
+            return f'<BusKey tcp://{self.address}:{self.port}>'
+        return f'<BusKey serial {self.address}>'
+
+
+def parse_transport(ip_address, default_serial_port):
+    """
+    Interpreta `ModbusDevice.ip_address`, que guarda um endereço TCP (`host`,
+    `host:porta` ou `tcp://host:porta`) ou uma porta serial (`/dev/ttyUSB0`, `COM3`).
+    Dispositivos sem endereço ficam na porta serial padrão do master.
+    """
+    value = (ip_address or '').strip()
+    if not value:
+        return BusKey('serial', default_serial_port)
+    if value.lower().startswith('tcp://'):
+        value = value[len('tcp://'):]
+    elif value.startswith('/') or value.upper().startswith('COM'):
+        return BusKey('serial', value)
+    host, _, port = value.partition(':')
+    return BusKey('tcp', host, int(port) if port else MODBUS_TCP_PORT)
+
+
+def group_devices_by_bus(devices, default_serial_port):
+    """Agrupa os dispositivos pelo barramento físico em que estão ligados."""
+    buses = {}
+    for device in devices:
+        buses.setdefault(parse_transport(device.ip_address, default_serial_port), []).append(device)
+    return buses
+
+
+class SerialSettings:
+    """Parâmetros de linha usados pelos barramentos seriais."""
+
+    def __init__(self, baudrate, parity, stopbits, bytesize, timeout):
+        self.baudrate = baudrate
+        self.parity = parity
+        self.stopbits = stopbits
+        self.bytesize = bytesize
+        self.timeout = timeout
+
+
+class BusPoller:
+    """
+    Poller independente de um barramento, com conexão, fila de requisições e
+    temporização próprias. Toda comunicação do barramento (leituras agendadas,
+    escritas e sondagens) passa pela tarefa `run`, uma requisição por vez, sob o
+    disjuntor (DeviceHealth) do escravo de destino.
+    """
+
+    def __init__(self, key, settings, timing, default_interval, on_values):
+        self.key = key
+        self.settings = settings
+        self.timing = timing
+        self.scheduler = PollScheduler(default_interval)
+        self.on_values = on_values
+        self.queue = asyncio.Queue()
+        self.client = None
+        self.polled = asyncio.Event()
+        self.last_poll = None
+        self.health = {}
+        # Total de prazos perdidos já relatado por report_missed_deadlines
+        self.missed_reported = 0
+
+    @property
+    def registers(self):
+        return [entry.register for entry in self.scheduler.entries]
+
+    def create_client(self):
+        if self.key.kind == 'tcp':
+            return AsyncModbusTcpClient(self.key.address, port=self.key.port, timeout=self.settings.timeout)
+        return AsyncModbusSerialClient(
+            port=self.key.address,
+            baudrate=self.settings.baudrate,
+            parity=self.settings.parity,
+            stopbits=self.settings.stopbits,
+            bytesize=self.settings.bytesize,
+            timeout=self.settings.timeout,
+        )
+
+    def set_registers(self, registers):
+        """Define os registradores (PlannedRegister) agendados neste barramento."""
+        registers = list(registers)
+        changed = {reg.id for reg in registers} != {entry.register.id for entry in self.scheduler.entries}
+        self.scheduler.set_registers(registers, asyncio.get_running_loop().time())
+        if changed:
+            # Registradores novos vencem imediatamente; acorda o poller para lê-los
+            self.polled.clear()
+            self.queue.put_nowait(None)
+
+    def health_for(self, slave_id):
+        health = self.health.get(slave_id)
+        if health is None:
+            min_slack = RTU_MIN_SLACK if self.key.kind == 'serial' else MIN_SLACK
+            health = self.health[slave_id] = DeviceHealth(f"{slave_id}@{self.key}", self.settings.timeout, min_slack)
+        return health
+
+    def report_missed_deadlines(self, top=5):
+        """
+        Registra no log os prazos de leitura perdidos desde o relato anterior,
+        citando os `top` registradores mais atrasados. Chamado pela tarefa de status.
+        """
+        missed = self.scheduler.missed_deadlines()
+        total = sum(missed.values())
+        new = total - self.missed_reported
+        self.missed_reported = total
+        if new <= 0:
+            return
+        worst = sorted(missed.items(), key=lambda item: item[1], reverse=True)[:top]
+        names = ', '.join(f"{self.scheduler.entry(register_id).register.name} ({count})" for register_id, count in worst)
+        log.warning(f"Barramento {self.key}: {new} prazo(s) de leitura perdido(s) desde o último relato, "
+                    f"{len(missed)} registrador(es) afetado(s). Mais atrasados: {names}.")
+
+    def is_available(self, slave_id):
+        """Falso enquanto o circuito do escravo estiver aberto ou em sondagem."""
+        health = self.health.get(slave_id)
+        return health is None or health.available
+
+    async def _guarded(self, slave_id, expected, request):
+        """Executa a requisição com o timeout adaptativo do escravo e registra o resultado no disjuntor."""
+        loop = asyncio.get_running_loop()
+        health = self.health_for(slave_id)
+        timeout = health.timeout(expected)
+        start = loop.time()
+        try:
+            response = await asyncio.wait_for(request, timeout)
+        except asyncio.TimeoutError:
+            health.record_failure(loop.time())
+            await self._resync()
+            raise ModbusIOException(f"Escravo {slave_id} não respondeu em {timeout:.2f}s")
+        except ModbusException as e:
+            raise_if_cancelling(e)
+            health.record_failure(loop.time())
+            if loop.time() - start >= timeout:
+                # O pymodbus converte o cancelamento do wait_for em ModbusIOException
+                await self._resync()
+            raise
+        health.record_success(loop.time() - start, expected, loop.time())
+        return response
+
+    async def _resync(self):
+        """
+        Após um timeout do lado do cliente em barramento serial, mantém a linha
+        ociosa pelo timeout configurado antes da próxima requisição. O quadro RTU
+        não tem id de transação e o pymodbus entrega à requisição pendente qualquer
+        resposta do mesmo escravo; a resposta atrasada precisa chegar (e ser
+        descartada) enquanto nenhuma requisição aguarda.
+        """
+        if self.key.kind == 'serial':
+            await asyncio.sleep(self.settings.timeout)
+
+    def _guard_block(self, block, request):
+        expected = self.timing.transaction_time(block.function_code, block.count)
+        return self._guarded(block.slave_id, expected, request)
+
+    async def submit(self, operation, *args, slave_id=None, expected=None):
+        """
+        Enfileira `operation(client, *args)` e aguarda o resultado. Com `slave_id`,
+        a requisição passa pelo disjuntor do escravo e falha de imediato
+        (DeviceUnavailable) se o circuito estiver aberto; `expected` é o tempo de
+        transmissão esperado (s), base do timeout adaptativo.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((operation, args, future, slave_id, expected))
+        return await future
+
+    async def _poll_due(self):
+        """Lê, em blocos, os registradores vencidos e os que cabem de carona nesses blocos."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        due, deferred = [], []
+        for entry in self.scheduler.pop_due(now):
+            health = self.health.get(entry.register.slave_id)
+            (deferred if health is not None and health.blocked(now) else due).append(entry)
+        self.scheduler.defer(deferred, now)
+        if not due:
+            return
+        due_ids = {entry.register.id for entry in due}
+        blocks = plan_read_blocks([entry.register for entry in due], self.timing)
+        absorb_covered(blocks, [entry.register for entry in self.scheduler.entries if entry.register.id not in due_ids])
+        # Blocos com os registradores de maior prioridade são lidos primeiro
+        blocks.sort(key=lambda block: -max(member.poll_priority for member in block.members))
+
+        values = {}
+        read, skipped = [], []
+        for block in blocks:
+            if not self.health_for(block.slave_id).allow(loop.time()):
+                # O circuito abriu durante esta rodada: os vencidos ficam para depois
+                skipped.extend(self.scheduler.entry(reg.id) for reg in block.members if reg.id in due_ids)
+                continue
+            values.update(await read_block_async(self.client, block, self._guard_block))
+            read.extend(self.scheduler.entry(reg.id) for reg in block.members)
+        self.last_poll = datetime.datetime.now()
+        self.on_values(values, self.last_poll)
+
+        self.scheduler.complete(read, loop.time())
+        self.scheduler.defer(skipped, loop.time())
+        log.debug(f"{self.key}: {len(values)} de {len(read)} registradores lidos em {len(blocks)} requisições.")
+        if all(entry.last_read is not None for entry in self.scheduler.entries):
+            self.polled.set()
+
+    async def _serve(self, operation, args, future, slave_id, expected):
+        if future.cancelled():
+            return
+        try:
+            if slave_id is None:
+                result = await operation(self.client, *args)
+            elif not self.health_for(slave_id).allow(asyncio.get_running_loop().time()):
+                raise DeviceUnavailable(f"Escravo {slave_id} indisponível (circuito aberto).")
+            else:
+                if expected is None:
+                    expected = self.timing.transaction_time(3, 1)
+                result = await self._guarded(slave_id, expected, operation(self.client, *args))
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            raise_if_cancelling(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    async def run(self, stop_event):
+        loop = asyncio.get_running_loop()
+        self.client = self.create_client()
+        log.info(f"Iniciando poller do barramento {self.key}.")
+        try:
+            await self.client.connect()
+            if not self.client.connected:
+                log.error(f"Falha ao conectar ao barramento {self.key}. O cliente tentará reconectar a cada requisição.")
+
+            while not stop_event.is_set():
+                next_due = self.scheduler.next_due()
+                timeout = None if next_due is None else next_due - loop.time()
+                if not self.scheduler.entries:
+                    self.polled.set()
+                if timeout is not None and timeout <= 0:
+                    try:
+                        await self._poll_due()
+                    except Exception as e:
+                        log.error(f"Erro no ciclo de leitura do barramento {self.key}: {e}", exc_info=True)
+                    continue
+                try:
+                    request = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    continue
+                if request is not None:
+                    await self._serve(*request)
+        finally:
+            while not self.queue.empty():
+                request = self.queue.get_nowait()
+                if request is not None:
+                    request[2].cancel()
+            self.client.close()
+            log.info(f"Poller do barramento {self.key} finalizado.")
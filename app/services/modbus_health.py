@@ -0,0 +1,134 @@
+import datetime
+import logging
+from pymodbus.exceptions import ModbusException
+
+log = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Falhas consecutivas que abrem o circuito de um escravo
+FAILURE_THRESHOLD = 3
+# Espera (s) antes da primeira sondagem de um escravo aberto; dobra a cada sondagem que falha
+BACKOFF_INITIAL = 5.0
+BACKOFF_MAX = 300.0
+# Folga mínima (s) somada ao tempo de transmissão esperado ao calcular o timeout
+MIN_SLACK = 0.05
+# Folga mínima (s) em barramentos RTU: o quadro não tem id de transação, então um
+# timeout curto demais faz a resposta atrasada ser tomada pela requisição seguinte
+RTU_MIN_SLACK = 0.3
+# Pesos da média móvel do tempo de resposta (mesmos do RTO do TCP)
+RTT_ALPHA = 0.125
+RTT_BETA = 0.25
+
+
+class DeviceUnavailable(ModbusException):
+    """Requisição recusada sem acessar o barramento: o circuito do escravo está aberto."""
+
+
+class DeviceHealth:
+    """
+    Disjuntor de um escravo. Fechado, as requisições seguem normalmente; após
+    FAILURE_THRESHOLD falhas seguidas o circuito abre e o escravo deixa de ser
+    acessado até o fim do backoff, quando uma única requisição de sondagem
+    (meio-aberto) decide se ele volta a fechar ou se o backoff dobra.
+
+    O timeout de cada requisição acompanha uma média móvel da folga entre o
+    tempo medido e o tempo de transmissão esperado, nunca abaixo de `min_slack`
+    além do esperado e limitado ao timeout configurado.
+
+    Como toda requisição ao escravo passa por aqui, o mesmo objeto registra a
+    vivacidade observada: último contato, tempo de resposta e falhas seguidas.
+    """
+
+    def __init__(self, name, max_timeout, min_slack=MIN_SLACK):
+        self.name = name
+        self.max_timeout = max_timeout
+        self.min_slack = min_slack
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = BACKOFF_INITIAL
+        self.retry_at = None
+        self.srtt = None
+        self.rttvar = None
+        # Vivacidade observada nas requisições normais
+        self.last_seen = None
+        self.last_activity = None
+        self.rtt_ms = None
+
+    @property
+    def available(self):
+        return self.state == CLOSED
+
+    @property
+    def status(self):
+        """Status exibido em /modbus/status: 'Online', 'Offline' ou None se ainda sem contato."""
+        if self.state != CLOSED:
+            return 'Offline'
+        return 'Online' if self.last_seen is not None else None
+
+    def idle_for(self, now):
+        """Segundos desde a última requisição ao escravo (infinito se nunca houve)."""
+        if self.last_activity is None:
+            return float('inf')
+        return now - self.last_activity
+
+    def blocked(self, now):
+        """Indica se o escravo deve ser pulado agora, sem alterar o estado."""
+        if self.state == OPEN:
+            return now < self.retry_at
+        return self.state == HALF_OPEN
+
+    def allow(self, now):
+        """Autoriza uma requisição; no fim do backoff a autorizada é a sondagem (meio-aberto)."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now >= self.retry_at:
+            self.state = HALF_OPEN
+            log.info(f"Escravo {self.name}: sondando após {self.backoff:.0f}s de circuito aberto.")
+            return True
+        return False
+
+    def timeout(self, expected):
+        """Timeout (s) de uma requisição cujo tempo de transmissão esperado é `expected`."""
+        if self.srtt is None:
+            return self.max_timeout
+        slack = max(self.srtt + 4 * self.rttvar, self.min_slack)
+        return min(expected + slack, self.max_timeout)
+
+    def record_success(self, elapsed, expected, now):
+        self.last_activity = now
+        self.last_seen = datetime.datetime.now()
+        elapsed_ms = elapsed * 1000
+        self.rtt_ms = elapsed_ms if self.rtt_ms is None else (1 - RTT_ALPHA) * self.rtt_ms + RTT_ALPHA * elapsed_ms
+        slack = max(elapsed - expected, 0.0)
+        if self.srtt is None:
+            self.srtt = slack
+            self.rttvar = slack / 2
+        else:
+            self.rttvar = (1 - RTT_BETA) * self.rttvar + RTT_BETA * abs(self.srtt - slack)
+            self.srtt = (1 - RTT_ALPHA) * self.srtt + RTT_ALPHA * slack
+        if self.state != CLOSED:
+            log.info(f"Escravo {self.name} voltou a responder. Circuito fechado.")
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = BACKOFF_INITIAL
+        self.retry_at = None
+
+    def record_failure(self, now):
+        self.last_activity = now
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self.backoff = min(self.backoff * 2, BACKOFF_MAX)
+        elif self.state == CLOSED and self.failures < FAILURE_THRESHOLD:
+            return
+        if self.state == CLOSED:
+            log.warning(f"Escravo {self.name}: {self.failures} falhas seguidas. Circuito aberto por {self.backoff:.0f}s.")
+        else:
+            log.warning(f"Escravo {self.name}: sondagem falhou. Nova tentativa em {self.backoff:.0f}s.")
+        self.state = OPEN
+        self.retry_at = now + self.backoff
+
+    def __repr__(self):
+        return f'<DeviceHealth {self.name} {self.state} falhas={self.failures} srtt={self.srtt}>'
@@ -0,0 +1,134 @@
+import heapq
+import itertools
+import logging
+
+log = logging.getLogger(__name__)
+
+# Leituras que vencem dentro desta janela (s) são agrupadas na mesma rodada
+COALESCE_WINDOW = 0.05
+# Fração do intervalo tolerada de atraso antes de contar um prazo perdido
+DEADLINE_TOLERANCE = 0.5
+
+
+class ScheduledRegister:
+    """Estado de agendamento de um registrador em um barramento."""
+
+    def __init__(self, register, interval, priority, due):
+        self.register = register
+        self.interval = interval
+        self.priority = priority
+        self.due = due
+        self.last_read = None
+        self.missed = 0
+        self.generation = 0
+
+
+class PollScheduler:
+    """
+    Escalonador de leituras por registrador. Um heap ordenado pelo próximo
+    vencimento (e, em empate, pela maior prioridade) indica sempre a próxima
+    leitura devida; entradas reagendadas ficam obsoletas no heap e são ignoradas.
+    """
+
+    def __init__(self, default_interval, coalesce_window=COALESCE_WINDOW):
+        self.default_interval = default_interval
+        self.coalesce_window = coalesce_window
+        self._entries = {}
+        self._heap = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def entries(self):
+        return list(self._entries.values())
+
+    def _push(self, entry):
+        entry.generation += 1
+        heapq.heappush(self._heap, (entry.due, -entry.priority, next(self._seq), entry.register.id, entry.generation))
+
+    def set_registers(self, registers, now):
+        """
+        Substitui o conjunto agendado. Registradores que já estavam agendados
+        mantêm o vencimento atual; os novos vencem imediatamente.
+        """
+        entries = {}
+        for register in registers:
+            interval = register.poll_interval or self.default_interval
+            entry = self._entries.get(register.id)
+            if entry is None:
+                entry = ScheduledRegister(register, interval, register.poll_priority, now)
+            else:
+                entry.register = register
+                if entry.interval != interval and entry.last_read is not None:
+                    entry.due = entry.last_read + interval
+                entry.interval = interval
+                entry.priority = register.poll_priority
+            entries[register.id] = entry
+        self._entries = entries
+        self._heap = []
+        for entry in entries.values():
+            self._push(entry)
+
+    def _discard_stale(self):
+        while self._heap:
+            _, _, _, register_id, generation = self._heap[0]
+            entry = self._entries.get(register_id)
+            if entry is not None and entry.generation == generation:
+                return
+            heapq.heappop(self._heap)
+
+    def next_due(self):
+        """Instante (relógio do event loop) da próxima leitura devida, ou None se vazio."""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Remove e devolve, em ordem de prioridade, as entradas vencidas até `now` + janela de agrupamento."""
+        due = []
+        limit = now + self.coalesce_window
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > limit:
+                break
+            _, _, _, register_id, _ = heapq.heappop(self._heap)
+            due.append(self._entries[register_id])
+        return due
+
+    def entry(self, register_id):
+        return self._entries.get(register_id)
+
+    def complete(self, entries, now):
+        """Reagenda as entradas lidas (com ou sem sucesso) e contabiliza os prazos perdidos."""
+        for entry in entries:
+            if self._entries.get(entry.register.id) is not entry:
+                continue
+            lateness = now - entry.due
+            if lateness > entry.interval * DEADLINE_TOLERANCE:
+                entry.missed += 1
+                # O resumo por barramento sai na tarefa de status (missed_deadlines)
+                log.debug(f"Registrador {entry.register.name} lido com {lateness:.2f}s de atraso "
+                            f"(intervalo {entry.interval}s, {entry.missed} prazo(s) perdido(s)).")
+            entry.last_read = now
+            if lateness < 0:
+                # Lido antes do vencimento (de carona em um bloco): reinicia a contagem
+                entry.due = now + entry.interval
+            else:
+                # Mantém a cadência, mas não tenta recuperar ciclos perdidos em rajada
+                entry.due += entry.interval
+                if entry.due <= now:
+                    entry.due = now + entry.interval
+            self._push(entry)
+
+    def defer(self, entries, now):
+        """Reagenda sem leitura as entradas de escravos indisponíveis, sem contar prazo perdido."""
+        for entry in entries:
+            if self._entries.get(entry.register.id) is not entry:
+                continue
+            entry.due = now + entry.interval
+            self._push(entry)
+
+    def missed_deadlines(self):
+        """Registradores que já perderam o prazo de leitura: {register_id: quantidade}."""
+        return {entry.register.id: entry.missed for entry in self._entries.values() if entry.missed}
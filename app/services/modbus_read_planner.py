@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import struct
+from pymodbus.exceptions import ModbusException
+
+log = logging.getLogger(__name__)
+
+# Limites do protocolo Modbus por requisição de leitura
+MAX_REGISTERS_PER_READ = 125
+MAX_BITS_PER_READ = 2000
+
+# Endereço base (notação 0x/1x/3x/4x) de cada código de função
+FUNCTION_CODE_BASE = {
+    1: 1,      # Coils
+    2: 10001,  # Discrete Inputs
+    3: 40001,  # Holding Registers
+    4: 30001,  # Input Registers
+}
+
+BIT_FUNCTION_CODES = (1, 2)
+
+# Tamanho fixo dos quadros RTU: requisição de leitura (slave, fc, addr, count, crc)
+# e cabeçalho da resposta (slave, fc, byte count, crc)
+REQUEST_FRAME_BYTES = 8
+RESPONSE_OVERHEAD_BYTES = 5
+# Silêncio entre quadros (3,5 caracteres) antes da requisição e da resposta
+INTER_FRAME_CHARS = 7
+# Tempo estimado de processamento do escravo entre requisição e resposta
+SLAVE_TURNAROUND_S = 0.005
+
+
+def register_word_count(data_type):
+    """Quantidade de registradores de 16 bits ocupados por um tipo de dado."""
+    return 2 if data_type in ['float32', 'int32'] else 1
+
+
+def decode_words(data_type, words):
+    """Decodifica registradores de 16 bits conforme o tipo de dado."""
+    if data_type == 'float32':
+        if len(words) < 2:
+            return 0.0
+        packed = int.to_bytes(words[0], 2, 'big') + int.to_bytes(words[1], 2, 'big')
+        return struct.unpack('>f', packed)[0]
+    if data_type == 'int32':
+        if len(words) < 2:
+            return 0
+        return (words[0] << 16) | words[1]
+    return words[0]
+
+
+class PlannedRegister:
+    """Registrador a ser lido, desacoplado da sessão do banco de dados."""
+
+    def __init__(self, id, slave_id, function_code, address, data_type, name=None, poll_interval=None, poll_priority=0):
+        self.id = id
+        self.slave_id = slave_id
+        self.function_code = function_code
+        self.address = address
+        self.data_type = data_type
+        self.name = name or str(id)
+        self.poll_interval = poll_interval
+        self.poll_priority = poll_priority
+
+    @classmethod
+    def from_model(cls, register):
+        return cls(register.id, register.device.slave_id, register.function_code,
+                   register.address, register.data_type, register.name,
+                   poll_interval=register.poll_interval or register.device.poll_interval,
+                   poll_priority=register.poll_priority or 0)
+
+    @property
+    def offset(self):
+        """Endereço de protocolo (base zero) usado na requisição."""
+        return self.address - FUNCTION_CODE_BASE[self.function_code]
+
+    @property
+    def width(self):
+        if self.function_code in BIT_FUNCTION_CODES:
+            return 1
+        return register_word_count(self.data_type)
+
+    def __repr__(self):
+        return f'<PlannedRegister {self.name} slave={self.slave_id} fc={self.function_code} addr={self.address}>'
+
+
+class ReadBlock:
+    """Uma única requisição de leitura cobrindo vários registradores contíguos."""
+
+    def __init__(self, slave_id, function_code, start, count, members):
+        self.slave_id = slave_id
+        self.function_code = function_code
+        self.start = start
+        self.count = count
+        self.members = members
+
+    @property
+    def has_gaps(self):
+        return sum(reg.width for reg in self.members) < self.count
+
+    def __repr__(self):
+        return f'<ReadBlock slave={self.slave_id} fc={self.function_code} start={self.start} count={self.count} regs={len(self.members)}>'
+
+
+class LinkTiming:
+    """Modelo de custo de uma transação de leitura na linha serial."""
+
+    def __init__(self, baudrate, parity='N', stopbits=1, bytesize=8, turnaround=SLAVE_TURNAROUND_S):
+        bits_per_char = 1 + bytesize + (0 if parity == 'N' else 1) + stopbits
+        self.char_time = bits_per_char / float(baudrate)
+        self.turnaround = turnaround
+
+    def transaction_time(self, function_code, count):
+        """Tempo estimado (s) de uma leitura de `count` itens, ida e volta."""
+        if function_code in BIT_FUNCTION_CODES:
+            data_bytes = (count + 7) // 8
+        else:
+            data_bytes = 2 * count
+        chars = REQUEST_FRAME_BYTES + RESPONSE_OVERHEAD_BYTES + data_bytes + INTER_FRAME_CHARS
+        return chars * self.char_time + self.turnaround
+
+
+def _max_count(function_code):
+    return MAX_BITS_PER_READ if function_code in BIT_FUNCTION_CODES else MAX_REGISTERS_PER_READ
+
+
+def plan_read_blocks(registers, timing):
+    """
+    Agrupa os registradores por escravo e código de função no menor número de
+    leituras em bloco. Lacunas entre endereços são lidas junto quando um quadro
+    maior custa menos que uma transação extra no `timing` informado.
+    """
+    groups = {}
+    for reg in registers:
+        if reg.function_code not in FUNCTION_CODE_BASE:
+            log.error(f"Código de função desconhecido ({reg.function_code}) no registrador {reg.name}.")
+            continue
+        groups.setdefault((reg.slave_id, reg.function_code), []).append(reg)
+
+    blocks = []
+    for (slave_id, function_code), regs in sorted(groups.items()):
+        limit = _max_count(function_code)
+        regs.sort(key=lambda r: (r.offset, -r.width))
+        current = None
+        for reg in regs:
+            end = reg.offset + reg.width
+            if current is not None:
+                current_end = current.start + current.count
+                merged_count = max(current_end, end) - current.start
+                if merged_count <= limit:
+                    merged_cost = timing.transaction_time(function_code, merged_count)
+                    separate_cost = (timing.transaction_time(function_code, current.count)
+                                     + timing.transaction_time(function_code, reg.width))
+                    if end <= current_end or merged_cost <= separate_cost:
+                        current.count = merged_count
+                        current.members.append(reg)
+                        continue
+            current = ReadBlock(slave_id, function_code, reg.offset, reg.width, [reg])
+            blocks.append(current)
+    return blocks
+
+
+def absorb_covered(blocks, registers):
+    """
+    Acrescenta aos blocos já planejados os registradores cujo endereço cabe
+    inteiramente no intervalo lido: vêm na mesma resposta sem custo extra.
+    Devolve os registradores absorvidos.
+    """
+    by_group = {}
+    for block in blocks:
+        by_group.setdefault((block.slave_id, block.function_code), []).append(block)
+    absorbed = []
+    for reg in registers:
+        for block in by_group.get((reg.slave_id, reg.function_code), []):
+            if any(member.id == reg.id for member in block.members):
+                break
+            if block.start <= reg.offset and reg.offset + reg.width <= block.start + block.count:
+                block.members.append(reg)
+                absorbed.append(reg)
+                break
+    return absorbed
+
+
+def _request_block(client, block):
+    """Dispara a leitura do bloco e devolve o awaitable da resposta."""
+    if block.function_code == 3:
+        return client.read_holding_registers(address=block.start, count=block.count, device_id=block.slave_id)
+    if block.function_code == 4:
+        return client.read_input_registers(address=block.start, count=block.count, device_id=block.slave_id)
+    if block.function_code == 1:
+        return client.read_coils(address=block.start, count=block.count, device_id=block.slave_id)
+    return client.read_discrete_inputs(address=block.start, count=block.count, device_id=block.slave_id)
+
+
+def slice_block_values(block, response):
+    """Extrai e decodifica o valor de cada membro a partir da resposta do bloco."""
+    values = {}
+    for reg in block.members:
+        rel = reg.offset - block.start
+        if block.function_code in BIT_FUNCTION_CODES:
+            values[reg.id] = response.bits[rel]
+        else:
+            values[reg.id] = decode_words(reg.data_type, response.registers[rel:rel + reg.width])
+    return values
+
+
+def _evaluate_response(block, response):
+    """Devolve (valores, dividir) para a resposta de um bloco."""
+    if response and not response.isError():
+        return slice_block_values(block, response), False
+    if block.has_gaps and response is not None:
+        log.warning(f"Escravo {block.slave_id} rejeitou {block}: {response}. Lendo registradores individualmente.")
+        return {}, True
+    log.warning(f"Erro ao ler {block}: {response}")
+    return {}, False
+
+
+def _single_blocks(block):
+    return [ReadBlock(block.slave_id, block.function_code, reg.offset, reg.width, [reg]) for reg in block.members]
+
+
+def raise_if_cancelling(exc):
+    """
+    O pymodbus converte o cancelamento da tarefa em ModbusIOException; repassa o
+    CancelledError para que o encerramento do controlador não fique preso.
+    """
+    task = asyncio.current_task()
+    if task is not None and task.cancelling():
+        raise asyncio.CancelledError() from exc
+
+
+async def read_block_async(client, block, guard=None):
+    """
+    Executa a leitura de um bloco pelo cliente assíncrono do pymodbus e devolve
+    {register_id: valor} dos membros lidos com sucesso. Se o escravo rejeitar um
+    bloco com lacunas (ex.: endereço ilegal), os membros são lidos individualmente.
+    `guard`, se informado, envolve cada requisição: `guard(block, awaitable)`.
+    """
+    request = _request_block(client, block)
+    if guard is not None:
+        request = guard(block, request)
+    try:
+        response = await request
+    except ModbusException as e:
+        raise_if_cancelling(e)
+        log.warning(f"Falha de comunicação ao ler {block}: {e}")
+        return {}
+
+    values, split = _evaluate_response(block, response)
+    if split:
+        for single in _single_blocks(block):
+            values.update(await read_block_async(client, single, guard))
+    return values
+
+
+async def read_registers_async(client, registers, timing):
+    """Lê um conjunto de registradores usando o menor número de requisições."""
+    values = {}
+    blocks = plan_read_blocks(registers, timing)
+    for block in blocks:
+        values.update(await read_block_async(client, block))
+    log.debug(f"{len(registers)} registradores lidos em {len(blocks)} requisições.")
+    return values
@@ -0,0 +1,267 @@
+import datetime
+import heapq
+import logging
+import operator
+from app.services.modbus_read_planner import PlannedRegister
+from app.services.modbus_write_planner import PlannedWrite, encode_words
+from app.services.telemetry_compression import CompressionSettings
+
+log = logging.getLogger(__name__)
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+}
+
+# Códigos de função que aceitam escrita pelas ações
+WRITABLE_FUNCTION_CODES = (1, 3)
+
+# Resultados possíveis da avaliação de uma regra
+TRUE = 'true'
+FALSE = 'false'
+INDETERMINATE = 'indeterminate'
+
+# Regras sem mudança nas entradas são reavaliadas ao menos a cada RECHECK_INTERVAL segundos
+RECHECK_INTERVAL = 60
+
+
+class CompiledCondition:
+    """Condição com registrador e operador já resolvidos."""
+
+    def __init__(self, name, register, symbol, right_value):
+        self.name = name
+        self.register = register
+        self.symbol = symbol
+        self.compare = OPERATORS[symbol]
+        self.right_value = right_value
+
+    def __repr__(self):
+        return f'<CompiledCondition {self.register.name} {self.symbol} {self.right_value}>'
+
+
+class CompiledRule:
+    """Regra habilitada em estruturas simples: condições resolvidas e escritas das ações já codificadas."""
+
+    def __init__(self, id, name, priority, stop_on_trigger, conditions, actions):
+        self.id = id
+        self.name = name
+        self.priority = priority
+        self.stop_on_trigger = stop_on_trigger
+        self.conditions = conditions
+        self.actions = actions
+
+    def __repr__(self):
+        return f'<CompiledRule {self.name} prioridade={self.priority}>'
+
+
+class RuleSet:
+    """
+    Regras compiladas de uma versão da configuração, sem vínculo com a sessão do
+    banco. `registers` tem os PlannedRegister das condições e dos alvos;
+    `addresses` guarda o `ip_address` do dispositivo de cada um,
+    `compression` a compressão das leituras gravadas e `dependents` indica,
+    por registrador, as regras cujas condições o leem.
+    """
+
+    def __init__(self, version, rules, registers, addresses, inactive, compression=None):
+        self.version = version
+        self.rules = rules
+        self.registers = registers
+        self.addresses = addresses
+        self.inactive = frozenset(inactive)
+        self.compression = compression or {}
+        self.positions = {rule.id: position for position, rule in enumerate(rules)}
+        self.dependents = {}
+        for rule in rules:
+            for condition in rule.conditions:
+                self.dependents.setdefault(condition.register.id, set()).add(rule.id)
+
+    @property
+    def condition_registers(self):
+        return [self.registers[register_id] for register_id in sorted(self.dependents)]
+
+    def __repr__(self):
+        return f'<RuleSet v{self.version} {len(self.rules)} regras {len(self.registers)} registradores>'
+
+
+def plan_action_write(action, register):
+    """Converte a ação em uma escrita planejada no formato do registrador alvo."""
+    if register.function_code == 1:
+        return PlannedWrite(register, bool(action.write_value), source=action.name)
+    return PlannedWrite(register, action.write_value, words=encode_words(register.data_type, action.write_value), source=action.name)
+
+
+def compile_rule_set(version, rules, registers):
+    """
+    Compila as regras habilitadas (ORM, em ordem de prioridade) e os registradores
+    envolvidos ({id: ModbusRegister} com o dispositivo carregado). Regras com
+    condições impossíveis de resolver são descartadas aqui, uma única vez.
+    """
+    planned = {register_id: PlannedRegister.from_model(register) for register_id, register in registers.items()}
+    compiled = []
+    for rule in rules:
+        conditions = []
+        for condition in rule.conditions:
+            register = planned.get(condition.left_register_id)
+            if register is None:
+                log.error(f"Registrador esquerdo (ID: {condition.left_register_id}) não encontrado para a condição '{condition.name}'. Regra '{rule.name}' ignorada.")
+                break
+            symbol = condition.operator.value
+            if symbol not in OPERATORS:
+                log.error(f"Operador '{symbol}' desconhecido na condição '{condition.name}'. Regra '{rule.name}' ignorada.")
+                break
+            conditions.append(CompiledCondition(condition.name, register, symbol, condition.right_value))
+        else:
+            actions = []
+            for action in rule.actions:
+                register = planned.get(action.target_register_id)
+                if register is None:
+                    log.error(f"Registrador alvo (ID: {action.target_register_id}) não encontrado para a ação '{action.name}'. Ação ignorada.")
+                elif register.function_code not in WRITABLE_FUNCTION_CODES:
+                    log.error(f"Registrador '{register.name}' não suporta escrita para a ação '{action.name}'. Ação ignorada.")
+                else:
+                    actions.append(plan_action_write(action, register))
+            compiled.append(CompiledRule(rule.id, rule.name, rule.priority, rule.stop_on_trigger, conditions, actions))
+
+    addresses = {register_id: register.device.ip_address for register_id, register in registers.items()}
+    inactive = [register_id for register_id, register in registers.items() if not register.device.ativo]
+    compression = {register_id: CompressionSettings.from_model(register) for register_id, register in registers.items()}
+    return RuleSet(version, compiled, planned, addresses, inactive, compression)
+
+
+def evaluate_rule(rule, snapshot):
+    """
+    Avalia uma regra sobre o snapshot. A regra é indeterminada quando nenhuma
+    condição é falsa mas alguma depende de um escravo indisponível (circuito aberto).
+    """
+    log.info(f"Avaliando regra: '{rule.name}'")
+    unknown = False
+    try:
+        for condition in rule.conditions:
+            register = condition.register
+            if register.id in snapshot.unavailable:
+                log.info(f"  Condição '{condition.name}': escravo de '{register.name}' indisponível. Valor desconhecido.")
+                unknown = True
+                continue
+
+            if register.id not in snapshot:
+                log.warning(f"Não foi possível ler o valor para a condição '{condition.name}'. Pulando regra.")
+                return FALSE
+            current_value = snapshot.get(register.id)
+
+            log.info(f"  Condição '{condition.name}': Valor lido de '{register.name}' = {current_value}. Comparando com {condition.right_value} usando o operador '{condition.symbol}'.")
+
+            if not condition.compare(current_value, condition.right_value):
+                log.info(f"  Condição '{condition.name}' não atendida. Parando avaliação para esta regra.")
+                return FALSE # Para de checar outras condições para esta regra
+    except Exception as e:
+        log.error(f"Erro ao avaliar a regra '{rule.name}': {e}", exc_info=True)
+        return FALSE
+    return INDETERMINATE if unknown else TRUE
+
+
+class _Marker:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'<{self.name}>'
+
+
+# Estados de uma entrada sem valor numérico no snapshot
+NEVER_SEEN = _Marker('nunca vista')
+MISSING = _Marker('sem leitura')
+UNAVAILABLE = _Marker('indisponível')
+
+
+class RuleEvaluator:
+    """
+    Avaliação incremental de um RuleSet. A cada snapshot só são reavaliadas as
+    regras que dependem de registradores cujo valor mudou mais que `epsilon`
+    (ou que ficaram sem leitura/indisponíveis) e as que venceram a reavaliação
+    periódica; as demais mantêm o último resultado em cache.
+    """
+
+    def __init__(self, rule_set, epsilon=0.0, recheck_interval=RECHECK_INTERVAL):
+        self.rule_set = rule_set
+        self.epsilon = epsilon
+        self.recheck_interval = datetime.timedelta(seconds=recheck_interval)
+        self.results = {}
+        # Regras efetivamente reavaliadas no último snapshot
+        self.evaluated = frozenset()
+        self._inputs = {}
+        self._evaluated_at = {}
+        self._recheck = []
+        self._selection = ([], [])
+
+    def _input(self, register_id, snapshot):
+        if register_id in snapshot.unavailable:
+            return UNAVAILABLE
+        if register_id not in snapshot:
+            return MISSING
+        return snapshot.get(register_id)
+
+    def _changed(self, old, new):
+        if isinstance(old, _Marker) or isinstance(new, _Marker):
+            return old is not new
+        try:
+            return abs(new - old) > self.epsilon
+        except TypeError:
+            return new != old
+
+    def _due_rechecks(self, now):
+        due = set()
+        while self._recheck and self._recheck[0][0] <= now:
+            _, rule_id = heapq.heappop(self._recheck)
+            evaluated_at = self._evaluated_at.get(rule_id)
+            if evaluated_at is not None and evaluated_at + self.recheck_interval <= now:
+                due.add(rule_id)
+        return due
+
+    def evaluate(self, snapshot):
+        """Devolve (ativadas, indeterminadas), em ordem de prioridade, para o snapshot."""
+        now = snapshot.timestamp
+        dirty = self._due_rechecks(now)
+        for register_id, rule_ids in self.rule_set.dependents.items():
+            value = self._input(register_id, snapshot)
+            if self._changed(self._inputs.get(register_id, NEVER_SEEN), value):
+                self._inputs[register_id] = value
+                dirty.update(rule_ids)
+        dirty.update(rule.id for rule in self.rule_set.rules if rule.id not in self.results and not rule.conditions)
+        self.evaluated = frozenset(dirty)
+        if not dirty:
+            return self._selection
+
+        positions = self.rule_set.positions
+        for rule_id in sorted(dirty, key=positions.get):
+            self.results[rule_id] = evaluate_rule(self.rule_set.rules[positions[rule_id]], snapshot)
+            self._evaluated_at[rule_id] = now
+            heapq.heappush(self._recheck, (now + self.recheck_interval, rule_id))
+        log.info(f"{len(dirty)} de {len(self.rule_set.rules)} regras reavaliadas.")
+        self._selection = self._select()
+        return self._selection
+
+    def _select(self):
+        triggered = []
+        indeterminate = []
+        for rule in self.rule_set.rules:
+            result = self.results.get(rule.id)
+            if result == INDETERMINATE:
+                indeterminate.append(rule)
+                if rule.stop_on_trigger:
+                    log.info(f"Regra '{rule.name}' tem 'stop_on_trigger' ativado. Sem saber se ela seria ativada, as demais regras não são consideradas.")
+                    break
+            elif result == TRUE:
+                triggered.append(rule)
+                if rule.stop_on_trigger:
+                    log.info(f"Regra '{rule.name}' tem 'stop_on_trigger' ativado. As demais regras não são consideradas neste ciclo.")
+                    break
+        for rule in triggered:
+            log.warning(f"REGRA ATIVADA: '{rule.name}'. Todas as condições foram atendidas. Executando ações.")
+        for rule in indeterminate:
+            log.warning(f"REGRA INDETERMINADA: '{rule.name}'. Depende de escravo indisponível; ações não executadas.")
+        return triggered, indeterminate
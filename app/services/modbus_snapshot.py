@@ -0,0 +1,50 @@
+import datetime
+from types import MappingProxyType
+
+
+class RegisterSnapshot:
+    """Valores de um conjunto de registradores lidos em um mesmo ciclo (somente leitura)."""
+
+    def __init__(self, values, timestamp, requested=(), unavailable=()):
+        self._values = MappingProxyType(dict(values))
+        self.timestamp = timestamp
+        self.failed = frozenset(set(requested) - set(self._values))
+        # Registradores de escravos com o circuito aberto: seu valor é desconhecido
+        self.unavailable = frozenset(unavailable)
+
+    @property
+    def values(self):
+        return self._values
+
+    def get(self, register_id, default=None):
+        return self._values.get(register_id, default)
+
+    def __contains__(self, register_id):
+        return register_id in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return f'<RegisterSnapshot {len(self._values)} valores @ {self.timestamp} falhas={len(self.failed)}>'
+
+
+def snapshot_from_latest(latest, register_ids, max_age, now=None, unavailable=()):
+    """
+    Congela os valores mais recentes publicados pelos pollers dos barramentos.
+    `latest` mapeia register_id -> (valor, timestamp); valores mais antigos que
+    `max_age` segundos (um número ou um dict register_id -> segundos) são
+    tratados como falha de leitura, assim como os de `unavailable`.
+    """
+    now = now or datetime.datetime.now()
+    unavailable = frozenset(unavailable)
+    values = {}
+    for register_id in register_ids:
+        entry = latest.get(register_id)
+        if register_id in unavailable:
+            continue
+        limit = max_age[register_id] if isinstance(max_age, dict) else max_age
+        if entry is not None and (now - entry[1]).total_seconds() <= limit:
+            values[register_id] = entry[0]
+    return RegisterSnapshot(values, now, requested=register_ids, unavailable=unavailable)
+
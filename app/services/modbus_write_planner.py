@@ -0,0 +1,115 @@
+import logging
+import struct
+from app.services.modbus_read_planner import decode_words, read_registers_async
+
+log = logging.getLogger(__name__)
+
+# Limite do protocolo Modbus para Write Multiple Registers (FC16)
+MAX_REGISTERS_PER_WRITE = 123
+
+
+def encode_words(data_type, value):
+    """Codifica um valor em registradores de 16 bits conforme o tipo de dado (inverso de `decode_words`)."""
+    if data_type == 'float32':
+        packed = struct.pack('>f', float(value))
+        return [struct.unpack('>H', packed[i:i+2])[0] for i in range(0, 4, 2)]
+    if data_type == 'int32':
+        value = int(value)
+        return [(value >> 16) & 0xFFFF, value & 0xFFFF]
+    # boolean, int16, uint16
+    return [int(value) & 0xFFFF]
+
+
+class PlannedWrite:
+    """
+    Escrita pretendida em um registrador (PlannedRegister). Holding registers
+    levam as palavras já codificadas; bobinas levam um booleano.
+    """
+
+    def __init__(self, register, value, words=None, source=None):
+        self.register = register
+        self.words = list(words) if words is not None else None
+        # Valor como seria lido de volta, para comparar com o último valor conhecido
+        self.value = decode_words(register.data_type, self.words) if self.words is not None else bool(value)
+        self.source = source
+
+    @property
+    def width(self):
+        return len(self.words) if self.words is not None else 1
+
+    def satisfied_by(self, known):
+        """Indica se o valor conhecido do registrador já é o pretendido."""
+        if known is None:
+            return False
+        if self.words is None:
+            return bool(known) == self.value
+        return known == self.value
+
+    def __repr__(self):
+        return f'<PlannedWrite {self.register.name} slave={self.register.slave_id} valor={self.value}>'
+
+
+class WriteBlock:
+    """Uma única requisição de escrita: FC16 com registradores adjacentes ou FC5 para uma bobina."""
+
+    def __init__(self, slave_id, function_code, start, members):
+        self.slave_id = slave_id
+        self.function_code = function_code
+        self.start = start
+        self.members = members
+
+    @property
+    def count(self):
+        return sum(write.width for write in self.members)
+
+    @property
+    def words(self):
+        return [word for write in self.members for word in write.words]
+
+    def __repr__(self):
+        return f'<WriteBlock slave={self.slave_id} fc={self.function_code} start={self.start} count={self.count} regs={len(self.members)}>'
+
+
+def plan_write_blocks(writes):
+    """
+    Junta escritas em holding registers adjacentes (sem lacunas, que seriam
+    sobrescritas) do mesmo escravo em uma única requisição FC16. Bobinas são
+    escritas uma a uma.
+    """
+    blocks = []
+    holding = {}
+    for write in writes:
+        if write.words is None:
+            blocks.append(WriteBlock(write.register.slave_id, write.register.function_code, write.register.offset, [write]))
+        else:
+            holding.setdefault(write.register.slave_id, []).append(write)
+
+    for slave_id, slave_writes in sorted(holding.items()):
+        slave_writes.sort(key=lambda w: w.register.offset)
+        current = None
+        for write in slave_writes:
+            if (current is not None and current.start + current.count == write.register.offset
+                    and current.count + write.width <= MAX_REGISTERS_PER_WRITE):
+                current.members.append(write)
+                continue
+            current = WriteBlock(slave_id, write.register.function_code, write.register.offset, [write])
+            blocks.append(current)
+    return blocks
+
+
+async def write_block_async(client, block):
+    """Executa a escrita de um bloco com o cliente assíncrono do pymodbus."""
+    if block.function_code == 3:
+        return await client.write_registers(address=block.start, values=block.words, device_id=block.slave_id)
+    return await client.write_coil(address=block.start, value=block.members[0].value, device_id=block.slave_id)
+
+
+async def verify_writes_async(client, blocks, timing):
+    """
+    Relê em lote os registradores escritos pelos blocos e devolve
+    (lidos, divergentes), com divergentes = [(escrita, valor lido)].
+    """
+    writes = [write for block in blocks for write in block.members]
+    values = await read_registers_async(client, [write.register for write in writes], timing)
+    mismatches = [(write, values.get(write.register.id)) for write in writes if not write.satisfied_by(values.get(write.register.id))]
+    return values, mismatches
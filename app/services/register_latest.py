@@ -0,0 +1,46 @@
+import logging
+from sqlalchemy import text
+
+log = logging.getLogger(__name__)
+
+# Qualidade do último valor
+GOOD = 'good'
+UNAVAILABLE = 'unavailable'
+
+MARK_QUALITY_SQL = "UPDATE register_latest SET quality = :quality WHERE register_id = :register_id"
+
+
+# Uma linha por registrador; o gravador em lote agrupa as linhas do ciclo em um único executemany.
+# Um valor mais antigo que o gravado não o sobrescreve
+LATEST_UPSERT_SQL = (
+    "INSERT INTO register_latest (register_id, value, ts, quality) VALUES (:register_id, :value, :ts, :quality) "
+    "ON DUPLICATE KEY UPDATE "
+    "value = IF(VALUES(ts) >= ts, VALUES(value), value), "
+    "quality = IF(VALUES(ts) >= ts, VALUES(quality), quality), "
+    "ts = GREATEST(ts, VALUES(ts))"
+)
+
+
+def latest_upsert_rows(values, timestamp, quality=GOOD):
+    """Upserts [(sql, params)] do último valor de cada registrador ({register_id: valor}), em ordem de register_id."""
+    return [
+        (LATEST_UPSERT_SQL, {'register_id': register_id, 'value': float(value), 'ts': timestamp, 'quality': quality})
+        for register_id, value in sorted(values.items())
+    ]
+
+
+def load_latest(connection, register_ids=None):
+    """Últimos valores por registrador: {register_id: {'value', 'ts', 'quality'}}; todos se `register_ids` for None."""
+    sql = "SELECT register_id, value, ts, quality FROM register_latest"
+    params = {}
+    if register_ids is not None:
+        register_ids = list(register_ids)
+        if not register_ids:
+            return {}
+        placeholders = ', '.join(f":id{position}" for position in range(len(register_ids)))
+        sql += f" WHERE register_id IN ({placeholders})"
+        params = {f"id{position}": register_id for position, register_id in enumerate(register_ids)}
+    return {
+        register_id: {'value': value, 'ts': ts, 'quality': quality}
+        for register_id, value, ts, quality in connection.execute(text(sql), params)
+    }
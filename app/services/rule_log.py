@@ -0,0 +1,112 @@
+import logging
+from app.services.modbus_rule_set import TRUE, INDETERMINATE
+
+log = logging.getLogger(__name__)
+
+# Tipos de linha de modbus_rule_log
+TRANSITION = 'transicao'
+SUMMARY = 'resumo'
+
+RULE_LOG_SQL = (
+    "INSERT INTO modbus_rule_log (rule_id, timestamp, kind, condition_result, action_executed, detail, "
+    "evaluations, true_count, action_count) "
+    "VALUES (:rule_id, :timestamp, :kind, :condition_result, :action_executed, :detail, "
+    ":evaluations, :true_count, :action_count)"
+)
+
+# Intervalo padrão (s) entre as linhas de resumo de cada regra
+SUMMARY_INTERVAL = 3600
+DETAIL_MAX_LENGTH = 255
+
+
+def describe_inputs(rule, snapshot):
+    """Valores das condições da regra no snapshot, para registrar o motivo de uma transição."""
+    parts = []
+    for condition in rule.conditions:
+        register = condition.register
+        if register.id in snapshot.unavailable:
+            value = 'indisponível'
+        elif register.id not in snapshot:
+            value = 'sem leitura'
+        else:
+            value = snapshot.get(register.id)
+        parts.append(f"{register.name}={value} ({condition.symbol} {condition.right_value})")
+    detail = '; '.join(parts)
+    return detail[:DETAIL_MAX_LENGTH]
+
+
+class RuleLogRecorder:
+    """
+    Registro das avaliações de regras por borda: só as mudanças de
+    condition_result ou action_executed de cada regra viram linha, com os
+    valores das condições no momento. A cada `summary_interval` segundos cada
+    regra avaliada ganha uma linha de resumo com os contadores do período.
+    `observe` devolve as linhas [(sql, params)] para o gravador em lote.
+    """
+
+    def __init__(self, summary_interval=SUMMARY_INTERVAL):
+        self.summary_interval = summary_interval
+        self._states = {}
+        self._counters = {}
+        self._period_start = None
+
+    def observe(self, rule_set, results, evaluated, written, snapshot):
+        """
+        `evaluated` são os ids das regras reavaliadas neste ciclo (as demais
+        mantêm o resultado em cache e não contam como avaliação) e `written`
+        as escritas efetivamente realizadas por execute_rule_actions.
+        """
+        now = snapshot.timestamp
+        if self._period_start is None:
+            self._period_start = now
+        rows = []
+        for rule in rule_set.rules:
+            result = results.get(rule.id)
+            if result is None:
+                continue
+            state = (result == TRUE, any(write in written for write in rule.actions))
+            counters = self._counters.setdefault(rule.id, [0, 0, 0])
+            if rule.id in evaluated:
+                counters[0] += 1
+                counters[1] += state[0]
+            counters[2] += state[1]
+            if self._states.get(rule.id) == state:
+                continue
+            self._states[rule.id] = state
+            detail = describe_inputs(rule, snapshot)
+            if result == INDETERMINATE:
+                detail = ('indeterminada: ' + detail)[:DETAIL_MAX_LENGTH]
+            rows.append(self._row(rule.id, now, TRANSITION, state, detail))
+        if (now - self._period_start).total_seconds() >= self.summary_interval:
+            rows.extend(self.summaries(now))
+        return rows
+
+    def summaries(self, now):
+        """Linhas de resumo do período corrente, que é reiniciado."""
+        rows = [
+            self._row(rule_id, now, SUMMARY, self._states[rule_id], None, counters)
+            for rule_id, counters in self._counters.items() if any(counters)
+        ]
+        self._counters = {}
+        self._period_start = now
+        return rows
+
+    def forget(self, rule_ids):
+        """Descarta o estado das regras que deixaram de existir após recarregar a configuração."""
+        for rule_id in set(self._states) - set(rule_ids):
+            self._states.pop(rule_id, None)
+            self._counters.pop(rule_id, None)
+
+    @staticmethod
+    def _row(rule_id, timestamp, kind, state, detail, counters=(None, None, None)):
+        return RULE_LOG_SQL, {
+            'rule_id': rule_id,
+            'timestamp': timestamp,
+            'kind': kind,
+            'condition_result': state[0],
+            'action_executed': state[1],
+            'detail': detail,
+            'evaluations': counters[0],
+            'true_count': counters[1],
+            'action_count': counters[2],
+        }
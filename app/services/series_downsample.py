@@ -0,0 +1,101 @@
+import datetime
+from app.services.telemetry_rollup import RESOLUTIONS, choose_resolution, load_series, raw_count
+
+try:
+    import numpy
+except ImportError: # Sem NumPy o LTTB roda em Python puro, com o mesmo resultado
+    numpy = None
+
+# Pontos lidos do banco por ponto devolvido: o LTTB escolhe entre esses candidatos
+OVERSAMPLE = 4
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+
+
+def _bucket_edges(length, threshold):
+    """Limites dos threshold - 2 buckets internos; o primeiro e o último ponto ficam de fora."""
+    every = (length - 2) / (threshold - 2)
+    edges = [int(i * every) + 1 for i in range(threshold - 1)]
+    edges[-1] = length - 1
+    return edges
+
+
+def _lttb_python(xs, ys, threshold):
+    edges = _bucket_edges(len(xs), threshold) + [len(xs)]
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Média do próximo bucket (ou o último ponto): terceiro vértice do triângulo
+        next_start, next_end = edges[i + 1], edges[i + 2]
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        best, best_area = edges[i], -1.0
+        for j in range(edges[i], edges[i + 1]):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(len(xs) - 1)
+    return selected
+
+
+def _lttb_numpy(xs, ys, threshold):
+    xs = numpy.asarray(xs, dtype=float)
+    ys = numpy.asarray(ys, dtype=float)
+    # Médias de todos os buckets de uma vez; a do bucket i + 1 é o terceiro vértice do bucket i
+    edges = numpy.array(_bucket_edges(len(xs), threshold))
+    counts = numpy.diff(edges)
+    avg_x = numpy.add.reduceat(xs[:-1], edges[:-1]) / counts
+    avg_y = numpy.add.reduceat(ys[:-1], edges[:-1]) / counts
+    avg_x = numpy.append(avg_x[1:], xs[-1])
+    avg_y = numpy.append(avg_y[1:], ys[-1])
+
+    selected = numpy.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, len(xs) - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        areas = numpy.abs((xs[a] - avg_x[i]) * (ys[start:end] - ys[a]) - (xs[a] - xs[start:end]) * (avg_y[i] - ys[a]))
+        a = start + int(areas.argmax())
+        selected[i + 1] = a
+    return selected.tolist()
+
+
+def lttb(xs, ys, threshold):
+    """
+    Índices dos pontos escolhidos pelo Largest-Triangle-Three-Buckets: no máximo
+    `threshold`, sempre com o primeiro e o último, preservando picos e vales.
+    `xs` deve ser crescente (ex.: segundos desde a época).
+    """
+    if threshold < 3:
+        raise ValueError("O LTTB precisa de pelo menos 3 pontos.")
+    if threshold >= len(xs):
+        return list(range(len(xs)))
+    if numpy is not None:
+        return _lttb_numpy(xs, ys, threshold)
+    return _lttb_python(xs, ys, threshold)
+
+
+def load_downsampled(connection, kind, series_id, start, end, points=DEFAULT_POINTS):
+    """
+    Série de `series_id` entre `start` e `end` reduzida a no máximo `points`
+    pontos [(instante, valor)]. Lê o agregado com resolução de cerca de
+    OVERSAMPLE candidatos por ponto e aplica o LTTB sobre as médias. Períodos
+    curtos demais para o agregado de 1 minuto usam as amostras brutas enquanto
+    forem até points * OVERSAMPLE; acima disso, o agregado de 1 minuto. Assim
+    a leitura fica limitada por `points` (ou pelos minutos do período) e não
+    pelo volume de amostras.
+    """
+    limit = points * OVERSAMPLE
+    resolution = (end - start).total_seconds() / limit
+    if choose_resolution(resolution) is None and raw_count(connection, kind, series_id, start, end, limit + 1) > limit:
+        resolution = RESOLUTIONS[0]
+    rows = load_series(connection, kind, series_id, start, end, resolution)
+    if not rows:
+        return []
+    epoch = datetime.datetime(1970, 1, 1)
+    xs = [(row['bucket'] - epoch).total_seconds() for row in rows]
+    ys = [float(row['avg']) for row in rows]
+    return [(rows[index]['bucket'], ys[index]) for index in lttb(xs, ys, points)]
@@ -0,0 +1,173 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+# Intervalo máximo (s) entre pontos gravados de um registrador comprimido sem heartbeat configurado
+DEFAULT_HEARTBEAT = 3600
+
+
+class CompressionSettings:
+    """
+    Compressão das leituras de um registrador antes de gravar. `deadband` é a
+    tolerância, absoluta ou em % do último valor gravado (`percent`). Com
+    `swinging_door` a tolerância é medida em torno da reta entre os pontos
+    gravados (tendência); sem ela, em torno do último valor gravado (banda morta).
+    `heartbeat` é o intervalo máximo (s) entre dois pontos gravados.
+    """
+
+    def __init__(self, deadband=None, percent=False, swinging_door=False, heartbeat=None):
+        self.deadband = deadband
+        self.percent = percent
+        self.swinging_door = swinging_door
+        self.heartbeat = heartbeat
+
+    @classmethod
+    def from_model(cls, register):
+        return cls(register.deadband, bool(register.deadband_percent), bool(register.swinging_door), register.heartbeat_interval)
+
+    @property
+    def enabled(self):
+        """Sem tolerância configurada, todas as leituras são gravadas."""
+        return self.deadband is not None
+
+    def tolerance(self, reference):
+        if self.percent:
+            return abs(reference) * self.deadband / 100
+        return self.deadband
+
+    def __eq__(self, other):
+        return isinstance(other, CompressionSettings) and vars(self) == vars(other)
+
+    def __repr__(self):
+        mode = 'porta' if self.swinging_door else 'banda'
+        unit = '%' if self.percent else ''
+        return f'<CompressionSettings {mode} {self.deadband}{unit} heartbeat={self.heartbeat}>'
+
+
+class RegisterCompressor:
+    """
+    Decide quais amostras de um registrador precisam ser gravadas para que o
+    sinal possa ser reconstruído dentro da tolerância: degrau a partir do último
+    ponto na banda morta, interpolação linear entre pontos na porta giratória
+    (swinging door). `offer` devolve os pontos [(valor, timestamp)] a gravar.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.archived = None
+        self.held = None
+        self.slope_low = None
+        self.slope_high = None
+
+    def _archive(self, point):
+        self.archived = point
+        self.held = None
+        self.slope_low = None
+        self.slope_high = None
+        return point
+
+    def _heartbeat_due(self, timestamp):
+        heartbeat = self.settings.heartbeat or DEFAULT_HEARTBEAT
+        return (timestamp - self.archived[1]).total_seconds() >= heartbeat
+
+    def offer(self, value, timestamp):
+        point = (value, timestamp)
+        if not self.settings.enabled:
+            return [point]
+        if self.archived is None:
+            return [self._archive(point)]
+        if self._heartbeat_due(timestamp):
+            # Guarda também o ponto retido, para que a reta até o heartbeat respeite a tolerância
+            pending = [self.held] if self.held is not None else []
+            return pending + [self._archive(point)]
+        if self.settings.swinging_door:
+            return self._swinging_door(point)
+
+        tolerance = self.settings.tolerance(self.archived[0])
+        if abs(value - self.archived[0]) > tolerance:
+            return [self._archive(point)]
+        return []
+
+    def _swinging_door(self, point):
+        """
+        Mantém as inclinações mínima e máxima de uma reta saindo do último ponto
+        gravado que passa a menos da tolerância de todas as amostras seguintes.
+        A amostra só fica retida se a reta até ela estiver dentro dessa porta;
+        senão (a porta abre), grava a última amostra retida, cuja reta cobre
+        todas as anteriores, e recomeça a partir dela.
+        """
+        value, timestamp = point
+        archived_value, archived_at = self.archived
+        elapsed = (timestamp - archived_at).total_seconds()
+        if elapsed <= 0:
+            self.held = point
+            return []
+        tolerance = self.settings.tolerance(archived_value)
+        low = (value - archived_value - tolerance) / elapsed
+        high = (value - archived_value + tolerance) / elapsed
+        slope_low = low if self.slope_low is None else max(self.slope_low, low)
+        slope_high = high if self.slope_high is None else min(self.slope_high, high)
+        if slope_low <= (value - archived_value) / elapsed <= slope_high:
+            self.slope_low, self.slope_high = slope_low, slope_high
+            self.held = point
+            return []
+
+        stored = self._archive(self.held)
+        # Reinicia a porta a partir do ponto gravado com a amostra atual
+        self._swinging_door(point)
+        return [stored]
+
+    def flush(self):
+        """Devolve a amostra retida, se houver (chamado ao encerrar para não perder o último valor)."""
+        if self.held is None:
+            return []
+        return [self._archive(self.held)]
+
+
+class TelemetryCompressor:
+    """Compressores por registrador; registradores sem configuração gravam todas as leituras."""
+
+    def __init__(self):
+        self.settings = {}
+        self._compressors = {}
+        self.offered = 0
+        self.stored = 0
+
+    def configure(self, settings):
+        """
+        Aplica {register_id: CompressionSettings}; compressores de configuração
+        inalterada mantêm o estado. Devolve as amostras retidas pelos descartados.
+        """
+        pending = {}
+        for register_id in list(self._compressors):
+            if settings.get(register_id) != self.settings.get(register_id):
+                points = self._compressors.pop(register_id).flush()
+                if points:
+                    pending[register_id] = points
+                    self.stored += len(points)
+        self.settings = dict(settings)
+        return pending
+
+    def offer(self, register_id, value, timestamp):
+        compressor = self._compressors.get(register_id)
+        if compressor is None:
+            compressor = self._compressors[register_id] = RegisterCompressor(self.settings.get(register_id, CompressionSettings()))
+        points = compressor.offer(value, timestamp)
+        self.offered += 1
+        self.stored += len(points)
+        return points
+
+    def flush(self):
+        """Devolve as amostras retidas de todos os registradores: {register_id: [(valor, timestamp)]}."""
+        pending = {}
+        for register_id, compressor in self._compressors.items():
+            points = compressor.flush()
+            if points:
+                pending[register_id] = points
+                self.stored += len(points)
+        return pending
+
+    @property
+    def ratio(self):
+        """Leituras recebidas por ponto gravado."""
+        return self.offered / self.stored if self.stored else None
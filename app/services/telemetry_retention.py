@@ -0,0 +1,195 @@
+import argparse
+import datetime
+import logging
+from sqlalchemy import text
+from app.services.telemetry_rollup import RESOLUTIONS, SERIES
+
+log = logging.getLogger(__name__)
+
+# Tabelas brutas particionadas por mês (RANGE em TO_DAYS) e a coluna de partição
+PARTITIONED_TABLES = {
+    'modbus_data': 'timestamp',
+    'nivel': 'data',
+    'modbus_rule_log': 'timestamp',
+}
+# Meses futuros com partição já criada; a pmax (MAXVALUE) só recebe linhas se a manutenção parar
+PARTITIONS_AHEAD = 3
+MAX_PARTITION = 'pmax'
+# Linhas apagadas por instrução ao expirar agregados, para não segurar bloqueios longos
+ROLLUP_DELETE_BATCH = 10000
+
+
+def month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def next_month(day):
+    return datetime.date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+def partition_definition(month):
+    """Partição com as linhas do mês `month` (limite superior exclusivo no primeiro dia do mês seguinte)."""
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (TO_DAYS('{next_month(month):%Y-%m-%d}'))"
+
+
+def list_partitions(connection, table):
+    """Partições existentes: [(nome, limite superior como data ou None para MAXVALUE)], em ordem."""
+    rows = connection.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {'table': table}).fetchall()
+    partitions = []
+    for name, description in rows:
+        if description == 'MAXVALUE':
+            partitions.append((name, None))
+        else:
+            partitions.append((name, datetime.date.fromordinal(int(description) - 365)))
+    return partitions
+
+
+def convert_table(connection, table, column, today):
+    """
+    Migração de uma tabela bruta para particionamento mensal. Remove as chaves
+    estrangeiras, inclui a coluna de partição na chave primária e cria uma
+    partição por mês desde a linha mais antiga. A tabela é reconstruída (cópia):
+    execute em janela de manutenção. Tabelas já particionadas são ignoradas.
+    """
+    if list_partitions(connection, table):
+        log.info(f"Tabela '{table}' já particionada.")
+        return False
+
+    foreign_keys = connection.execute(text(
+        "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+        "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+    ), {'table': table}).scalars().all()
+    for name in foreign_keys:
+        log.info(f"Tabela '{table}': removendo a chave estrangeira {name}.")
+        connection.execute(text(f"ALTER TABLE {table} DROP FOREIGN KEY {name}"))
+
+    primary_key = connection.execute(text(
+        "SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND CONSTRAINT_NAME = 'PRIMARY' ORDER BY ORDINAL_POSITION"
+    ), {'table': table}).scalars().all()
+    if column not in primary_key:
+        log.info(f"Tabela '{table}': chave primária passa a ser (id, {column}).")
+        connection.execute(text(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, {column})"))
+
+    oldest = connection.execute(text(f"SELECT MIN({column}) FROM {table}")).scalar()
+    first = month_start(oldest if oldest is not None else today)
+    last = month_start(today)
+    for _ in range(PARTITIONS_AHEAD):
+        last = next_month(last)
+
+    definitions = []
+    month = first
+    while month <= last:
+        definitions.append(partition_definition(month))
+        month = next_month(month)
+    definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+    log.info(f"Tabela '{table}': criando {len(definitions)} partições a partir de {first:%Y-%m}.")
+    connection.execute(text(f"ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS({column})) ({', '.join(definitions)})"))
+    return True
+
+
+def ensure_future_partitions(connection, table, today):
+    """Cria as partições dos próximos meses separando-as da pmax, que fica vazia (operação rápida)."""
+    partitions = list_partitions(connection, table)
+    bounded = [upper for _, upper in partitions if upper is not None]
+    if not bounded:
+        return 0
+    target = month_start(today)
+    for _ in range(PARTITIONS_AHEAD + 1):
+        target = next_month(target)
+    months = []
+    month = max(bounded)
+    while month < target:
+        months.append(month)
+        month = next_month(month)
+    if months:
+        definitions = [partition_definition(month) for month in months]
+        definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+        connection.execute(text(f"ALTER TABLE {table} REORGANIZE PARTITION {MAX_PARTITION} INTO ({', '.join(definitions)})"))
+        log.info(f"Tabela '{table}': {len(months)} partição(ões) criada(s) até {months[-1]:%Y-%m}.")
+    return len(months)
+
+
+def drop_expired_partitions(connection, table, retention_days, today):
+    """Descarta as partições cujo mês inteiro já passou do prazo de retenção (DROP PARTITION, sem DELETE)."""
+    if retention_days is None:
+        return []
+    cutoff = today - datetime.timedelta(days=retention_days)
+    expired = [name for name, upper in list_partitions(connection, table) if upper is not None and upper <= cutoff]
+    if expired:
+        connection.execute(text(f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}"))
+        log.info(f"Tabela '{table}': partições expiradas descartadas: {', '.join(expired)}.")
+    return expired
+
+
+def expire_rollups(connection, retention, today):
+    """Apaga, em lotes, os buckets dos agregados mais antigos que a retenção da sua resolução."""
+    deleted = 0
+    for series in SERIES.values():
+        for resolution in RESOLUTIONS:
+            days = retention.get(f"rollup_{resolution}")
+            if days is None:
+                continue
+            cutoff = datetime.datetime.combine(today - datetime.timedelta(days=days), datetime.time())
+            while True:
+                count = connection.execute(text(
+                    f"DELETE FROM {series['table']} WHERE resolution = :resolution AND bucket < :cutoff LIMIT {ROLLUP_DELETE_BATCH}"
+                ), {'resolution': resolution, 'cutoff': cutoff}).rowcount
+                connection.commit()
+                deleted += count
+                if count < ROLLUP_DELETE_BATCH:
+                    break
+    if deleted:
+        log.info(f"{deleted} agregados expirados apagados.")
+    return deleted
+
+
+def run_maintenance(engine, retention, today=None):
+    """Rotina diária: cria as partições futuras, descarta as expiradas e expira os agregados."""
+    today = today or datetime.date.today()
+    with engine.connect() as connection:
+        for table in PARTITIONED_TABLES:
+            if not list_partitions(connection, table):
+                log.warning(f"Tabela '{table}' não está particionada; execute a conversão (--convert). Retenção não aplicada.")
+                continue
+            ensure_future_partitions(connection, table, today)
+            drop_expired_partitions(connection, table, retention.get(table), today)
+        connection.commit()
+        expire_rollups(connection, retention, today)
+
+
+def main():
+    from app.services.db_engine import dispose_engines, get_engine
+    from config import SQLALCHEMY_DATABASE_URI as DB_URI, RETENTION_DAYS
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Retenção e particionamento mensal das tabelas de telemetria.")
+    parser.add_argument('--convert', action='store_true', help="Converte as tabelas brutas para particionamento mensal (migração, uma vez).")
+    parser.add_argument('--maintain', action='store_true', help="Cria partições futuras e aplica a retenção (agendar diariamente).")
+    args = parser.parse_args()
+    if not (args.convert or args.maintain):
+        parser.error("Informe --convert e/ou --maintain.")
+
+    engine = get_engine(DB_URI)
+    try:
+        if args.convert:
+            with engine.connect() as connection:
+                for table, column in PARTITIONED_TABLES.items():
+                    convert_table(connection, table, column, datetime.date.today())
+                connection.commit()
+        if args.maintain:
+            run_maintenance(engine, RETENTION_DAYS)
+    finally:
+        dispose_engines()
+
+
+if __name__ == "__main__":
+    main()
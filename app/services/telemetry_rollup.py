@@ -0,0 +1,230 @@
+import argparse
+import datetime
+import logging
+from sqlalchemy import text
+
+log = logging.getLogger(__name__)
+
+# Larguras dos buckets (s): 1 minuto, 1 hora e 1 dia
+RESOLUTIONS = (60, 3600, 86400)
+
+# Séries agregadas: tabela de agregados, coluna da série e leitura das amostras brutas
+SERIES = {
+    'register': {
+        'table': 'modbus_data_rollup',
+        'column': 'register_id',
+        'ids_sql': "SELECT id FROM modbus_register ORDER BY id",
+        'series_raw_sql': "SELECT timestamp, value FROM modbus_data WHERE register_id = :series_id AND timestamp >= :start AND timestamp < :end ORDER BY timestamp",
+    },
+    'reservatorio': {
+        'table': 'nivel_rollup',
+        'column': 'reservatorio_id',
+        'ids_sql': "SELECT id FROM reservatorio ORDER BY id",
+        'series_raw_sql': "SELECT ts, valor FROM nivel WHERE reservatorio_id = :series_id AND ts >= :start AND ts < :end ORDER BY ts",
+    },
+}
+
+# Lote do backfill: amostras brutas lidas por vez antes de gravar os agregados
+BACKFILL_CHUNK = 50000
+
+
+def bucket_start(timestamp, resolution):
+    """Início do bucket de `resolution` segundos que contém `timestamp` (as larguras dividem o dia)."""
+    midnight = datetime.datetime.combine(timestamp.date(), datetime.time())
+    seconds = int((timestamp - midnight).total_seconds())
+    return midnight + datetime.timedelta(seconds=seconds - seconds % resolution)
+
+
+def upsert_sql(kind):
+    """
+    INSERT ... ON DUPLICATE KEY UPDATE que funde um agregado parcial ao bucket
+    existente. As colunas de valor vêm antes das de instante porque o MariaDB
+    aplica as atribuições em ordem.
+    """
+    series = SERIES[kind]
+    return (
+        f"INSERT INTO {series['table']} ({series['column']}, resolution, bucket, min_value, max_value, sum_value, count, "
+        "first_value, first_at, last_value, last_at) "
+        "VALUES (:series_id, :resolution, :bucket, :min_value, :max_value, :sum_value, :count, "
+        ":first_value, :first_at, :last_value, :last_at) "
+        "ON DUPLICATE KEY UPDATE "
+        "min_value = LEAST(min_value, VALUES(min_value)), "
+        "max_value = GREATEST(max_value, VALUES(max_value)), "
+        "sum_value = sum_value + VALUES(sum_value), "
+        "count = count + VALUES(count), "
+        "first_value = IF(VALUES(first_at) < first_at, VALUES(first_value), first_value), "
+        "first_at = LEAST(first_at, VALUES(first_at)), "
+        "last_value = IF(VALUES(last_at) >= last_at, VALUES(last_value), last_value), "
+        "last_at = GREATEST(last_at, VALUES(last_at))"
+    )
+
+
+class RollupAccumulator:
+    """
+    Agrega em memória as amostras de um tipo de série por bucket de cada
+    resolução. `rows` esvazia o acumulado como upserts [(sql, params)], que se
+    fundem aos buckets já gravados; basta enviá-los de tempos em tempos.
+    """
+
+    def __init__(self, kind, resolutions=RESOLUTIONS):
+        self.kind = kind
+        self.sql = upsert_sql(kind)
+        self.resolutions = resolutions
+        self._buckets = {}
+
+    def add(self, series_id, value, timestamp, resolutions=None):
+        for resolution in resolutions or self.resolutions:
+            key = (series_id, resolution, bucket_start(timestamp, resolution))
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._buckets[key] = {
+                    'min_value': value, 'max_value': value, 'sum_value': value, 'count': 1,
+                    'first_value': value, 'first_at': timestamp, 'last_value': value, 'last_at': timestamp,
+                }
+                continue
+            bucket['min_value'] = min(bucket['min_value'], value)
+            bucket['max_value'] = max(bucket['max_value'], value)
+            bucket['sum_value'] += value
+            bucket['count'] += 1
+            if timestamp < bucket['first_at']:
+                bucket['first_value'], bucket['first_at'] = value, timestamp
+            if timestamp >= bucket['last_at']:
+                bucket['last_value'], bucket['last_at'] = value, timestamp
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def rows(self):
+        buckets, self._buckets = self._buckets, {}
+        return [
+            (self.sql, dict(aggregate, series_id=series_id, resolution=resolution, bucket=bucket))
+            for (series_id, resolution, bucket), aggregate in buckets.items()
+        ]
+
+
+def choose_resolution(requested):
+    """Maior resolução de agregado que não excede a pedida (s); None se só as amostras brutas servem."""
+    usable = [resolution for resolution in RESOLUTIONS if resolution <= requested]
+    return max(usable) if usable else None
+
+
+def load_series(connection, kind, series_id, start, end, resolution):
+    """
+    Série de `series_id` entre `start` e `end` com pontos espaçados de no
+    máximo `resolution` segundos, lida do agregado mais grosso que atende ou
+    das amostras brutas. Devolve dicts com bucket, min, max, avg, count, first e last.
+    """
+    series = SERIES[kind]
+    rollup = choose_resolution(resolution)
+    if rollup is None:
+        rows = connection.execute(text(series['series_raw_sql']), {'series_id': series_id, 'start': start, 'end': end})
+        return [
+            {'bucket': at, 'min': value, 'max': value, 'avg': value, 'count': 1, 'first': value, 'last': value}
+            for at, value in rows
+        ]
+
+    rows = connection.execute(text(
+        f"SELECT bucket, min_value, max_value, sum_value, count, first_value, last_value FROM {series['table']} "
+        f"WHERE {series['column']} = :series_id AND resolution = :resolution AND bucket >= :start AND bucket < :end "
+        "ORDER BY bucket"
+    ), {'series_id': series_id, 'resolution': rollup, 'start': bucket_start(start, rollup), 'end': end})
+    return [
+        {'bucket': bucket, 'min': min_value, 'max': max_value, 'avg': sum_value / count, 'count': count,
+         'first': first_value, 'last': last_value}
+        for bucket, min_value, max_value, sum_value, count, first_value, last_value in rows
+    ]
+
+
+def raw_count(connection, kind, series_id, start, end, limit):
+    """Amostras brutas de `series_id` no intervalo, contadas até `limit` (a leitura do índice para ali)."""
+    series = SERIES[kind]
+    return connection.execute(text(f"SELECT COUNT(*) FROM ({series['series_raw_sql']} LIMIT :limit) AS raw"),
+                              {'series_id': series_id, 'start': start, 'end': end, 'limit': limit}).scalar()
+
+
+def existing_buckets(connection, kind, series_id, start, end):
+    """Buckets de 1 hora e de 1 dia da série que já têm agregado entre `start` e `end`."""
+    series = SERIES[kind]
+    rows = connection.execute(text(
+        f"SELECT resolution, bucket FROM {series['table']} WHERE {series['column']} = :series_id "
+        "AND resolution IN (3600, 86400) AND bucket >= :start AND bucket < :end"
+    ), {'series_id': series_id, 'start': start, 'end': end})
+    return {(resolution, bucket) for resolution, bucket in rows}
+
+
+def backfill(engine, kind, since=None, until=None):
+    """
+    Preenche, a partir do histórico bruto, os buckets que ainda não têm
+    agregado; os mantidos pelo master nunca são alterados e rodar de novo não
+    conta nada duas vezes. A unidade é a hora: uma hora com qualquer agregado
+    fica como está (inclusive seus minutos), e o bucket diário só é criado para
+    dias sem agregado algum, sem somar as horas preenchidas aqui.
+
+    Desde a compressão (deadband/swinging door), o histórico bruto guarda só
+    os pontos que mudaram a série. Nos buckets reconstruídos, count é o número
+    de pontos gravados, não de leituras, e a média é a simples desses pontos,
+    puxada para os trechos com mais variação; min, max, first e last são exatos
+    a menos da tolerância da compressão. Por padrão vai até ontem, para não
+    disputar o dia corrente com o master.
+    """
+    series = SERIES[kind]
+    start = datetime.datetime.combine(since, datetime.time()) if since else datetime.datetime(1970, 1, 1)
+    last_day = until if until else datetime.date.today() - datetime.timedelta(days=1)
+    end = datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time())
+
+    samples = 0
+    with engine.connect() as reader:
+        series_ids = reader.execute(text(series['ids_sql'])).scalars().all()
+        for series_id in series_ids:
+            # Cada série percorre o índice (série, instante) da tabela bruta
+            existing = existing_buckets(reader, kind, series_id, start, end)
+            accumulator = RollupAccumulator(kind)
+            result = reader.execution_options(stream_results=True).execute(
+                text(series['series_raw_sql']), {'series_id': series_id, 'start': start, 'end': end})
+            for chunk in result.partitions(BACKFILL_CHUNK):
+                for timestamp, value in chunk:
+                    if (3600, bucket_start(timestamp, 3600)) in existing:
+                        continue
+                    if (86400, bucket_start(timestamp, 86400)) in existing:
+                        accumulator.add(series_id, float(value), timestamp, resolutions=(60, 3600))
+                    else:
+                        accumulator.add(series_id, float(value), timestamp)
+                samples += len(chunk)
+                flush_rows(engine, accumulator.rows())
+        log.info(f"Backfill de '{series['table']}': {samples} amostras lidas de {len(series_ids)} séries entre {start} e {end}.")
+    return samples
+
+
+def flush_rows(engine, rows):
+    """Grava os upserts de uma vez (executemany)."""
+    if not rows:
+        return
+    with engine.begin() as connection:
+        connection.execute(text(rows[0][0]), [params for _, params in rows])
+
+
+def main():
+    from app.services.db_engine import dispose_engines, get_engine
+    from config import SQLALCHEMY_DATABASE_URI as DB_URI
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Agregados de séries temporais (1 min, 1 h, 1 dia).")
+    parser.add_argument('--backfill', choices=list(SERIES) + ['all'], required=True,
+                        help="Séries cujos buckets sem agregado são preenchidos a partir do histórico. Agregados existentes "
+                             "não mudam; nos preenchidos, count e média vêm só dos pontos gravados pela compressão.")
+    parser.add_argument('--since', type=datetime.date.fromisoformat, help="Primeiro dia (AAAA-MM-DD); padrão: todo o histórico.")
+    parser.add_argument('--until', type=datetime.date.fromisoformat, help="Último dia (AAAA-MM-DD), inclusive; padrão: ontem.")
+    args = parser.parse_args()
+
+    engine = get_engine(DB_URI)
+    try:
+        kinds = list(SERIES) if args.backfill == 'all' else [args.backfill]
+        for kind in kinds:
+            samples = backfill(engine, kind, args.since, args.until)
+            log.info(f"Backfill de '{kind}' concluído: {samples} amostras.")
+    finally:
+        dispose_engines()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import logging
+from sqlalchemy import text
+
+log = logging.getLogger(__name__)
+
+# Linhas preenchidas por instrução no backfill de nivel.ts
+BACKFILL_BATCH = 10000
+
+# Índices das leituras por série e faixa de tempo e das listas paginadas: (tabela, nome, colunas)
+SERIES_INDEXES = (
+    ('nivel', 'ix_nivel_reservatorio_ts', ('reservatorio_id', 'ts')),
+    ('modbus_data', 'ix_modbus_data_register_timestamp', ('register_id', 'timestamp')),
+    ('modbus_rule_log', 'ix_modbus_rule_log_rule_timestamp', ('rule_id', 'timestamp')),
+    ('nivel', 'ix_nivel_ts', ('ts',)),
+    ('acionamento', 'ix_acionamento_mb_data_hora', ('mb_id', 'data', 'hora_lig')),
+    ('acionamento', 'ix_acionamento_data_hora', ('data', 'hora_lig')),
+)
+
+
+def column_exists(connection, table, column):
+    return connection.execute(text(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND COLUMN_NAME = :column"
+    ), {'table': table, 'column': column}).scalar() > 0
+
+
+def table_indexes(connection, table):
+    """Índices da tabela (exceto a chave primária): {nome: (colunas em ordem)}."""
+    rows = connection.execute(text(
+        "SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND INDEX_NAME <> 'PRIMARY' "
+        "ORDER BY INDEX_NAME, SEQ_IN_INDEX"
+    ), {'table': table})
+    indexes = {}
+    for name, column in rows:
+        indexes.setdefault(name, []).append(column)
+    return {name: tuple(columns) for name, columns in indexes.items()}
+
+
+def add_nivel_ts(connection):
+    """Cria nivel.ts (DATETIME(3)) e preenche, em lotes, a partir de data e hora."""
+    if not column_exists(connection, 'nivel', 'ts'):
+        log.info("Criando a coluna nivel.ts.")
+        connection.execute(text("ALTER TABLE nivel ADD COLUMN ts DATETIME(3) NULL AFTER hora"))
+        connection.commit()
+
+    filled = 0
+    while True:
+        count = connection.execute(text(
+            f"UPDATE nivel SET ts = TIMESTAMP(data, hora) WHERE ts IS NULL LIMIT {BACKFILL_BATCH}"
+        )).rowcount
+        connection.commit()
+        filled += count
+        if count < BACKFILL_BATCH:
+            break
+    log.info(f"nivel.ts preenchida em {filled} linhas.")
+    connection.execute(text("ALTER TABLE nivel MODIFY ts DATETIME(3) NOT NULL"))
+    connection.commit()
+
+
+def ensure_series_indexes(connection):
+    """
+    Cria os índices compostos (série, tempo) e remove os índices só da coluna da
+    série (deixados pelas antigas chaves estrangeiras), que passam a ser prefixo redundante.
+    """
+    for table, name, columns in SERIES_INDEXES:
+        indexes = table_indexes(connection, table)
+        if name not in indexes:
+            log.info(f"Criando o índice {name} em {table} {columns}.")
+            connection.execute(text(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"))
+        for redundant, indexed in indexes.items():
+            if len(columns) > 1 and indexed == columns[:1]:
+                log.info(f"Removendo o índice redundante {redundant} de {table}.")
+                connection.execute(text(f"DROP INDEX {redundant} ON {table}"))
+        connection.commit()
+
+
+def upgrade(engine):
+    with engine.connect() as connection:
+        add_nivel_ts(connection)
+        ensure_series_indexes(connection)
+
+
+def main():
+    from app.services.db_engine import dispose_engines, get_engine
+    from config import SQLALCHEMY_DATABASE_URI as DB_URI
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Migração de nivel.ts e dos índices (série, tempo) das tabelas de telemetria.")
+    parser.parse_args()
+
+    engine = get_engine(DB_URI)
+    try:
+        upgrade(engine)
+    finally:
+        dispose_engines()
+
+
+if __name__ == "__main__":
+    main()
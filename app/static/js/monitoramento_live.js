@@ -0,0 +1,47 @@
+// Dados ao vivo dos painéis de monitoramento: Server-Sent Events em /monitoramento/stream,
+// com volta ao polling (a cada 5 s) se o navegador não suportar SSE ou o canal cair.
+function conectarMonitoramento(urlStream, handlers, polling) {
+    const INTERVALO_POLLING = 5000;
+    // Sem nenhum evento (nem 'ping') nesse tempo, o canal é considerado perdido
+    const TEMPO_SEM_EVENTOS = 45000;
+    let pollingAtivo = false;
+    let vigia = null;
+
+    function iniciarPolling() {
+        if (pollingAtivo) return;
+        pollingAtivo = true;
+        polling();
+        setInterval(polling, INTERVALO_POLLING);
+    }
+
+    if (!window.EventSource) {
+        iniciarPolling();
+        return;
+    }
+
+    const source = new EventSource(urlStream);
+
+    function rearmarVigia() {
+        clearTimeout(vigia);
+        vigia = setTimeout(function() {
+            source.close();
+            iniciarPolling();
+        }, TEMPO_SEM_EVENTOS);
+    }
+
+    rearmarVigia();
+    source.addEventListener('ping', rearmarVigia);
+    Object.keys(handlers).forEach(function(evento) {
+        source.addEventListener(evento, function(e) {
+            rearmarVigia();
+            handlers[evento](JSON.parse(e.data));
+        });
+    });
+    source.onerror = function() {
+        // O EventSource reconecta sozinho; só desiste quando o servidor recusa o canal
+        if (source.readyState === EventSource.CLOSED) {
+            clearTimeout(vigia);
+            iniciarPolling();
+        }
+    };
+}
@@ -1,13 +1,42 @@
 from app import app, db
-from flask import render_template
+from flask import render_template, request, flash
 from ..models.acionamento_model import Acionamento
+from ..models.motobomba_model import Motobomba
+from ..services.keyset_pagination import fetch_page, decode_cursor, describe_count
+import datetime
+
+# Chave de ordenação das páginas (mais recentes primeiro), coberta pelos índices (data, hora_lig) e (mb_id, data, hora_lig)
+ORDEM_ACIONAMENTOS = (Acionamento.data, Acionamento.hora_lig, Acionamento.id)
 
 @app.route('/acionamentos')
 def list_acionamentos():
-    """Exibe uma lista paginada de todos os registros de acionamento."""
-    # Ordena para mostrar os acionamentos mais recentes primeiro
-    acionamentos = Acionamento.query.options(
-        db.joinedload(Acionamento.motobomba)
-    ).order_by(Acionamento.data.desc(), Acionamento.hora_lig.desc()).all()
-    
-    return render_template('lista_acionamentos.html', acionamentos=acionamentos)
+    """
+    Exibe os registros de acionamento, uma página por vez (paginação por
+    cursor, `?antes=`), com filtros por bomba (`motobomba`) e período (`inicio`, `fim`).
+    """
+    query = Acionamento.query
+    try:
+        motobomba_id = request.args.get('motobomba', type=int)
+        inicio = datetime.date.fromisoformat(request.args['inicio']) if request.args.get('inicio') else None
+        fim = datetime.date.fromisoformat(request.args['fim']) if request.args.get('fim') else None
+        cursor = decode_cursor(request.args['antes'], (datetime.date, datetime.time, int)) if request.args.get('antes') else None
+    except ValueError:
+        flash("Filtros inválidos: datas no formato AAAA-MM-DD.", "error")
+        motobomba_id = inicio = fim = cursor = None
+    if motobomba_id:
+        query = query.filter(Acionamento.mb_id == motobomba_id)
+    if inicio:
+        query = query.filter(Acionamento.data >= inicio)
+    if fim:
+        query = query.filter(Acionamento.data <= fim)
+    # Filtros preenchidos, repetidos nos links de paginação
+    filtros = {nome: valor for nome, valor in (('motobomba', motobomba_id), ('inicio', inicio), ('fim', fim)) if valor}
+
+    total = describe_count(db.session.connection(), Acionamento.__tablename__, query, bool(filtros))
+    acionamentos, proximo = fetch_page(
+        query.options(db.joinedload(Acionamento.motobomba), db.joinedload(Acionamento.situacao)),
+        ORDEM_ACIONAMENTOS, cursor)
+
+    return render_template('lista_acionamentos.html', acionamentos=acionamentos, proximo=proximo, total=total,
+                           filtros=filtros, primeira_pagina=cursor is None,
+                           motobombas=Motobomba.query.order_by(Motobomba.nome).all())
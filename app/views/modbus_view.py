@@ -1,6 +1,10 @@
 from app import app, db
 from flask import render_template, redirect, url_for, flash, request, jsonify
 from ..models.modbus_device_register_model import ModbusDevice, ModbusRegister, ModbusDeviceForm, ModbusRegisterForm, DeleteForm
+from ..models.config_version_model import bump_config_version
+from ..services.register_latest import load_latest
+from ..services.http_cache import conditional_json
+import json
  # Importar o novo modelo
 
 @app.route("/modbus/status")
@@ -20,29 +24,16 @@ def novo_dispositivo():
     form = ModbusDeviceForm()
 
     if form.validate_on_submit():
-        novo_slave = ModbusDevice(device_name=form.device_name.data, ip_address=form.ip_address.data, slave_id=form.slave_id.data, type=form.type.data, ativo=form.ativo.data)
+        novo_slave = ModbusDevice(device_name=form.device_name.data, ip_address=form.ip_address.data, slave_id=form.slave_id.data, type=form.type.data, ativo=form.ativo.data, poll_interval=form.poll_interval.data)
         db.session.add(novo_slave)
+        bump_config_version()
         db.session.commit() # Commit para obter o ID do novo escravo
 
         registradores_data = request.form.get('registradores_json')
         if registradores_data:
-            import json
-            registradores_list = json.loads(registradores_data)
-            tipo_to_fc_map = {'coil': 1, 'discrete_input': 2, 'holding_register': 3, 'input_register': 4}
-            rw_map = {'Read/Write': 'W', 'Read-Only': 'R'}
-
-            for reg_data in registradores_list:
-                new_register = ModbusRegister(
-                    device_id=novo_slave.id,
-                    name=reg_data.get('name'),
-                    function_code=tipo_to_fc_map.get(reg_data.get('tipo')),
-                    address=reg_data.get('endereco'),
-                    data_type=reg_data.get('data_type', 'int'),
-                    scale=float(reg_data.get('scale', 1.0)),
-                    rw=rw_map.get(reg_data.get('acesso'), 'R'),
-                    descricao=reg_data.get('descricao')
-                )
-                db.session.add(new_register)
+            for reg_data in json.loads(registradores_data):
+                db.session.add(ModbusRegister(device_id=novo_slave.id, **register_fields(reg_data)))
+            bump_config_version()
             db.session.commit()
 
         flash("Escravo Modbus criado com sucesso!", "success")
@@ -50,6 +41,53 @@ def novo_dispositivo():
 
     return render_template("novo_dispositivo.html", form=form)
 
+TIPO_TO_FC = {'coil': 1, 'discrete_input': 2, 'holding_register': 3, 'input_register': 4}
+RW_MAP = {'Read/Write': 'W', 'Read-Only': 'R'}
+
+
+def register_fields(reg_data):
+    """Atributos de ModbusRegister a partir de uma linha do editor de registradores."""
+    return {
+        'name': reg_data.get('name'),
+        'function_code': TIPO_TO_FC.get(reg_data.get('tipo')),
+        'address': reg_data.get('endereco'),
+        'data_type': reg_data.get('data_type', 'int'),
+        'scale': float(reg_data.get('scale', 1.0)),
+        'rw': RW_MAP.get(reg_data.get('acesso'), 'R'),
+        'descricao': reg_data.get('descricao'),
+        'poll_interval': float(reg_data['poll_interval']) if reg_data.get('poll_interval') else None,
+        'poll_priority': int(reg_data.get('poll_priority') or 0),
+        'deadband': float(reg_data['deadband']) if reg_data.get('deadband') not in (None, '') else None,
+        'deadband_percent': bool(reg_data.get('deadband_percent')),
+        'swinging_door': bool(reg_data.get('swinging_door')),
+        'heartbeat_interval': float(reg_data['heartbeat_interval']) if reg_data.get('heartbeat_interval') else None,
+    }
+
+
+def remove_registers(register_ids):
+    """
+    Remove os registradores e, na mesma transação, o que depende deles: ações,
+    vínculos de motobombas e reservatórios, último valor e agregados. Deve ser
+    confirmada junto com bump_config_version(), para o master deixar de ler esses ids.
+    """
+    if not register_ids:
+        return
+    from ..models.motobomba_model import Motobomba
+    from ..models.modbus_action_model import ModbusAction
+    from ..models.reservatorio_model import Reservatorio
+    from ..models.register_latest_model import RegisterLatest
+    from ..models.telemetry_rollup_model import ModbusDataRollup
+
+    ModbusAction.query.filter(ModbusAction.target_register_id.in_(register_ids)).delete(synchronize_session=False)
+    Motobomba.query.filter(Motobomba.actuator_register_id.in_(register_ids)).update(
+        {Motobomba.actuator_register_id: None}, synchronize_session=False)
+    Reservatorio.query.filter(Reservatorio.level_register_id.in_(register_ids)).update(
+        {Reservatorio.level_register_id: None}, synchronize_session=False)
+    RegisterLatest.query.filter(RegisterLatest.register_id.in_(register_ids)).delete(synchronize_session=False)
+    ModbusDataRollup.query.filter(ModbusDataRollup.register_id.in_(register_ids)).delete(synchronize_session=False)
+    ModbusRegister.query.filter(ModbusRegister.id.in_(register_ids)).delete(synchronize_session=False)
+
+
 @app.route("/modbus/atualiza/<int:id>", methods=["GET", "POST"])
 def atualiza_modbus(id):
     slave = ModbusDevice.query.get_or_404(id)
@@ -60,50 +98,26 @@ def atualiza_modbus(id):
         slave.slave_id = form.slave_id.data
         slave.type = form.type.data
         slave.ativo = form.ativo.data
+        slave.poll_interval = form.poll_interval.data
 
-        from ..models.motobomba_model import Motobomba
-        from ..models.modbus_action_model import ModbusAction
-        
-        # Get IDs of registers to be deleted
-        register_ids_to_delete = [reg.id for reg in ModbusRegister.query.filter_by(device_id=slave.id).with_entities(ModbusRegister.id)]
-
-        if register_ids_to_delete:
-            # Delete dependent ModbusActions
-            ModbusAction.query.filter(
-                ModbusAction.target_register_id.in_(register_ids_to_delete)
-            ).delete(synchronize_session=False)
-
-            # Unlink motobombas from these registers
-            Motobomba.query.filter(
-                Motobomba.actuator_register_id.in_(register_ids_to_delete)
-            ).update(
-                {Motobomba.actuator_register_id: None},
-                synchronize_session=False
-            )
-
-            # Now it's safe to delete the registers
-            ModbusRegister.query.filter_by(device_id=slave.id).delete(synchronize_session=False)
-        
         registradores_data = request.form.get('registradores_json')
-        if registradores_data:
-            import json
-            registradores_list = json.loads(registradores_data)
-            tipo_to_fc_map = {'coil': 1, 'discrete_input': 2, 'holding_register': 3, 'input_register': 4}
-            rw_map = {'Read/Write': 'W', 'Read-Only': 'R'}
-
-            for reg_data in registradores_list:
-                new_register = ModbusRegister(
-                    device_id=slave.id,
-                    name=reg_data.get('name'),
-                    function_code=tipo_to_fc_map.get(reg_data.get('tipo')),
-                    address=reg_data.get('endereco'),
-                    data_type=reg_data.get('data_type', 'int'),
-                    scale=float(reg_data.get('scale', 1.0)),
-                    rw=rw_map.get(reg_data.get('acesso'), 'R'),
-                    descricao=reg_data.get('descricao')
-                )
-                db.session.add(new_register)
-        
+        registradores_list = json.loads(registradores_data) if registradores_data else []
+
+        # Registradores existentes são atualizados no lugar (mantendo o id, o último valor, os
+        # agregados e as referências de regras); só os retirados da lista são removidos
+        existentes = {reg.id: reg for reg in ModbusRegister.query.filter_by(device_id=slave.id)}
+        mantidos = set()
+        for reg_data in registradores_list:
+            register = existentes.get(reg_data.get('id'))
+            if register is None:
+                db.session.add(ModbusRegister(device_id=slave.id, **register_fields(reg_data)))
+                continue
+            for campo, valor in register_fields(reg_data).items():
+                setattr(register, campo, valor)
+            mantidos.add(register.id)
+        remove_registers([register_id for register_id in existentes if register_id not in mantidos])
+
+        bump_config_version()
         db.session.commit()
         flash("Escravo Modbus atualizado com sucesso!", "success")
         return redirect(url_for("lista_modbus"))
@@ -124,6 +138,12 @@ def atualiza_modbus(id):
         'scale': reg.scale, # New field
         'rw': reg.rw.value, # acesso to rw
         'descricao': reg.descricao,
+        'poll_interval': reg.poll_interval,
+        'poll_priority': reg.poll_priority,
+        'deadband': reg.deadband,
+        'deadband_percent': reg.deadband_percent,
+        'swinging_door': reg.swinging_door,
+        'heartbeat_interval': reg.heartbeat_interval,
     } for reg in slave.registers]
     
     return render_template("atualiza_modbus.html", form=form, slave=slave, registradores_existentes=registradores_existentes)
@@ -165,11 +185,29 @@ def next_modbus_address():
 
     return jsonify({'next_address': next_address})
 
+@app.route("/modbus/api/valores")
+def valores_atuais():
+    """Valor atual dos registradores (register_latest); `?ids=1,2,3` restringe a consulta."""
+    ids = request.args.get('ids')
+    register_ids = None
+    if ids:
+        try:
+            register_ids = [int(register_id) for register_id in ids.split(',') if register_id]
+        except ValueError:
+            return jsonify({'error': 'Parâmetro ids deve ser uma lista de inteiros separados por vírgula'}), 400
+    latest = load_latest(db.session.connection(), register_ids)
+    # ETag do conteúdo: sem leituras novas o polling recebe 304
+    return conditional_json(json.dumps({
+        register_id: {'value': entry['value'], 'ts': entry['ts'].isoformat(), 'quality': entry['quality']}
+        for register_id, entry in latest.items()
+    }))
+
 
 @app.route("/modbus/exclui/<int:id>", methods=["POST"])
 def exclui_modbus(id):
     slave = ModbusDevice.query.get_or_404(id)
     db.session.delete(slave)
+    bump_config_version()
     db.session.commit()
     flash("Escravo Modbus excluído com sucesso!", "success")
     return redirect(url_for("lista_modbus"))
@@ -1,40 +1,29 @@
 from app import app, db
-from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask import render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context
 from ..models import reservatorio_model, motobomba_model, nivel_model, acionamento_model, situacao_model, alerta_config_model, motobomba_alerta_config_model # Importar motobomba_alerta_config_model
 from ..models.alerta_config_model import AlertaConfigForm, AlertaConfig
 from ..models.motobomba_alerta_config_model import MotobombaAlertaConfigForm, MotobombaAlertaConfig # Importar o formulário e o modelo de alerta de motobomba
-from sqlalchemy import desc # Importar desc para ordenação
+from ..services.telemetry_rollup import load_series
+from ..services.level_snapshot import snapshot_cache
+from ..services.live_feed import live_feed, load_pump_status, RETRY_MS
+from ..services.series_downsample import load_downsampled, DEFAULT_POINTS, MAX_POINTS
+from ..services.http_cache import conditional_json
 import datetime
+import json
+
+# Pontos no gráfico de histórico quando um período é escolhido; define a resolução dos agregados lidos
+MAX_PONTOS_GRAFICO = 200
+PERIODOS_HISTORICO = {24: '24 horas', 168: '7 dias', 720: '30 dias'}
+# Período padrão (h) de /api/series sem `from`
+PERIODO_SERIE_PADRAO = 24
 
 @app.route('/monitoramento/config/alertas')
 def configure_alertas_de_monitoramento():
     """
     Exibe um dashboard com o status geral dos reservatórios e motobombas.
     """
-    reservatorios = reservatorio_model.Reservatorio.query.all()
-
-    # Preparar dados dos reservatórios para o template
-    reservatorios_data = []
-    for res in reservatorios:
-        ultimo_nivel = nivel_model.Nivel.query.filter_by(reservatorio_id=res.id).order_by(desc(nivel_model.Nivel.data), desc(nivel_model.Nivel.hora)).first()
-        nivel_atual = ultimo_nivel.valor if ultimo_nivel else 0
-        porcentagem = (nivel_atual / res.capacidade_maxima) * 100 if res.capacidade_maxima > 0 else 0
-
-        # Define o status baseado em faixas fixas de porcentagem
-        if porcentagem <= 33:
-            status_alerta = "baixo"
-        elif porcentagem <= 66:
-            status_alerta = "normal"  # 'normal' é usado como 'médio' no sistema
-        else:
-            status_alerta = "alto"
-
-        reservatorios_data.append({
-            'id': res.id,
-            'nome': res.nome,
-            'nivel_atual': nivel_atual,
-            'porcentagem': round(porcentagem, 2),
-            'status_alerta': status_alerta
-        })
+    # Níveis e status de todos os reservatórios, do retrato compartilhado (uma consulta a cada poucos segundos)
+    reservatorios_data = snapshot_cache.levels(db.engine)
 
     motobombas = motobomba_model.Motobomba.query.all()
     # Lógica para obter os últimos níveis, status de acionamento, alertas, etc.
@@ -45,52 +34,98 @@ def configure_alertas_de_monitoramento():
 # Nova rota para requisições AJAX
 @app.route('/monitoramento/api/niveis_reservatorios')
 def get_niveis_reservatorios():
-    reservatorios = reservatorio_model.Reservatorio.query.all()
-    reservatorios_data = []
-    for res in reservatorios:
-        ultimo_nivel = nivel_model.Nivel.query.filter_by(reservatorio_id=res.id).order_by(desc(nivel_model.Nivel.data), desc(nivel_model.Nivel.hora)).first()
-        nivel_atual = ultimo_nivel.valor if ultimo_nivel else 0
-        porcentagem = (nivel_atual / res.capacidade_maxima) * 100 if res.capacidade_maxima > 0 else 0
-
-        # Define o status baseado em faixas fixas de porcentagem
-        if porcentagem <= 33:
-            status_alerta = "baixo"
-        elif porcentagem <= 66:
-            status_alerta = "normal"  # 'normal' é usado como 'médio' no sistema
-        else:
-            status_alerta = "alto"
-
-        # Mapeamento de status para dados visuais esperados pelo template
-        status_map = {
-            "normal": ("Médio", "bg-warning"),
-            "baixo": ("Baixo", "bg-danger"),
-            "alto": ("Alto", "bg-primary")
-        }
-        status_nivel, cor_barra = status_map.get(status_alerta, ("Desconhecido", "bg-secondary"))
-
-
-        reservatorios_data.append({
-            'id': res.id,
-            'nome': res.nome,
-            'nivel_atual': nivel_atual,
-            'porcentagem': round(porcentagem, 2),
-            'status_alerta': status_alerta,
-            'capacidade_maxima': res.capacidade_maxima,
-            'status_nivel': status_nivel,
-            'cor_barra': cor_barra
-        })
-    return jsonify(reservatorios_data)
+    """
+    Níveis, porcentagens e classificação de todos os reservatórios; o JSON é
+    montado uma vez por atualização do retrato. Com If-None-Match/If-Modified-Since
+    da versão atual, responde 304 sem corpo.
+    """
+    corpo, versao, modificado = snapshot_cache.versioned(db.engine)
+    return conditional_json(corpo, versao, modificado)
+
+@app.route('/monitoramento/stream')
+def monitoramento_stream():
+    """
+    Canal Server-Sent Events dos painéis: eventos 'nivel', 'motobomba' e
+    'alerta' com apenas o que mudou, de um único observador compartilhado por
+    todos os clientes. Os painéis voltam ao polling das APIs se o canal falhar
+    ou se o limite de canais do processo tiver sido atingido (503).
+    """
+    if not live_feed.accepting:
+        return Response(f"retry: {RETRY_MS}\n\n", status=503, mimetype='text/event-stream',
+                        headers={'Retry-After': str(RETRY_MS // 1000), 'Cache-Control': 'no-cache'})
+    return Response(stream_with_context(live_feed.stream(db.engine)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def parse_instante(valor):
+    """
+    Instante ISO 8601 na hora local sem fuso, como as colunas de tempo do banco;
+    com fuso (ex.: 'Z' de toISOString()) é convertido para a hora local.
+    """
+    instante = datetime.datetime.fromisoformat(valor)
+    if instante.tzinfo is not None:
+        instante = instante.astimezone().replace(tzinfo=None)
+    return instante
+
+
+@app.route('/api/series')
+def api_series():
+    """
+    Série de um registrador (`register_id`) ou reservatório (`reservatorio_id`)
+    entre `from` e `to` (ISO 8601; padrão: as últimas 24 h) com no máximo
+    `points` pontos escolhidos pelo LTTB, para qualquer período.
+    """
+    register_id = request.args.get('register_id', type=int)
+    reservatorio_id = request.args.get('reservatorio_id', type=int)
+    if (register_id is None) == (reservatorio_id is None):
+        return jsonify({'error': 'Informe register_id ou reservatorio_id'}), 400
+    kind, series_id = ('register', register_id) if register_id is not None else ('reservatorio', reservatorio_id)
+
+    try:
+        fim = parse_instante(request.args['to']) if 'to' in request.args else datetime.datetime.now()
+        inicio = parse_instante(request.args['from']) if 'from' in request.args else fim - datetime.timedelta(hours=PERIODO_SERIE_PADRAO)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros from e to devem estar no formato ISO 8601'}), 400
+    if inicio >= fim:
+        return jsonify({'error': 'from deve ser anterior a to'}), 400
+    points = min(max(request.args.get('points', DEFAULT_POINTS, type=int), 3), MAX_POINTS)
+
+    with db.engine.connect() as connection:
+        pontos = load_downsampled(connection, kind, series_id, inicio, fim, points)
+    return conditional_json(json.dumps({
+        'from': inicio.isoformat(),
+        'to': fim.isoformat(),
+        'points': [[instante.isoformat(), valor] for instante, valor in pontos],
+    }))
 
 
 @app.route('/monitoramento/reservatorio/<int:id>')
 def reservatorio_detalhes(id):
     """
-    Exibe detalhes e histórico de um reservatório específico.
+    Exibe detalhes e histórico de um reservatório específico. Com `?horas=N` o
+    histórico cobre as últimas N horas, lido dos agregados por minuto/hora/dia.
+    O gráfico busca o período (padrão: 24 h) já reduzido em /api/series.
     """
     reservatorio = reservatorio_model.Reservatorio.query.get_or_404(id)
-    niveis_historico_raw = nivel_model.Nivel.query.filter_by(reservatorio_id=id).order_by(nivel_model.Nivel.data.desc(), nivel_model.Nivel.hora.desc()).limit(100).all()
-
-    print(f"DEBUG: Níveis históricos para reservatório {id}: {niveis_historico_raw}") # LINHA DE DEBUG
+    horas = request.args.get('horas', type=int)
+    inicio_grafico = datetime.datetime.now() - datetime.timedelta(hours=horas if horas and horas > 0 else PERIODO_SERIE_PADRAO)
+    serie_url = url_for('api_series', reservatorio_id=id, points=DEFAULT_POINTS, **{'from': inicio_grafico.isoformat(timespec='seconds')})
+    if horas and horas > 0:
+        fim = datetime.datetime.now()
+        inicio = fim - datetime.timedelta(hours=horas)
+        pontos = load_series(db.session.connection(), 'reservatorio', id, inicio, fim, horas * 3600 / MAX_PONTOS_GRAFICO)
+        niveis_historico = [{
+            'valor': round(ponto['avg']),
+            'data': ponto['bucket'].strftime('%Y-%m-%d'),
+            'hora': ponto['bucket'].strftime('%H:%M:%S'),
+        } for ponto in reversed(pontos)]
+        return render_template('reservatorio_detalhes.html',
+                               reservatorio=reservatorio,
+                               niveis_historico=niveis_historico,
+                               horas=horas,
+                               serie_url=serie_url,
+                               periodos=PERIODOS_HISTORICO)
+
+    niveis_historico_raw = nivel_model.Nivel.query.filter_by(reservatorio_id=id).order_by(nivel_model.Nivel.ts.desc()).limit(100).all()
 
     # Formatar data e hora para o JavaScript
     niveis_historico = []
@@ -103,7 +138,10 @@ def reservatorio_detalhes(id):
 
     return render_template('reservatorio_detalhes.html', # Caminho corrigido
                            reservatorio=reservatorio,
-                           niveis_historico=niveis_historico)
+                           niveis_historico=niveis_historico,
+                           horas=None,
+                           serie_url=serie_url,
+                           periodos=PERIODOS_HISTORICO)
 
 @app.route('/monitoramento/motobomba/<int:id>')
 def motobomba_detalhes(id):
@@ -239,43 +277,14 @@ def monitoramento_motobombas():
 
 @app.route('/monitoramento/api/status_motobomba')
 def get_status_motobomba():
-    """Fornece o status atual da motobomba principal via JSON."""
+    """Fornece o status atual da motobomba principal via JSON (mesmo formato do evento 'motobomba' de /monitoramento/stream)."""
     try:
-        # Encontrar a motobomba principal
-        motobomba_principal = motobomba_model.Motobomba.query.filter_by(funcao='PRINCIPAL').first()
-        if not motobomba_principal:
+        with db.engine.connect() as connection:
+            status = load_pump_status(connection)
+        if status is None:
             return jsonify({'status': 'ERRO', 'texto_status': 'Bomba principal não configurada'}), 500
-
-        # Encontrar o último ciclo de acionamento para essa bomba
-        ultimo_acionamento = acionamento_model.Acionamento.query.filter_by(mb_id=motobomba_principal.id).order_by(desc(acionamento_model.Acionamento.data), desc(acionamento_model.Acionamento.hora_lig)).first()
-
-        runtime_str = '00:00:00'
-        if ultimo_acionamento and ultimo_acionamento.hora_des is None:
-            # Se o último ciclo não tem hora de desligar, a bomba está ligada
-            now = datetime.datetime.now()
-            start_datetime = datetime.datetime.combine(ultimo_acionamento.data, ultimo_acionamento.hora_lig)
-            runtime_delta = now - start_datetime
-            
-            hours, remainder = divmod(runtime_delta.total_seconds(), 3600)
-            minutes, seconds = divmod(remainder, 60)
-            runtime_str = f"{int(hours):02}:{int(minutes):02}:{int(seconds):02}"
-
-            return jsonify({
-                'status': 'LIGADA',
-                'texto_status': 'Sistema em operação',
-                'classe_css': 'status-on',
-                'potencia': motobomba_principal.potencia,
-                'runtime': runtime_str
-            })
-        else:
-            # Se não há ciclos ou o último ciclo foi finalizado, está desligada
-            return jsonify({
-                'status': 'DESLIGADA',
-                'texto_status': 'Sistema parado',
-                'classe_css': 'status-off',
-                'potencia': motobomba_principal.potencia,
-                'runtime': runtime_str
-            })
+        # Desligada, o status não muda entre as consultas e o polling recebe 304
+        return conditional_json(json.dumps(status))
 
     except Exception as e:
         # Em caso de erro, retorna um status de erro claro
@@ -1,9 +1,77 @@
 from app import app
 from app import db
-from flask import request, redirect, render_template, url_for
-from ..models import nivel_model
+from flask import request, redirect, render_template, url_for, Response, stream_with_context, jsonify, flash
+from ..models import nivel_model, reservatorio_model
+from ..services.history_export import SOURCES, stream_rows, iter_csv_gzip
+from ..services.keyset_pagination import fetch_page, decode_cursor, describe_count
+import datetime
+
+Nivel = nivel_model.Nivel
+# Chave de ordenação das páginas (mais recentes primeiro), coberta pelos índices (ts) e (reservatorio_id, ts)
+ORDEM_NIVEIS = (Nivel.ts, Nivel.id)
 
 
 @app.route('/lista_niveis')
 def levels_list():
-    return render_template("lista_niveis.html", niveis=nivel_model.Nivel.query.all())
\ No newline at end of file
+    """
+    Leituras de nível uma página por vez (paginação por cursor, `?antes=`),
+    com filtros por reservatório (`reservatorio`) e período (`inicio`, `fim`).
+    """
+    query = Nivel.query
+    try:
+        reservatorio_id = request.args.get('reservatorio', type=int)
+        inicio = datetime.date.fromisoformat(request.args['inicio']) if request.args.get('inicio') else None
+        fim = datetime.date.fromisoformat(request.args['fim']) if request.args.get('fim') else None
+        cursor = decode_cursor(request.args['antes'], (datetime.datetime, int)) if request.args.get('antes') else None
+    except ValueError:
+        flash("Filtros inválidos: datas no formato AAAA-MM-DD.", "error")
+        reservatorio_id = inicio = fim = cursor = None
+    if reservatorio_id:
+        query = query.filter(Nivel.reservatorio_id == reservatorio_id)
+    if inicio:
+        query = query.filter(Nivel.ts >= datetime.datetime.combine(inicio, datetime.time()))
+    if fim:
+        query = query.filter(Nivel.ts < datetime.datetime.combine(fim + datetime.timedelta(days=1), datetime.time()))
+    # Filtros preenchidos, repetidos nos links de paginação
+    filtros = {nome: valor for nome, valor in (('reservatorio', reservatorio_id), ('inicio', inicio), ('fim', fim)) if valor}
+
+    total = describe_count(db.session.connection(), Nivel.__tablename__, query, bool(filtros))
+    niveis, proximo = fetch_page(
+        query.options(db.joinedload(Nivel.reservatorio).joinedload(reservatorio_model.Reservatorio.tipos)),
+        ORDEM_NIVEIS, cursor)
+
+    return render_template("lista_niveis.html", niveis=niveis, proximo=proximo, total=total,
+                           filtros=filtros, primeira_pagina=cursor is None,
+                           reservatorios=reservatorio_model.Reservatorio.query.order_by(reservatorio_model.Reservatorio.nome).all())
+
+
+@app.route('/exportar/<tabela>')
+def exportar_historico(tabela):
+    """
+    Histórico de `tabela` (modbus_data, nivel ou acionamento) em CSV compactado,
+    gerado em streaming. Filtros: `inicio` e `fim` (ISO, fim exclusivo) e a
+    série (`register`, `reservatorio` ou `motobomba`, IDs separados por vírgula).
+    As linhas saem série por série (registrador ou reservatório), cada uma em
+    ordem de tempo; acionamentos em ordem de (data, hora_lig). Para exportações
+    longas com retomada, use `python -m app.services.history_export`.
+    """
+    if tabela not in SOURCES:
+        return jsonify({'error': f"Tabela deve ser uma de: {', '.join(SOURCES)}"}), 404
+    try:
+        inicio = datetime.datetime.fromisoformat(request.args['inicio']) if request.args.get('inicio') else None
+        fim = datetime.datetime.fromisoformat(request.args['fim']) if request.args.get('fim') else None
+        series = {
+            name: [int(series_id) for series_id in request.args[name].split(',') if series_id]
+            for name in SOURCES[tabela]['filters'] if request.args.get(name)
+        }
+    except ValueError:
+        return jsonify({'error': 'Parâmetros inválidos: datas em ISO (AAAA-MM-DDTHH:MM:SS) e IDs inteiros separados por vírgula'}), 400
+
+    def gerar():
+        with db.engine.connect() as connection:
+            rows = stream_rows(connection, tabela, start=inicio, end=fim, series=series)
+            yield from iter_csv_gzip(rows, SOURCES[tabela]['columns'])
+
+    nome = f"{tabela}_{inicio:%Y%m%d%H%M%S}.csv.gz" if inicio else f"{tabela}.csv.gz"
+    return Response(stream_with_context(gerar()), mimetype='application/gzip',
+                    headers={'Content-Disposition': f'attachment; filename="{nome}"'})
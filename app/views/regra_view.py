@@ -1,7 +1,8 @@
 from app import app, db
 from flask import render_template, redirect, url_for, request, flash, jsonify
-from ..models import ModbusRule, ModbusCondition, ModbusAction, ModbusRegister, Reservatorio, Motobomba
+from ..models import ModbusRule, ModbusCondition, ModbusAction, ModbusRegister, Reservatorio, Motobomba, ModbusRuleLog
 from ..models.regra_form import RegraForm
+from ..models.config_version_model import bump_config_version
 
 @app.route('/modbus_regras/lista')
 def lista_regras():
@@ -58,6 +59,7 @@ def criar_regra():
             )
             db.session.add(acao)
 
+        bump_config_version()
         db.session.commit()
         flash('Regra criada com sucesso!', 'success')
         return redirect(url_for('lista_regras'))
@@ -143,6 +145,7 @@ def editar_regra(id):
             )
             db.session.add(acao)
 
+        bump_config_version()
         db.session.commit()
         flash('Regra atualizada com sucesso!', 'success')
         return redirect(url_for('listar_regras'))
@@ -155,11 +158,24 @@ def excluir_regra(id):
     regra = ModbusRule.query.get_or_404(id)
     if request.method == 'POST':
         db.session.delete(regra)
+        bump_config_version()
         db.session.commit()
         flash('Regra excluída com sucesso!', 'success')
         return redirect(url_for('lista_regras'))
     return render_template('regra/confirma_exclusao.html', regra=regra)
 
+# Linhas exibidas no histórico de uma regra
+HISTORICO_LIMITE = 200
+
+@app.route('/modbus_regras/<int:id>/historico')
+def historico_regra(id):
+    """Transições (ou, com ?tipo=resumo, os resumos periódicos) mais recentes da regra."""
+    regra = ModbusRule.query.get_or_404(id)
+    tipo = 'resumo' if request.args.get('tipo') == 'resumo' else 'transicao'
+    registros = (ModbusRuleLog.query.filter_by(rule_id=id, kind=tipo)
+                 .order_by(ModbusRuleLog.timestamp.desc()).limit(HISTORICO_LIMITE).all())
+    return render_template('regra/historico.html', regra=regra, registros=registros, tipo=tipo)
+
 @app.route('/modbus_regras/api/opcoes_variavel')
 def opcoes_variavel():
     reservatorios = Reservatorio.query.all()
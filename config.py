@@ -9,5 +9,26 @@ SERVER = os.environ.get('DB_HOST', '127.0.0.1') # Host que você confirmou que f
 PORT = os.environ.get('DB_PORT', '3306')
 DB = os.environ.get('DB_NAME', 'mandacaia_db') # Nome do DB que você confirmou que funciona
 
-SQLALCHEMY_DATABASE_URI = f'mariadb+mariadbconnector://{USERNAME}:{PASSWORD}@{SERVER}:{PORT}/{DB}'
+# DATABASE_URL substitui a conexão montada acima (ex.: 'sqlite://' nos testes)
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', f'mariadb+mariadbconnector://{USERNAME}:{PASSWORD}@{SERVER}:{PORT}/{DB}')
 SQLALCHEMY_TRACK_MODIFICATIONS = True
+# Pool de conexões, usado pela aplicação web e pelos masters (app/services/db_engine.py).
+# pool_recycle fica abaixo do wait_timeout do MariaDB e pool_pre_ping descarta conexões mortas após um restart.
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+    'pool_timeout': 10,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,
+} if SQLALCHEMY_DATABASE_URI.startswith('mariadb') else {}
+
+# Retenção (dias) das séries temporais; None mantém para sempre.
+# Tabelas brutas perdem partições mensais inteiras; agregados por resolução (s) são apagados por bucket.
+RETENTION_DAYS = {
+    'modbus_data': int(os.environ.get('RETENTION_RAW_DAYS', 30)),
+    'nivel': int(os.environ.get('RETENTION_RAW_DAYS', 30)),
+    'modbus_rule_log': int(os.environ.get('RETENTION_RULE_LOG_DAYS', 90)),
+    'rollup_60': 90,
+    'rollup_3600': 730,
+    'rollup_86400': None,
+}
@@ -0,0 +1,24 @@
+import os
+import sys
+import pytest
+
+# Os testes não dependem do MariaDB: a aplicação é importada com um banco SQLite em memória
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# Tabelas particionadas têm chave primária composta com autoincremento, que o SQLite não aceita
+PARTITIONED_TABLES = {'modbus_data', 'nivel', 'modbus_rule_log'}
+
+
+@pytest.fixture
+def flask_app():
+    """Aplicação com as tabelas (exceto as particionadas) no SQLite em memória e sem CSRF nos formulários."""
+    from app import app, db
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        tables = [table for table in db.metadata.sorted_tables if table.name not in PARTITIONED_TABLES]
+        db.metadata.create_all(db.engine, tables=tables)
+        yield app
+        db.session.remove()
+        db.metadata.drop_all(db.engine, tables=tables)
@@ -0,0 +1,20 @@
+import datetime
+from app.views.monitoramento_view import parse_instante
+
+
+def test_offsets_are_converted_to_naive_local_time():
+    utc = datetime.datetime(2025, 1, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+    assert parse_instante('2025-01-01T12:00:00Z') == utc.astimezone().replace(tzinfo=None)
+    assert parse_instante('2025-01-01T12:00:00+00:00').tzinfo is None
+    assert parse_instante('2025-01-01T09:00:00') == datetime.datetime(2025, 1, 1, 9, 0)
+
+
+def test_offset_parameters_do_not_fail_the_request(flask_app):
+    client = flask_app.test_client()
+
+    response = client.get('/api/series?reservatorio_id=1&from=2025-01-01T00:00:00%2B00:00&to=2025-02-01T00:00:00Z')
+    assert response.status_code == 200
+    assert response.get_json()['points'] == []
+
+    assert client.get('/api/series?reservatorio_id=1&from=ontem').status_code == 400
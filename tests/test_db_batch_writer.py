@@ -0,0 +1,148 @@
+import pytest
+from sqlalchemy import create_engine, text
+from app.services import db_batch_writer
+from app.services.db_batch_writer import BatchWriter, is_transient
+
+INSERT = "INSERT INTO leitura (register_id, value) VALUES (:register_id, :value)"
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'telemetria.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE leitura (register_id INTEGER NOT NULL, value REAL NOT NULL CHECK (value >= 0))"))
+    yield engine
+    engine.dispose()
+
+
+def stored(engine):
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT register_id, value FROM leitura ORDER BY register_id")).all()
+
+
+def test_bad_row_is_rejected_and_the_rest_is_written(engine):
+    writer = BatchWriter(engine, name='teste')
+    batch = [(INSERT, {'register_id': i, 'value': -1.0 if i == 7 else float(i)}) for i in range(50)]
+
+    writer._flush(batch)
+
+    assert len(stored(engine)) == 49
+    assert (7, -1.0) not in stored(engine)
+    assert writer.written == 49
+    assert writer.rejected == 1
+    assert writer.dropped == 0
+
+
+def test_unavailable_database_is_retried_a_bounded_number_of_times(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_batch_writer, 'RETRY_DELAY_INITIAL', 0)
+    monkeypatch.setattr(db_batch_writer, 'RETRY_ATTEMPTS', 3)
+    engine = create_engine(f"sqlite:///{tmp_path / 'inexistente' / 'telemetria.db'}")
+    writer = BatchWriter(engine, name='teste')
+
+    writer._flush([(INSERT, {'register_id': 1, 'value': 1.0})])
+
+    assert writer.failures == 3
+    assert writer.dropped == 1
+    assert writer.written == 0
+
+
+def test_data_errors_are_not_transient(engine):
+    with pytest.raises(Exception) as integrity:
+        with engine.begin() as connection:
+            connection.execute(text(INSERT), {'register_id': 1, 'value': -1.0})
+    assert not is_transient(integrity.value)
+    assert not is_transient(ValueError("parâmetro inválido"))
+
+
+def test_writer_thread_flushes_on_stop(engine):
+    writer = BatchWriter(engine, name='teste', max_delay_ms=10000).start()
+    for i in range(10):
+        assert writer.submit(INSERT, {'register_id': i, 'value': float(i)})
+    writer.stop()
+
+    assert len(stored(engine)) == 10
+    assert writer.stats()['written'] == 10
+
+
+def spilling_writer(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(db_batch_writer, 'RETRY_DELAY_INITIAL', 0)
+    spill = db_batch_writer.SqliteSpill(str(tmp_path / 'spill' / 'teste.sqlite'))
+    writer = BatchWriter(engine, name='teste', spill=spill)
+    writer._retry_delay = 0
+    return writer, spill
+
+
+def test_bad_row_does_not_wedge_the_store_and_forward_path(engine, tmp_path, monkeypatch):
+    writer, spill = spilling_writer(engine, tmp_path, monkeypatch)
+    batch = [(INSERT, {'register_id': i, 'value': -1.0 if i == 0 else float(i)}) for i in range(50)]
+
+    writer._flush(batch)
+    writer._flush([(INSERT, {'register_id': 100, 'value': 1.0})])
+
+    assert writer.written == 50
+    assert writer.rejected == 1
+    assert writer.spilled == 0
+    assert spill.pending == 0
+    spill.close()
+
+
+def test_outage_is_spilled_and_replayed_in_order(engine, tmp_path, monkeypatch):
+    writer, spill = spilling_writer(engine, tmp_path, monkeypatch)
+    working_engine = writer.engine
+    writer.engine = create_engine(f"sqlite:///{tmp_path / 'inexistente' / 'telemetria.db'}")
+
+    writer._flush([(INSERT, {'register_id': 1, 'value': 1.0})])
+    writer._flush([(INSERT, {'register_id': 2, 'value': -1.0}), (INSERT, {'register_id': 3, 'value': 3.0})])
+    assert spill.pending == 3
+    assert writer.written == 0
+
+    writer.engine = working_engine
+    writer._replay_spill()
+
+    assert stored(engine) == [(1, 1.0), (3, 3.0)]
+    assert spill.pending == 0
+    assert writer.replayed == 2
+    assert writer.rejected == 1
+    spill.close()
+
+
+def test_spill_round_trips_dates(tmp_path):
+    import datetime
+    spill = db_batch_writer.SqliteSpill(str(tmp_path / 'teste.sqlite'))
+    at = datetime.datetime(2025, 3, 1, 12, 30, 15, 250000)
+    spill.put([(INSERT, {'timestamp': at, 'data': at.date(), 'hora': at.time(), 'value': 1.5})])
+
+    last_seq, rows = spill.peek(10)
+
+    assert rows == [(INSERT, {'timestamp': at, 'data': at.date(), 'hora': at.time(), 'value': 1.5})]
+    spill.ack(last_seq)
+    assert spill.pending == 0
+    spill.close()
+
+
+def test_overflow_is_spilled_by_the_writer_thread_in_arrival_order(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(db_batch_writer, 'RETRY_DELAY_INITIAL', 0)
+    spill = db_batch_writer.SqliteSpill(str(tmp_path / 'spill' / 'teste.sqlite'))
+    writer = BatchWriter(engine, name='teste', capacity=2, policy=db_batch_writer.SPILL, spill=spill)
+    writer._retry_delay = 0
+
+    def submit(i):
+        return writer.submit(INSERT, {'register_id': i, 'value': float(i)})
+
+    assert [submit(i) for i in range(3)] == [True] * 3
+    # A thread tira a linha 0 para o lote corrente; com transbordo pendente, a 3 não passa à frente dele na fila
+    current = [writer._queue.get_nowait()]
+    assert submit(3)
+    assert writer._queue.qsize() == 1 and writer.stats()['overflow'] == 2
+    assert not submit(4)
+    assert writer.dropped == 1
+    # Nada é gravado em disco na thread de quem submete
+    assert spill.pending == 0
+
+    writer._spill_overflow(current)
+
+    assert [params['register_id'] for _, params in spill.peek(10)[1]] == [0, 1, 2, 3]
+    assert writer.stats()['overflow'] == 0
+    writer._replay_spill()
+    assert stored(engine) == [(i, float(i)) for i in range(4)]
+    spill.close()
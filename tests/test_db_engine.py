@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import text
+
+from app.services.db_engine import dispose_engines, get_engine, session_scope, statement
+
+
+@pytest.fixture
+def uri(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'engine.db'}"
+    with get_engine(uri).begin() as connection:
+        connection.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY)"))
+    yield uri
+    dispose_engines()
+
+
+def count(uri):
+    with get_engine(uri).connect() as connection:
+        return connection.execute(text("SELECT COUNT(*) FROM item")).scalar()
+
+
+def test_one_engine_per_uri_and_cached_statements(uri):
+    assert get_engine(uri) is get_engine(uri)
+    assert statement("SELECT 1") is statement("SELECT 1")
+
+
+def test_session_scope_commits_or_rolls_back(uri):
+    with session_scope(uri) as session:
+        session.execute(statement("INSERT INTO item (id) VALUES (1)"))
+
+    with pytest.raises(RuntimeError):
+        with session_scope(uri) as session:
+            session.execute(statement("INSERT INTO item (id) VALUES (2)"))
+            raise RuntimeError("falha no ciclo")
+
+    assert count(uri) == 1
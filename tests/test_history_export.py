@@ -0,0 +1,75 @@
+import csv
+import datetime
+import gzip
+import io
+import os
+
+from sqlalchemy import create_engine, text
+
+from app.services.history_export import Exporter, build_query, iter_csv_gzip
+
+
+def test_build_query_seeks_on_the_indexed_key():
+    query, params = build_query('nivel', start=datetime.datetime(2025, 1, 1), series={'reservatorio': [1, 2]},
+                                after=(datetime.datetime(2025, 1, 2), 42), series_id=2)
+
+    sql = str(query)
+    # A série vem de series_id (uma varredura por série), não do IN
+    assert 'reservatorio_id = :series_id' in sql and 'IN' not in sql
+    assert 'ts >= :start' in sql
+    assert '((ts > :after0) OR (ts = :after0 AND id > :after1))' in sql
+    assert sql.endswith('ORDER BY ts, id')
+    assert (params['series_id'], params['after1']) == (2, 42)
+
+
+def test_acionamento_filters_and_orders_on_data_and_hora_lig():
+    query, params = build_query('acionamento', start=datetime.datetime(2025, 1, 1, 6), series={'motobomba': [3]},
+                                after=(datetime.date(2025, 1, 2), datetime.time(8), 7))
+
+    sql = str(query)
+    assert 'TIMESTAMP' not in sql
+    assert '((data > :start0) OR (data = :start0 AND hora_lig >= :start1))' in sql
+    assert '(data = :after0 AND hora_lig = :after1 AND id > :after2)' in sql
+    assert sql.endswith('ORDER BY data, hora_lig, id')
+    assert (params['start1'], params['motobomba0']) == (datetime.time(6), 3)
+
+
+def test_iter_csv_gzip_streams_a_valid_gzip_csv():
+    rows = [((row_id,), (row_id, datetime.datetime(2025, 1, 1, 0, row_id), row_id * 1.5)) for row_id in range(3)]
+
+    body = b''.join(iter_csv_gzip(rows, ('id', 'ts', 'valor')))
+
+    lines = list(csv.reader(io.StringIO(gzip.decompress(body).decode())))
+    assert lines[0] == ['id', 'ts', 'valor']
+    assert lines[2] == ['1', '2025-01-01T00:01:00', '1.5']
+
+
+def read_parts(directory):
+    rows = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.csv.gz'):
+            with gzip.open(os.path.join(directory, name), 'rt') as part:
+                rows += [int(line[0]) for line in list(csv.reader(part))[1:]]
+    return rows
+
+
+def test_export_reads_series_by_series_and_resumes_from_the_saved_progress(tmp_path):
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE modbus_data (id INTEGER PRIMARY KEY, register_id INTEGER, timestamp DATETIME, value FLOAT)"))
+        for row_id, register_id in ((1, 2), (2, 1), (3, 2)):
+            connection.execute(text("INSERT INTO modbus_data VALUES (:id, :register_id, :ts, 0)"),
+                               {'id': row_id, 'register_id': register_id, 'ts': f'2025-01-01 00:00:0{row_id}'})
+
+    with engine.connect() as connection:
+        assert Exporter('modbus_data', str(tmp_path), rows_per_file=2).run(connection) == 3
+
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO modbus_data VALUES (4, 2, '2025-01-01 00:00:05', 0)"))
+    with engine.connect() as connection:
+        assert Exporter('modbus_data', str(tmp_path), rows_per_file=2).run(connection) == 4
+
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith('.csv.gz')) == [
+        'modbus_data.part00001.csv.gz', 'modbus_data.part00002.csv.gz', 'modbus_data.part00003.csv.gz']
+    # Registrador 1, depois o 2; a retomada continua o registrador 2 após a linha 3
+    assert read_parts(tmp_path) == [2, 1, 3, 4]
@@ -0,0 +1,60 @@
+import gzip
+import os
+
+from app.services.http_cache import static_css, static_fingerprint
+
+CSS = (
+    '@font-face { src: url("fonts/icons.woff2?1234#iefix") format("woff2"), url(fonts/icons.woff); }\n'
+    '.a { background: url(\'data:image/svg+xml,%3csvg%3e\'); }\n'
+    '.b { background: url(/absolute.png) url(../outside.png) url(missing.png); }\n'
+)
+
+
+def make_static(tmp_path):
+    (tmp_path / 'css' / 'fonts').mkdir(parents=True)
+    (tmp_path / 'css' / 'style.css').write_text(CSS)
+    (tmp_path / 'css' / 'fonts' / 'icons.woff2').write_bytes(b'woff2')
+    (tmp_path / 'css' / 'fonts' / 'icons.woff').write_bytes(b'woff')
+    return str(tmp_path)
+
+
+def test_css_urls_get_the_fingerprint_of_the_referenced_file(tmp_path):
+    static_folder = make_static(tmp_path)
+    woff2 = static_fingerprint(static_folder, 'css/fonts/icons.woff2')
+    woff = static_fingerprint(static_folder, 'css/fonts/icons.woff')
+
+    body, _ = static_css(static_folder, 'css/style.css')
+
+    css = body.decode()
+    assert f'url("fonts/icons.woff2?1234&v={woff2}#iefix")' in css
+    assert f'url(fonts/icons.woff?v={woff})' in css
+    # Dados embutidos, caminhos absolutos, fora da pasta e inexistentes ficam como estão
+    assert "url('data:image/svg+xml,%3csvg%3e')" in css
+    assert 'url(/absolute.png) url(../outside.png) url(missing.png)' in css
+
+
+def test_css_fingerprint_follows_the_referenced_files(tmp_path):
+    static_folder = make_static(tmp_path)
+    before = static_fingerprint(static_folder, 'css/style.css')
+
+    font = tmp_path / 'css' / 'fonts' / 'icons.woff2'
+    font.write_bytes(b'woff2 v2')
+    os.utime(font, (1, 1))
+
+    assert static_fingerprint(static_folder, 'css/style.css') != before
+
+
+def test_fingerprinted_stylesheet_is_served_rewritten_and_immutable(flask_app):
+    client = flask_app.test_client()
+    with flask_app.test_request_context():
+        from flask import url_for
+        url = url_for('static', filename='icons/font/bootstrap-icons.css')
+    woff2 = static_fingerprint(flask_app.static_folder, 'icons/font/bootstrap-icons.woff2')
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert f'bootstrap-icons.woff2?v={woff2}' in gzip.decompress(response.data).decode()
+    assert client.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
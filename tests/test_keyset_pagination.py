@@ -0,0 +1,49 @@
+import datetime
+
+import pytest
+
+from app import db
+from app.models.acionamento_model import Acionamento
+from app.services.keyset_pagination import capped_count, decode_cursor, encode_cursor, fetch_page
+
+ORDEM = (Acionamento.data, Acionamento.hora_lig, Acionamento.id)
+TIPOS = (datetime.date, datetime.time, int)
+
+
+def test_cursor_round_trip():
+    values = (datetime.date(2025, 3, 1), datetime.time(14, 5, 30), 42)
+
+    cursor = encode_cursor(values)
+
+    assert cursor == '2025-03-01,14:05:30,42'
+    assert decode_cursor(cursor, TIPOS) == values
+
+
+@pytest.mark.parametrize('cursor', ['2025-03-01,42', 'ontem,14:05:30,42', '2025-03-01,14:05:30,x'])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, TIPOS)
+
+
+def test_pages_follow_the_key_without_gaps_or_repeats(flask_app):
+    dia = datetime.date(2025, 3, 1)
+    # Horários repetidos: o id desempata a ordem
+    for hora in (8, 9, 9, 10, 10, 10, 11):
+        db.session.add(Acionamento(None, None, None, data=dia, hora_lig=datetime.time(hora)))
+    db.session.add(Acionamento(None, None, None, data=dia - datetime.timedelta(days=1), hora_lig=datetime.time(23)))
+    db.session.commit()
+    expected = [row.id for row in Acionamento.query.order_by(*[column.desc() for column in ORDEM])]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, proximo = fetch_page(Acionamento.query, ORDEM, decode_cursor(cursor, TIPOS) if cursor else None, page_size=3)
+        seen += [row.id for row in rows]
+        pages += 1
+        if proximo is None:
+            break
+        cursor = proximo
+
+    assert seen == expected
+    assert pages == 3
+    assert capped_count(db.session.connection(), Acionamento.query, cap=5) == 6
+    assert capped_count(db.session.connection(), Acionamento.query.filter(Acionamento.data == dia), cap=10) == 7
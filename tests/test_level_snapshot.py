@@ -0,0 +1,56 @@
+import datetime
+
+import pytest
+from sqlalchemy import text
+
+from app import db
+from app.services.level_snapshot import LevelSnapshotCache, classify, load_levels
+
+
+def test_classify_boundaries():
+    assert classify(0) == ('baixo', 'Baixo', 'bg-danger')
+    assert classify(33) == ('baixo', 'Baixo', 'bg-danger')
+    assert classify(33.01)[0] == 'normal'
+    assert classify(66)[0] == 'normal'
+    assert classify(100)[0] == 'alto'
+
+
+def seed(connection):
+    connection.execute(text(
+        "INSERT INTO reservatorio (id, nome, descricao, capacidade_maxima, level_register_id) VALUES "
+        "(1, 'Superior', 'caixa', 1000, 10), (2, 'Inferior', 'cisterna', 2000, 20), (3, 'Reserva', 'sem leituras', 500, NULL)"))
+    connection.execute(text("INSERT INTO register_latest (register_id, value, ts, quality) VALUES "
+                            "(10, 75, :ts, 'good'), (20, 10, :ts, 'unavailable')"), {'ts': datetime.datetime(2026, 1, 1)})
+    connection.execute(text("INSERT INTO nivel VALUES (1, 2, '2026-01-01 00:00:00', 100), (2, 2, '2026-01-01 00:05:00', 500)"))
+
+
+@pytest.fixture
+def seeded(flask_app):
+    # A tabela nivel é particionada no MariaDB; aqui basta uma versão simples com as colunas usadas
+    with db.engine.begin() as connection:
+        connection.execute(text("CREATE TABLE nivel (id INTEGER, reservatorio_id INTEGER, ts DATETIME, valor INTEGER)"))
+        seed(connection)
+    yield db.engine
+    with db.engine.begin() as connection:
+        connection.execute(text("DROP TABLE nivel"))
+
+
+def test_levels_come_from_register_latest_or_the_last_nivel_row(seeded):
+    with seeded.connect() as connection:
+        levels = {level['id']: level for level in load_levels(connection)}
+
+    assert (levels[1]['nivel_atual'], levels[1]['porcentagem'], levels[1]['status_alerta']) == (750, 75.0, 'alto')
+    # Registrador sem leitura boa: usa a última linha de nivel
+    assert (levels[2]['nivel_atual'], levels[2]['porcentagem'], levels[2]['status_alerta']) == (500, 25.0, 'baixo')
+    assert levels[3]['nivel_atual'] == 0
+
+
+def test_cache_keeps_the_version_while_levels_do_not_change(seeded):
+    cache = LevelSnapshotCache(ttl=0)
+
+    body, version, modified = cache.versioned(seeded)
+    assert cache.versioned(seeded) == (body, version, modified)
+
+    with seeded.begin() as connection:
+        connection.execute(text("UPDATE register_latest SET value = 80 WHERE register_id = 10"))
+    assert cache.versioned(seeded)[1] != version
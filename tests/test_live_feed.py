@@ -0,0 +1,50 @@
+import json
+
+from app.services.live_feed import LiveFeed, alert_state, format_event
+
+
+def test_alert_state():
+    assert alert_state(10, (20, 90)) == 'inferior'
+    assert alert_state(95, (20, 90)) == 'superior'
+    assert alert_state(50, (20, 90)) is None
+    assert alert_state(50, None) is None
+
+
+def test_format_event():
+    text = format_event('nivel', [{'id': 1, 'porcentagem': 42.0}])
+
+    event, data, blank, end = text.split('\n')
+    assert event == 'event: nivel'
+    assert json.loads(data[len('data: '):]) == [{'id': 1, 'porcentagem': 42.0}]
+    assert (blank, end) == ('', '')
+
+
+def test_subscribers_are_capped():
+    feed = LiveFeed(interval=3600, max_subscribers=1)
+
+    first = feed.subscribe(None)
+
+    assert first is not None
+    assert not feed.accepting
+    assert feed.subscribe(None) is None
+    feed.unsubscribe(first)
+    assert feed.accepting
+
+
+def test_stream_ends_after_max_lifetime_and_frees_its_slot():
+    feed = LiveFeed(interval=3600, max_subscribers=1, max_lifetime=0.05)
+
+    chunks = list(feed.stream(None))
+
+    assert chunks == ['retry: 5000\n\n']
+    assert feed.accepting
+
+
+def test_stream_endpoint_answers_503_when_full(flask_app, monkeypatch):
+    from app.services.live_feed import live_feed
+    monkeypatch.setattr(live_feed, 'max_subscribers', 0)
+
+    response = flask_app.test_client().get('/monitoramento/stream')
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
@@ -0,0 +1,31 @@
+from collections import namedtuple
+
+import pytest
+
+from app.services.modbus_bus import BusKey, group_devices_by_bus, parse_transport
+
+Device = namedtuple('Device', 'nome ip_address')
+
+
+@pytest.mark.parametrize('ip_address,expected', [
+    (None, BusKey('serial', '/dev/ttyS1')),
+    ('  ', BusKey('serial', '/dev/ttyS1')),
+    ('/dev/ttyUSB0', BusKey('serial', '/dev/ttyUSB0')),
+    ('COM3', BusKey('serial', 'COM3')),
+    ('192.168.0.10', BusKey('tcp', '192.168.0.10', 502)),
+    ('192.168.0.10:5020', BusKey('tcp', '192.168.0.10', 5020)),
+    ('tcp://gateway:1502', BusKey('tcp', 'gateway', 1502)),
+])
+def test_parse_transport(ip_address, expected):
+    assert parse_transport(ip_address, '/dev/ttyS1') == expected
+
+
+def test_devices_on_the_same_bus_are_grouped():
+    devices = [Device('a', '10.0.0.1'), Device('b', None), Device('c', '10.0.0.1:502'), Device('d', '/dev/ttyS1')]
+
+    buses = group_devices_by_bus(devices, '/dev/ttyS1')
+
+    assert {key: [device.nome for device in grouped] for key, grouped in buses.items()} == {
+        BusKey('tcp', '10.0.0.1', 502): ['a', 'c'],
+        BusKey('serial', '/dev/ttyS1'): ['b', 'd'],
+    }
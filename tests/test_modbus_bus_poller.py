@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from pymodbus.exceptions import ModbusIOException
+
+from app.services.modbus_bus import BusKey, BusPoller, SerialSettings
+from app.services.modbus_health import FAILURE_THRESHOLD, DeviceUnavailable
+from app.services.modbus_read_planner import LinkTiming, PlannedRegister
+
+
+class _Response:
+    def __init__(self, registers):
+        self.registers = registers
+
+    def isError(self):
+        return False
+
+
+class FakeClient:
+    """Cliente assíncrono que registra as requisições e verifica que nunca há duas ao mesmo tempo."""
+
+    def __init__(self):
+        self.connected = True
+        self.active = 0
+        self.requests = []
+
+    async def connect(self):
+        return True
+
+    def close(self):
+        self.connected = False
+
+    async def read_holding_registers(self, address, count, device_id):
+        self.active += 1
+        assert self.active == 1, "duas requisições simultâneas no barramento"
+        self.requests.append(('read', address, count))
+        await asyncio.sleep(0.001)
+        self.active -= 1
+        return _Response(list(range(address, address + count)))
+
+
+def make_poller(received):
+    poller = BusPoller(BusKey('serial', '/dev/null'), SerialSettings(19200, 'N', 1, 8, 0.5), LinkTiming(19200), 0.05,
+                       lambda values, timestamp: received.append(values))
+    poller.create_client = FakeClient
+    return poller
+
+
+async def write_op(client, value):
+    client.requests.append(('write', value))
+    return value
+
+
+def test_poller_reads_on_schedule_and_serializes_submitted_requests():
+    received = []
+
+    async def scenario():
+        stop = asyncio.Event()
+        poller = make_poller(received)
+        task = asyncio.create_task(poller.run(stop))
+        poller.set_registers([PlannedRegister(1, 1, 3, 40001, 'int'), PlannedRegister(2, 1, 3, 40002, 'int')])
+        await asyncio.wait_for(poller.polled.wait(), 1)
+        results = await asyncio.gather(*(poller.submit(write_op, value, slave_id=1) for value in range(5)))
+        await asyncio.sleep(0.12)
+        stop.set()
+        await asyncio.wait_for(task, 1)
+        return poller, results
+
+    poller, results = asyncio.run(scenario())
+
+    assert results == list(range(5))
+    assert received[0] == {1: 0, 2: 1}
+    # Leituras periódicas continuaram entre as escritas, sempre em um único bloco
+    reads = [request for request in poller.client.requests if request[0] == 'read']
+    assert len(reads) >= 2 and set(reads) == {('read', 0, 2)}
+    assert not poller.client.connected
+
+
+def test_requests_to_an_open_circuit_fail_without_reaching_the_bus():
+    async def scenario():
+        stop = asyncio.Event()
+        poller = make_poller([])
+        task = asyncio.create_task(poller.run(stop))
+        health = poller.health_for(1)
+        for _ in range(FAILURE_THRESHOLD):
+            health.record_failure(asyncio.get_running_loop().time())
+        try:
+            with pytest.raises(DeviceUnavailable):
+                await poller.submit(write_op, 1, slave_id=1)
+            return poller.client.requests
+        finally:
+            stop.set()
+            poller.queue.put_nowait(None)
+            await asyncio.wait_for(task, 1)
+
+    assert asyncio.run(scenario()) == []
+
+
+@pytest.mark.parametrize('kind, quiet', [('serial', True), ('tcp', False)])
+def test_serial_line_stays_quiet_after_a_client_side_timeout(kind, quiet):
+    poller = BusPoller(BusKey(kind, 'bus', 502), SerialSettings(19200, 'N', 1, 8, 0.05), LinkTiming(19200), 1.0, None)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        with pytest.raises(ModbusIOException):
+            await poller._guarded(1, 0.01, asyncio.sleep(1))
+        return loop.time() - start
+
+    elapsed = asyncio.run(scenario())
+
+    # Timeout de 0.05s e, no RTU, mais 0.05s de linha ociosa para a resposta atrasada ser descartada
+    assert (elapsed >= 0.1) == quiet
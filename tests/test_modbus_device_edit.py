@@ -0,0 +1,42 @@
+import datetime
+import json
+from app import db
+from app.models.modbus_device_register_model import ModbusDevice, ModbusRegister, DeviceType
+from app.models.register_latest_model import RegisterLatest
+
+
+def editor_row(register=None, **overrides):
+    row = {'name': 'nivel', 'tipo': 'holding_register', 'endereco': 40001, 'acesso': 'Read/Write', 'data_type': 'int16'}
+    if register is not None:
+        row.update(id=register.id, name=register.name, endereco=register.address)
+    row.update(overrides)
+    return row
+
+
+def test_saving_a_device_keeps_register_ids_and_removes_only_dropped_ones(flask_app):
+    device = ModbusDevice('CLP', '/dev/ttyUSB0', 1, DeviceType.RESERVATORIO)
+    db.session.add(device)
+    db.session.flush()
+    kept = ModbusRegister(device.id, 'nivel', 3, 40001, 'int16', 1.0, 'W')
+    dropped = ModbusRegister(device.id, 'vazao', 3, 40002, 'int16', 1.0, 'R')
+    db.session.add_all([kept, dropped])
+    db.session.flush()
+    now = datetime.datetime.now()
+    db.session.add_all([RegisterLatest(register_id=kept.id, value=1.0, ts=now), RegisterLatest(register_id=dropped.id, value=2.0, ts=now)])
+    db.session.commit()
+    kept_id, dropped_id = kept.id, dropped.id
+
+    rows = [editor_row(kept, descricao='nível do reservatório'), editor_row(name='pressao', endereco=40003)]
+    response = flask_app.test_client().post(f'/modbus/atualiza/{device.id}', data={
+        'device_name': 'CLP', 'ip_address': '/dev/ttyUSB0', 'slave_id': 1, 'type': 'reservatorio', 'ativo': 'y',
+        'registradores_json': json.dumps(rows),
+    })
+
+    assert response.status_code == 302
+    db.session.expire_all()
+    registers = {register.name: register for register in ModbusRegister.query.filter_by(device_id=device.id)}
+    assert set(registers) == {'nivel', 'pressao'}
+    assert registers['nivel'].id == kept_id
+    assert registers['nivel'].descricao == 'nível do reservatório'
+    assert db.session.get(RegisterLatest, kept_id) is not None
+    assert db.session.get(RegisterLatest, dropped_id) is None
@@ -0,0 +1,90 @@
+import pytest
+
+from app.services.modbus_health import (
+    BACKOFF_INITIAL, CLOSED, FAILURE_THRESHOLD, HALF_OPEN, MIN_SLACK, OPEN, RTU_MIN_SLACK, DeviceHealth,
+)
+
+
+def opened(now=0.0):
+    health = DeviceHealth('1@rtu', max_timeout=1.0)
+    for _ in range(FAILURE_THRESHOLD):
+        health.record_failure(now)
+    return health
+
+
+def test_circuit_opens_after_consecutive_failures():
+    health = DeviceHealth('1@rtu', max_timeout=1.0)
+    for _ in range(FAILURE_THRESHOLD - 1):
+        health.record_failure(0.0)
+    assert health.state == CLOSED
+
+    health.record_failure(0.0)
+
+    assert health.state == OPEN
+    assert not health.allow(BACKOFF_INITIAL - 0.1)
+    assert health.blocked(BACKOFF_INITIAL - 0.1)
+
+
+def test_single_probe_after_backoff_and_doubling_on_failure():
+    health = opened()
+
+    assert health.allow(BACKOFF_INITIAL)
+    assert health.state == HALF_OPEN
+    # Enquanto a sondagem não volta, nenhuma outra requisição passa
+    assert not health.allow(BACKOFF_INITIAL)
+
+    health.record_failure(BACKOFF_INITIAL)
+
+    assert health.state == OPEN
+    assert health.retry_at == BACKOFF_INITIAL + 2 * BACKOFF_INITIAL
+
+
+def test_successful_probe_closes_and_resets_the_backoff():
+    health = opened()
+    health.allow(BACKOFF_INITIAL)
+    health.record_failure(BACKOFF_INITIAL)
+    health.allow(health.retry_at)
+
+    health.record_success(0.02, 0.01, health.retry_at)
+
+    assert health.state == CLOSED
+    assert (health.failures, health.backoff, health.retry_at) == (0, BACKOFF_INITIAL, None)
+
+
+def test_timeout_adapts_to_the_measured_slack():
+    health = DeviceHealth('1@rtu', max_timeout=1.0)
+    assert health.timeout(0.02) == 1.0
+
+    for _ in range(20):
+        health.record_success(0.03, 0.02, 0.0)
+
+    assert health.timeout(0.02) == pytest.approx(0.02 + MIN_SLACK)
+    assert health.timeout(5.0) == 1.0
+
+
+def test_rtu_timeout_keeps_a_wide_floor_above_the_expected_time():
+    health = DeviceHealth('1@rtu', max_timeout=1.0, min_slack=RTU_MIN_SLACK)
+
+    for _ in range(20):
+        health.record_success(0.021, 0.02, 0.0)
+
+    assert health.timeout(0.02) == pytest.approx(0.02 + RTU_MIN_SLACK)
+
+
+def test_liveness_comes_from_normal_requests():
+    health = DeviceHealth('1@rtu', max_timeout=1.0)
+    assert health.status is None
+    assert health.idle_for(10.0) == float('inf')
+
+    health.record_success(0.05, 0.01, now=10.0)
+
+    assert health.status == 'Online'
+    assert health.last_seen is not None
+    assert health.rtt_ms == pytest.approx(50.0)
+    assert health.idle_for(25.0) == 15.0
+
+    for _ in range(FAILURE_THRESHOLD):
+        health.record_failure(30.0)
+
+    assert health.status == 'Offline'
+    assert health.idle_for(31.0) == 1.0
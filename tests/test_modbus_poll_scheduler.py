@@ -0,0 +1,68 @@
+import logging
+
+from app.services.modbus_bus import BusPoller
+from app.services.modbus_poll_scheduler import PollScheduler
+from app.services.modbus_read_planner import PlannedRegister
+
+
+def register(id, interval=None, priority=0):
+    return PlannedRegister(id, 1, 3, 40001 + id, 'int', name=f'r{id}', poll_interval=interval, poll_priority=priority)
+
+
+def test_due_entries_come_in_priority_order_and_keep_their_cadence():
+    scheduler = PollScheduler(default_interval=10)
+    scheduler.set_registers([register(1), register(2, interval=1, priority=5)], now=0)
+
+    due = scheduler.pop_due(0)
+    assert [entry.register.id for entry in due] == [2, 1]
+
+    scheduler.complete(due, now=0.2)
+    assert scheduler.next_due() == 1
+    assert [entry.register.id for entry in scheduler.pop_due(1)] == [2]
+
+
+def test_late_reads_count_as_missed_deadlines():
+    scheduler = PollScheduler(default_interval=10)
+    scheduler.set_registers([register(1, interval=2), register(2, interval=10)], now=0)
+
+    scheduler.complete(scheduler.pop_due(0), now=3)
+
+    assert scheduler.missed_deadlines() == {1: 1}
+    # Não tenta recuperar os ciclos perdidos em rajada
+    assert scheduler.entry(1).due == 5
+
+
+def test_deferred_entries_do_not_count_as_missed():
+    scheduler = PollScheduler(default_interval=1)
+    scheduler.set_registers([register(1)], now=0)
+
+    scheduler.defer(scheduler.pop_due(0), now=30)
+
+    assert scheduler.missed_deadlines() == {}
+    assert scheduler.next_due() == 31
+
+
+def test_rescheduling_keeps_existing_due_times():
+    scheduler = PollScheduler(default_interval=10)
+    scheduler.set_registers([register(1)], now=0)
+    scheduler.complete(scheduler.pop_due(0), now=0)
+
+    scheduler.set_registers([register(1), register(2)], now=4)
+
+    assert scheduler.entry(1).due == 10
+    assert scheduler.entry(2).due == 4
+    assert [entry.register.id for entry in scheduler.pop_due(4)] == [2]
+
+
+def test_missed_deadlines_are_reported_once_per_status_pass(caplog):
+    poller = BusPoller('rtu:/dev/ttyUSB0', None, None, 1, None)
+    poller.scheduler.set_registers([register(1)], now=0)
+    poller.scheduler.complete(poller.scheduler.pop_due(0), now=5)
+
+    with caplog.at_level(logging.WARNING):
+        poller.report_missed_deadlines()
+        poller.report_missed_deadlines()
+
+    warnings = [record.getMessage() for record in caplog.records if 'prazo' in record.getMessage()]
+    assert len(warnings) == 1
+    assert 'r1 (1)' in warnings[0]
@@ -0,0 +1,79 @@
+import asyncio
+
+from app.services.modbus_read_planner import (
+    LinkTiming, PlannedRegister, absorb_covered, decode_words, plan_read_blocks, read_registers_async,
+)
+
+TIMING = LinkTiming(9600)
+
+
+def holding(id, address, data_type='int', slave_id=1):
+    return PlannedRegister(id, slave_id, 3, address, data_type)
+
+
+def test_small_gaps_are_read_in_one_block():
+    blocks = plan_read_blocks([holding(1, 40001), holding(2, 40003), holding(3, 40004, 'float32')], TIMING)
+
+    block, = blocks
+    assert (block.start, block.count) == (0, 5)
+    assert block.has_gaps
+
+
+def test_distant_registers_and_other_slaves_get_separate_blocks():
+    blocks = plan_read_blocks([holding(1, 40001), holding(2, 40101), holding(3, 40001, slave_id=2)], TIMING)
+
+    assert [(block.slave_id, block.start, block.count) for block in blocks] == [(1, 0, 1), (1, 100, 1), (2, 0, 1)]
+
+
+def test_blocks_respect_the_protocol_limit():
+    registers = [holding(i, 40001 + i) for i in range(200)]
+
+    blocks = plan_read_blocks(registers, TIMING)
+
+    assert all(block.count <= 125 for block in blocks)
+    assert sum(len(block.members) for block in blocks) == 200
+
+
+def test_absorb_covered_adds_registers_inside_a_block():
+    blocks = plan_read_blocks([holding(1, 40001), holding(2, 40005)], TIMING)
+
+    absorbed = absorb_covered(blocks, [holding(3, 40003), holding(4, 40200)])
+
+    assert [reg.id for reg in absorbed] == [3]
+
+
+def test_decode_words():
+    assert decode_words('int', [7]) == 7
+    assert decode_words('int32', [1, 2]) == 65538
+    assert decode_words('float32', [0x3FC0, 0x0000]) == 1.5
+
+
+class _Response:
+    def __init__(self, registers=None, error=False):
+        self.registers = registers
+        self._error = error
+
+    def isError(self):
+        return self._error
+
+
+class _GappyClient:
+    """Escravo que rejeita leituras cobrindo o endereço 1 (inexistente)."""
+
+    def __init__(self):
+        self.requests = []
+
+    async def read_holding_registers(self, address, count, device_id):
+        self.requests.append((address, count))
+        if address <= 1 < address + count:
+            return _Response(error=True)
+        return _Response(list(range(address, address + count)))
+
+
+def test_rejected_block_with_gaps_is_read_register_by_register():
+    client = _GappyClient()
+
+    values = asyncio.run(read_registers_async(client, [holding(1, 40001), holding(2, 40003)], TIMING))
+
+    assert values == {1: 0, 2: 2}
+    assert client.requests == [(0, 3), (0, 1), (2, 1)]
@@ -0,0 +1,108 @@
+import datetime
+
+from app import db
+from app.models.config_version_model import ConfigVersion, bump_config_version
+from app.models.modbus_action_model import ModbusAction
+from app.models.modbus_condition_model import ConditionOperator, ModbusCondition
+from app.models.modbus_device_register_model import DeviceType, ModbusDevice, ModbusRegister
+from app.models.modbus_rule_model import ModbusRule
+from app.services.modbus_read_planner import PlannedRegister
+from app.services.modbus_rule_set import (
+    FALSE, INDETERMINATE, TRUE, CompiledCondition, CompiledRule, RuleEvaluator, RuleSet, compile_rule_set,
+)
+from app.services.modbus_snapshot import RegisterSnapshot
+
+T0 = datetime.datetime(2026, 1, 1)
+
+
+def make_register(id, device, name, function_code, address, data_type='int16'):
+    register = ModbusRegister(device.id, name, function_code, address, data_type, 1.0, 'W')
+    register.id = id
+    register.device = device
+    return register
+
+
+def test_compile_resolves_conditions_encodes_actions_and_indexes_dependents():
+    device = ModbusDevice('CLP', '192.168.0.10', 1, DeviceType.RESERVATORIO, ativo=False, poll_interval=2.0)
+    level = make_register(1, device, 'nivel', 3, 40001)
+    setpoint = make_register(2, device, 'setpoint', 3, 40002, 'float32')
+    status = make_register(3, device, 'status', 4, 30001)
+    registers = {register.id: register for register in (level, setpoint, status)}
+
+    valid = ModbusRule(id=10, name='nivel baixo', priority=2, stop_on_trigger=False)
+    valid.conditions = [ModbusCondition(name='nivel < 30', left_register_id=1, operator=ConditionOperator.LT, right_value=30)]
+    valid.actions = [ModbusAction(name='setpoint', target_register_id=2, write_value=12.5),
+                     ModbusAction(name='status', target_register_id=3, write_value=1)]
+    broken = ModbusRule(id=11, name='sem registrador', priority=1, stop_on_trigger=False)
+    broken.conditions = [ModbusCondition(name='inexistente', left_register_id=99, operator=ConditionOperator.GT, right_value=0)]
+    broken.actions = []
+
+    rule_set = compile_rule_set(7, [valid, broken], registers)
+
+    assert rule_set.version == 7
+    # Condição sem registrador descarta a regra; ação em input register é ignorada
+    rule, = rule_set.rules
+    assert rule.id == 10
+    write, = rule.actions
+    assert (write.register.id, write.value, len(write.words)) == (2, 12.5, 2)
+    assert rule_set.dependents == {1: {10}}
+    assert [register.id for register in rule_set.condition_registers] == [1]
+    assert rule_set.addresses[1] == '192.168.0.10'
+    assert rule_set.inactive == {1, 2, 3}
+    assert rule_set.registers[1].poll_interval == 2.0
+
+
+def test_bump_config_version_increments_the_counter(flask_app):
+    bump_config_version()
+    db.session.commit()
+    bump_config_version()
+    db.session.commit()
+
+    assert db.session.get(ConfigVersion, 1).version == 2
+
+
+def evaluator_fixture(epsilon=0.0, recheck_interval=60):
+    level = PlannedRegister(1, 1, 3, 40001, 'int', name='nivel')
+    pressure = PlannedRegister(2, 1, 3, 40002, 'int', name='pressao')
+    rules = [
+        CompiledRule(1, 'nivel baixo', 2, False, [CompiledCondition('nivel < 30', level, '<', 30)], []),
+        CompiledRule(2, 'pressao alta', 1, False, [CompiledCondition('pressao > 5', pressure, '>', 5)], []),
+    ]
+    rule_set = RuleSet(1, rules, {1: level, 2: pressure}, {1: 'a', 2: 'a'}, [])
+    return RuleEvaluator(rule_set, epsilon=epsilon, recheck_interval=recheck_interval)
+
+
+def snapshot(values, seconds, unavailable=()):
+    return RegisterSnapshot(values, T0 + datetime.timedelta(seconds=seconds), requested=[1, 2], unavailable=unavailable)
+
+
+def test_only_rules_depending_on_changed_registers_are_reevaluated():
+    evaluator = evaluator_fixture(epsilon=0.5)
+
+    triggered, _ = evaluator.evaluate(snapshot({1: 10, 2: 1}, 0))
+    assert evaluator.evaluated == {1, 2}
+    assert [rule.id for rule in triggered] == [1]
+
+    evaluator.evaluate(snapshot({1: 10.4, 2: 9}, 1))
+    # Variação do nível abaixo do epsilon: só a regra da pressão é reavaliada
+    assert evaluator.evaluated == {2}
+    assert evaluator.results == {1: TRUE, 2: TRUE}
+
+    evaluator.evaluate(snapshot({1: 10.4, 2: 9}, 2))
+    assert evaluator.evaluated == frozenset()
+
+
+def test_periodic_recheck_and_unavailable_inputs():
+    evaluator = evaluator_fixture(recheck_interval=60)
+    evaluator.evaluate(snapshot({1: 50, 2: 1}, 0))
+
+    evaluator.evaluate(snapshot({1: 50, 2: 1}, 61))
+    assert evaluator.evaluated == {1, 2}
+
+    _, indeterminate = evaluator.evaluate(snapshot({2: 1}, 62, unavailable=[1]))
+    assert evaluator.evaluated == {1}
+    assert evaluator.results[1] == INDETERMINATE
+    assert [rule.id for rule in indeterminate] == [1]
+
+    evaluator.evaluate(snapshot({2: 1}, 63))
+    assert evaluator.results[1] == FALSE
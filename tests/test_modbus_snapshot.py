@@ -0,0 +1,30 @@
+import datetime
+
+from app.services.modbus_snapshot import snapshot_from_latest
+
+NOW = datetime.datetime(2026, 1, 1, 12, 0, 0)
+
+
+def ago(seconds):
+    return NOW - datetime.timedelta(seconds=seconds)
+
+
+def test_snapshot_freezes_fresh_values_only():
+    latest = {1: (10, ago(1)), 2: (20, ago(30)), 3: (30, ago(1))}
+
+    snapshot = snapshot_from_latest(latest, [1, 2, 3, 4], {1: 5, 2: 10, 3: 5, 4: 5}, now=NOW, unavailable=[3])
+
+    assert dict(snapshot.values) == {1: 10}
+    assert snapshot.failed == {2, 3, 4}
+    assert snapshot.unavailable == {3}
+    assert snapshot.timestamp == NOW
+
+
+def test_snapshot_is_isolated_from_later_updates():
+    latest = {1: (10, ago(1))}
+    snapshot = snapshot_from_latest(latest, [1], 5, now=NOW)
+
+    latest[1] = (99, NOW)
+
+    assert snapshot.get(1) == 10
+    assert 1 in snapshot and len(snapshot) == 1
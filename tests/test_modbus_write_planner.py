@@ -0,0 +1,53 @@
+import pytest
+
+from app.services.modbus_read_planner import PlannedRegister, decode_words
+from app.services.modbus_write_planner import PlannedWrite, encode_words, plan_write_blocks
+
+
+def holding(id, address, data_type='int16', slave_id=1):
+    return PlannedRegister(id, slave_id, 3, address, data_type)
+
+
+def write(register, value):
+    return PlannedWrite(register, value, words=encode_words(register.data_type, value))
+
+
+@pytest.mark.parametrize('data_type,value', [('int16', 1234), ('int32', 70000), ('float32', 12.5)])
+def test_encode_words_is_the_inverse_of_decode_words(data_type, value):
+    assert decode_words(data_type, encode_words(data_type, value)) == value
+
+
+def test_adjacent_holding_writes_are_coalesced_into_one_fc16():
+    writes = [write(holding(2, 40002, 'float32'), 1.5), write(holding(1, 40001), 7), write(holding(3, 40004), 9)]
+
+    block, = plan_write_blocks(writes)
+
+    assert (block.function_code, block.start, block.count) == (3, 0, 4)
+    assert [member.register.id for member in block.members] == [1, 2, 3]
+    assert block.words[0] == 7 and block.words[-1] == 9
+
+
+def test_gaps_slaves_and_coils_get_their_own_requests():
+    coil = PlannedRegister(4, 1, 1, 1, 'bool')
+    writes = [write(holding(1, 40001), 1), write(holding(2, 40003), 2), write(holding(3, 40002, slave_id=2), 3),
+              PlannedWrite(coil, True)]
+
+    blocks = plan_write_blocks(writes)
+
+    assert sorted((block.slave_id, block.function_code, block.start) for block in blocks) == [
+        (1, 1, 0), (1, 3, 0), (1, 3, 2), (2, 3, 1)]
+
+
+def test_fc16_blocks_respect_the_protocol_limit():
+    writes = [write(holding(i, 40001 + i), i) for i in range(200)]
+
+    blocks = plan_write_blocks(writes)
+
+    assert [block.count for block in blocks] == [123, 77]
+
+
+def test_satisfied_by_compares_with_the_known_value():
+    assert write(holding(1, 40001, 'float32'), 2.5).satisfied_by(2.5)
+    assert not write(holding(1, 40001), 3).satisfied_by(4)
+    assert not write(holding(1, 40001), 3).satisfied_by(None)
+    assert PlannedWrite(PlannedRegister(4, 1, 1, 1, 'bool'), 1).satisfied_by(True)
@@ -0,0 +1,17 @@
+import datetime
+from app.services.register_latest import latest_upsert_rows, LATEST_UPSERT_SQL, GOOD
+
+AT = datetime.datetime(2025, 3, 1, 12, 0)
+
+
+def test_one_fixed_statement_per_register_whatever_the_poll_size():
+    small = latest_upsert_rows({5: 1}, AT)
+    large = latest_upsert_rows({3: 10, 1: 20, 2: 30}, AT)
+
+    assert {sql for sql, _ in small + large} == {LATEST_UPSERT_SQL}
+    assert [params['register_id'] for _, params in large] == [1, 2, 3]
+    assert large[0][1] == {'register_id': 1, 'value': 20.0, 'ts': AT, 'quality': GOOD}
+
+
+def test_no_values_no_rows():
+    assert latest_upsert_rows({}, AT) == []
@@ -0,0 +1,59 @@
+import datetime
+
+from app.services.modbus_read_planner import PlannedRegister
+from app.services.modbus_rule_set import CompiledCondition, CompiledRule, RuleSet, RuleEvaluator, plan_action_write
+from app.services.modbus_snapshot import RegisterSnapshot
+from app.services.rule_log import RuleLogRecorder, SUMMARY, TRANSITION
+
+T0 = datetime.datetime(2026, 1, 1, 12, 0, 0)
+
+
+class _Action:
+    name = 'liga bomba'
+    write_value = 1
+
+
+def make_rule_set():
+    level = PlannedRegister(1, 1, 3, 40001, 'int', name='nivel')
+    pump = PlannedRegister(2, 1, 1, 1, 'bool', name='bomba')
+    rule = CompiledRule(10, 'nivel baixo', 1, False,
+                        [CompiledCondition('nivel < 50', level, '<', 50)],
+                        [plan_action_write(_Action(), pump)])
+    return RuleSet(1, [rule], {1: level, 2: pump}, {1: '10.0.0.1', 2: '10.0.0.1'}, [])
+
+
+def snapshot(value, seconds):
+    return RegisterSnapshot({1: value}, T0 + datetime.timedelta(seconds=seconds), requested=[1])
+
+
+def test_cached_results_are_not_counted_as_evaluations():
+    rule_set = make_rule_set()
+    evaluator = RuleEvaluator(rule_set, recheck_interval=3600)
+    recorder = RuleLogRecorder(summary_interval=30)
+    action = rule_set.rules[0].actions[0]
+
+    rows = []
+    for seconds, value, written in ((0, 10, {action}), (10, 10, set()), (20, 10, set()), (30, 10, set())):
+        evaluator.evaluate(snapshot(value, seconds))
+        rows += recorder.observe(rule_set, evaluator.results, evaluator.evaluated, written, snapshot(value, seconds))
+
+    transitions = [params for _, params in rows if params['kind'] == TRANSITION]
+    # Ativada com a escrita e, nos ciclos seguintes, a escrita suprimida (valor já no alvo)
+    assert [(t['condition_result'], t['action_executed']) for t in transitions] == [(True, True), (True, False)]
+    summary, = [params for _, params in rows if params['kind'] == SUMMARY]
+    # O valor não mudou: só a primeira passagem avaliou a regra
+    assert (summary['evaluations'], summary['true_count'], summary['action_count']) == (1, 1, 1)
+
+
+def test_action_executed_reflects_only_writes_performed():
+    rule_set = make_rule_set()
+    evaluator = RuleEvaluator(rule_set)
+    recorder = RuleLogRecorder()
+
+    evaluator.evaluate(snapshot(10, 0))
+    # Regra ativada, mas a escrita falhou ou foi suprimida
+    rows = recorder.observe(rule_set, evaluator.results, evaluator.evaluated, set(), snapshot(10, 0))
+
+    (_, params), = rows
+    assert params['condition_result'] is True
+    assert params['action_executed'] is False
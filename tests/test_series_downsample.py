@@ -0,0 +1,73 @@
+import datetime
+import math
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.services import series_downsample
+from app.services.series_downsample import _lttb_python, lttb
+
+T0 = datetime.datetime(2026, 1, 1, 12)
+
+
+def wave(length):
+    xs = [float(i) for i in range(length)]
+    ys = [math.sin(i / 7.0) * 10 + (100 if i == length // 3 else 0) for i in range(length)]
+    return xs, ys
+
+
+def test_lttb_keeps_first_last_and_peaks_within_threshold():
+    xs, ys = wave(1000)
+
+    selected = lttb(xs, ys, 50)
+
+    assert len(selected) == 50
+    assert selected[0] == 0 and selected[-1] == 999
+    assert selected == sorted(set(selected))
+    # O pico isolado sobrevive à redução
+    assert 1000 // 3 in selected
+
+
+def test_lttb_returns_everything_below_threshold():
+    xs, ys = wave(10)
+
+    assert lttb(xs, ys, 20) == list(range(10))
+    with pytest.raises(ValueError):
+        lttb(xs, ys, 2)
+
+
+@pytest.mark.skipif(series_downsample.numpy is None, reason="NumPy não instalado")
+@pytest.mark.parametrize('length,threshold', [(1000, 50), (101, 3), (5000, 777)])
+def test_numpy_and_python_versions_agree(length, threshold):
+    xs, ys = wave(length)
+
+    assert series_downsample._lttb_numpy(xs, ys, threshold) == _lttb_python(xs, ys, threshold)
+
+
+@pytest.fixture
+def telemetry():
+    engine = create_engine('sqlite://', connect_args={'detect_types': sqlite3.PARSE_DECLTYPES})
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE modbus_data (register_id INTEGER, timestamp TIMESTAMP, value FLOAT)"))
+        connection.execute(text("CREATE TABLE modbus_data_rollup (register_id INTEGER, resolution INTEGER, bucket TIMESTAMP, "
+                                "min_value FLOAT, max_value FLOAT, sum_value FLOAT, count INTEGER, first_value FLOAT, last_value FLOAT)"))
+        # Registrador 1: 40 amostras em 10 min; registrador 2: só 5
+        for second in range(0, 600, 15):
+            connection.execute(text("INSERT INTO modbus_data VALUES (1, :ts, 1)"), {'ts': T0 + datetime.timedelta(seconds=second)})
+        for second in range(0, 600, 120):
+            connection.execute(text("INSERT INTO modbus_data VALUES (2, :ts, 1)"), {'ts': T0 + datetime.timedelta(seconds=second)})
+        for minute in range(10):
+            connection.execute(text("INSERT INTO modbus_data_rollup VALUES (1, 60, :bucket, 0, 3, 8, 4, 1, 1)"),
+                               {'bucket': T0 + datetime.timedelta(minutes=minute)})
+    with engine.connect() as connection:
+        yield connection
+
+
+def test_short_periods_switch_to_the_minute_rollup_when_raw_samples_exceed_the_budget(telemetry):
+    end = T0 + datetime.timedelta(minutes=10)
+
+    # 40 amostras > 3 * OVERSAMPLE: lê os 10 buckets de 1 minuto
+    assert [value for _, value in series_downsample.load_downsampled(telemetry, 'register', 1, T0, end, points=3)] == [2.0] * 3
+    # 5 amostras cabem no orçamento: lê as brutas
+    assert len(series_downsample.load_downsampled(telemetry, 'register', 2, T0, end, points=5)) == 5
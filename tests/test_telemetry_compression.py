@@ -0,0 +1,75 @@
+import datetime
+import math
+
+from app.services.telemetry_compression import CompressionSettings, RegisterCompressor, TelemetryCompressor
+
+T0 = datetime.datetime(2025, 1, 1)
+
+
+def at(seconds):
+    return T0 + datetime.timedelta(seconds=seconds)
+
+
+def offer_all(compressor, values):
+    stored = []
+    for seconds, value in enumerate(values):
+        stored += compressor.offer(value, at(seconds))
+    return stored + compressor.flush()
+
+
+def interpolate(stored, timestamp):
+    for (v1, t1), (v2, t2) in zip(stored, stored[1:]):
+        if t1 <= timestamp <= t2:
+            span = (t2 - t1).total_seconds()
+            return v1 if span == 0 else v1 + (v2 - v1) * (timestamp - t1).total_seconds() / span
+    raise AssertionError(f"{timestamp} fora dos pontos gravados")
+
+
+def test_deadband_stores_only_changes_beyond_tolerance():
+    compressor = RegisterCompressor(CompressionSettings(deadband=1.0))
+
+    stored = offer_all(compressor, [10, 10.5, 10.9, 11.2, 11.5, 9.9])
+
+    assert [value for value, _ in stored] == [10, 11.2, 9.9]
+
+
+def test_percent_deadband_is_relative_to_the_stored_value():
+    compressor = RegisterCompressor(CompressionSettings(deadband=10, percent=True))
+
+    stored = offer_all(compressor, [100, 109, 111, 121, 123])
+
+    assert [value for value, _ in stored] == [100, 111, 123]
+
+
+def test_swinging_door_reconstructs_within_tolerance():
+    tolerance = 0.5
+    values = [20 + 5 * math.sin(i / 15) + (i % 3) * 0.1 for i in range(300)]
+    compressor = RegisterCompressor(CompressionSettings(deadband=tolerance, swinging_door=True))
+
+    stored = offer_all(compressor, values)
+
+    assert len(stored) < len(values) / 4
+    for seconds, value in enumerate(values):
+        assert abs(interpolate(stored, at(seconds)) - value) <= tolerance + 1e-9
+
+
+def test_heartbeat_stores_a_point_even_without_changes():
+    compressor = RegisterCompressor(CompressionSettings(deadband=1.0, heartbeat=10))
+
+    stored = offer_all(compressor, [5] * 25)
+
+    assert [timestamp for _, timestamp in stored] == [at(0), at(10), at(20)]
+
+
+def test_unconfigured_registers_store_every_reading_and_reconfigure_flushes():
+    compressor = TelemetryCompressor()
+    compressor.configure({1: CompressionSettings(deadband=1.0, swinging_door=True)})
+
+    assert compressor.offer(2, 7, at(0)) == [(7, at(0))]
+    compressor.offer(1, 1.0, at(0))
+    compressor.offer(1, 1.1, at(1))
+
+    pending = compressor.configure({})
+
+    assert pending == {1: [(1.1, at(1))]}
+    assert compressor.offer(1, 1.2, at(2)) == [(1.2, at(2))]
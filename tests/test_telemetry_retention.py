@@ -0,0 +1,54 @@
+import datetime
+
+from app.services import telemetry_retention
+from app.services.telemetry_retention import (
+    drop_expired_partitions, ensure_future_partitions, month_start, next_month, partition_definition,
+)
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+
+
+def partitions(*months):
+    return [(f"p{month:%Y%m}", next_month(month)) for month in months] + [('pmax', None)]
+
+
+def test_month_arithmetic_and_partition_definition():
+    assert month_start(datetime.date(2025, 12, 31)) == datetime.date(2025, 12, 1)
+    assert next_month(datetime.date(2025, 12, 1)) == datetime.date(2026, 1, 1)
+    assert partition_definition(datetime.date(2025, 12, 1)) == \
+        "PARTITION p202512 VALUES LESS THAN (TO_DAYS('2026-01-01'))"
+
+
+def test_future_partitions_are_split_from_pmax(monkeypatch):
+    monkeypatch.setattr(telemetry_retention, 'list_partitions',
+                        lambda connection, table: partitions(datetime.date(2026, 1, 1), datetime.date(2026, 2, 1)))
+    connection = RecordingConnection()
+
+    created = ensure_future_partitions(connection, 'nivel', datetime.date(2026, 2, 15))
+
+    # Fevereiro já existe; faltam março (atual + 1) até maio (PARTITIONS_AHEAD = 3)
+    assert created == 3
+    statement, = connection.statements
+    assert statement.startswith('ALTER TABLE nivel REORGANIZE PARTITION pmax INTO (PARTITION p202603')
+    assert 'PARTITION p202605' in statement and 'p202606' not in statement
+    assert statement.endswith('PARTITION pmax VALUES LESS THAN MAXVALUE)')
+
+
+def test_only_whole_expired_months_are_dropped(monkeypatch):
+    monkeypatch.setattr(telemetry_retention, 'list_partitions',
+                        lambda connection, table: partitions(datetime.date(2025, 11, 1), datetime.date(2025, 12, 1),
+                                                             datetime.date(2026, 1, 1)))
+    connection = RecordingConnection()
+
+    expired = drop_expired_partitions(connection, 'modbus_data', 40, datetime.date(2026, 1, 20))
+
+    # Corte em 2025-12-11: novembro inteiro expirou, dezembro ainda não
+    assert expired == ['p202511']
+    assert connection.statements == ['ALTER TABLE modbus_data DROP PARTITION p202511']
+    assert drop_expired_partitions(connection, 'modbus_data', None, datetime.date(2026, 1, 20)) == []
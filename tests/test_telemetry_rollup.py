@@ -0,0 +1,68 @@
+import datetime
+import sqlite3
+
+from sqlalchemy import create_engine, text
+
+from app.services import telemetry_rollup
+from app.services.telemetry_rollup import RollupAccumulator, backfill, bucket_start, choose_resolution
+
+T0 = datetime.datetime(2026, 3, 10, 14, 37, 25)
+
+
+def test_bucket_start():
+    assert bucket_start(T0, 60) == datetime.datetime(2026, 3, 10, 14, 37)
+    assert bucket_start(T0, 3600) == datetime.datetime(2026, 3, 10, 14, 0)
+    assert bucket_start(T0, 86400) == datetime.datetime(2026, 3, 10)
+
+
+def test_choose_resolution():
+    assert choose_resolution(30) is None
+    assert choose_resolution(60) == 60
+    assert choose_resolution(7200) == 3600
+    assert choose_resolution(10 ** 7) == 86400
+
+
+def test_accumulator_aggregates_out_of_order_samples_per_bucket():
+    accumulator = RollupAccumulator('register', resolutions=(60, 3600))
+    samples = [(5.0, T0), (2.0, T0 - datetime.timedelta(seconds=20)), (9.0, T0 + datetime.timedelta(seconds=10)),
+               (4.0, T0 + datetime.timedelta(seconds=60))]
+    for value, timestamp in samples:
+        accumulator.add(7, value, timestamp)
+
+    rows = {(params['resolution'], params['bucket']): params for _, params in accumulator.rows()}
+
+    assert len(accumulator) == 0
+    assert set(rows) == {(60, datetime.datetime(2026, 3, 10, 14, 37)), (60, datetime.datetime(2026, 3, 10, 14, 38)),
+                         (3600, datetime.datetime(2026, 3, 10, 14, 0))}
+    minute = rows[(60, datetime.datetime(2026, 3, 10, 14, 37))]
+    assert (minute['min_value'], minute['max_value'], minute['sum_value'], minute['count']) == (2.0, 9.0, 16.0, 3)
+    assert (minute['first_value'], minute['last_value']) == (2.0, 9.0)
+    hour = rows[(3600, datetime.datetime(2026, 3, 10, 14, 0))]
+    assert (hour['count'], hour['last_value'], hour['series_id']) == (4, 4.0, 7)
+
+
+def test_backfill_only_fills_buckets_without_rollups(monkeypatch):
+    # TIMESTAMP + PARSE_DECLTYPES: o sqlite devolve datetime, como o MariaDB
+    engine = create_engine('sqlite://', connect_args={'detect_types': sqlite3.PARSE_DECLTYPES})
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE modbus_register (id INTEGER PRIMARY KEY)"))
+        connection.execute(text("CREATE TABLE modbus_data (register_id INTEGER, timestamp TIMESTAMP, value FLOAT)"))
+        connection.execute(text("CREATE TABLE modbus_data_rollup (register_id INTEGER, resolution INTEGER, bucket TIMESTAMP)"))
+        connection.execute(text("INSERT INTO modbus_register VALUES (1)"))
+        # 13h e o dia 10 já foram agregados pelo master
+        connection.execute(text("INSERT INTO modbus_data_rollup VALUES (1, 3600, '2026-03-10 13:00:00'), "
+                                "(1, 86400, '2026-03-10 00:00:00')"))
+        for timestamp, value in (('2026-03-10 12:10:00', 1), ('2026-03-10 13:10:00', 2), ('2026-03-11 08:00:00', 3)):
+            connection.execute(text("INSERT INTO modbus_data VALUES (1, :ts, :value)"),
+                               {'ts': datetime.datetime.fromisoformat(timestamp), 'value': value})
+    written = []
+    monkeypatch.setattr(telemetry_rollup, 'flush_rows', lambda engine, rows: written.extend(params for _, params in rows))
+
+    samples = backfill(engine, 'register', datetime.date(2026, 3, 10), datetime.date(2026, 3, 11))
+
+    assert samples == 3
+    assert sorted((params['resolution'], params['bucket'], params['sum_value']) for params in written) == [
+        (60, datetime.datetime(2026, 3, 10, 12, 10), 1.0), (60, datetime.datetime(2026, 3, 11, 8, 0), 3.0),
+        (3600, datetime.datetime(2026, 3, 10, 12, 0), 1.0), (3600, datetime.datetime(2026, 3, 11, 8, 0), 3.0),
+        (86400, datetime.datetime(2026, 3, 11), 3.0),
+    ]